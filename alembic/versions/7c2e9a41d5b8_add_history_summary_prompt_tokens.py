@@ -0,0 +1,30 @@
+"""add history summary, prompt tokens
+
+Revision ID: 7c2e9a41d5b8
+Revises: 1605d7ed3d36
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2e9a41d5b8'
+down_revision: Union[str, None] = '1605d7ed3d36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('sessions', sa.Column('history_summary', sa.Text(), nullable=True))
+    op.add_column('sessions', sa.Column('summarized_until_id', sa.Integer(), nullable=True))
+    op.add_column('messages', sa.Column('prompt_tokens', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('messages', 'prompt_tokens')
+    op.drop_column('sessions', 'summarized_until_id')
+    op.drop_column('sessions', 'history_summary')
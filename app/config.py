@@ -20,6 +20,101 @@ LLM_MODEL_BY_AGENT = {
 }
 
 
+# Модели, которые обслуживает сервис; другие имена из запросов клиентов отклоняются —
+# пулы эндпоинтов и очереди admission control заводятся на каждую модель
+LLM_MODELS = frozenset({LLM_DEFAULT_MODEL, *LLM_MODEL_BY_AGENT.values()})
+
+
 def get_model_for_agent(agent_type_value: str) -> str:
     """Возвращает имя модели для данного типа агента."""
-    return LLM_MODEL_BY_AGENT.get(agent_type_value, LLM_DEFAULT_MODEL)
\ No newline at end of file
+    return LLM_MODEL_BY_AGENT.get(agent_type_value, LLM_DEFAULT_MODEL)
+
+
+def _split_urls(value: str | None) -> list[str]:
+    return [u.strip() for u in (value or "").split(",") if u.strip()]
+
+
+# OpenAI-совместимые эндпоинты (через запятую); запросы балансируются между ними.
+# По умолчанию — один VLLM_BASE_URL
+LLM_BACKEND_URLS = _split_urls(os.getenv("LLM_BACKEND_URLS")) or [VLLM_BASE_URL]
+
+# Эндпоинты на агента (если не заданы — LLM_BACKEND_URLS)
+LLM_BACKENDS_BY_AGENT = {
+    "hr": _split_urls(os.getenv("LLM_BACKEND_URLS_HR")) or LLM_BACKEND_URLS,
+    "tech_lead": _split_urls(os.getenv("LLM_BACKEND_URLS_TECH_LEAD")) or LLM_BACKEND_URLS,
+    "mentor": _split_urls(os.getenv("LLM_BACKEND_URLS_MENTOR")) or LLM_BACKEND_URLS,
+    "code_review": _split_urls(os.getenv("LLM_BACKEND_URLS_CODE_REVIEW")) or LLM_BACKEND_URLS,
+}
+
+
+def get_backend_urls_for_model(model: str) -> list[str]:
+    """Эндпоинты, которые обслуживают модель: объединение по всем агентам с этой моделью."""
+    urls: list[str] = []
+    for agent, agent_model in LLM_MODEL_BY_AGENT.items():
+        if agent_model == model:
+            urls += [u for u in LLM_BACKENDS_BY_AGENT[agent] if u not in urls]
+    return urls or LLM_BACKEND_URLS
+
+
+# Admission control: одновременных генераций на модель и длина очереди к ней (сверх — 429).
+# На агента можно задать свой лимит; для модели берётся наибольший среди её агентов
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "128"))
+LLM_MAX_CONCURRENCY_BY_AGENT = {
+    "hr": int(os.getenv("LLM_MAX_CONCURRENCY_HR") or LLM_MAX_CONCURRENCY),
+    "tech_lead": int(os.getenv("LLM_MAX_CONCURRENCY_TECH_LEAD") or LLM_MAX_CONCURRENCY),
+    "mentor": int(os.getenv("LLM_MAX_CONCURRENCY_MENTOR") or LLM_MAX_CONCURRENCY),
+    "code_review": int(os.getenv("LLM_MAX_CONCURRENCY_CODE_REVIEW") or LLM_MAX_CONCURRENCY),
+}
+
+
+def get_admission_limits_for_model(model: str) -> tuple[int, int]:
+    """(макс. одновременных генераций, макс. длина очереди) для модели."""
+    limits = [
+        LLM_MAX_CONCURRENCY_BY_AGENT[agent]
+        for agent, agent_model in LLM_MODEL_BY_AGENT.items()
+        if agent_model == model
+    ]
+    return max(limits, default=LLM_MAX_CONCURRENCY), LLM_MAX_QUEUE
+
+
+# Circuit breaker: после N ошибок подряд эндпоинт выводится из ротации на cooldown секунд
+LLM_CIRCUIT_FAILURES = int(os.getenv("LLM_CIRCUIT_FAILURES", "3"))
+LLM_CIRCUIT_COOLDOWN = float(os.getenv("LLM_CIRCUIT_COOLDOWN", "30"))
+# Health check эндпоинтов (GET /models), секунды; 0 — выключено
+LLM_HEALTH_INTERVAL = float(os.getenv("LLM_HEALTH_INTERVAL", "10"))
+# Hedging потоковых запросов: если первый токен не пришёл за p{PERCENTILE} от TTFT
+# (но не раньше MIN_DELAY_MS), запрос дублируется на другой эндпоинт
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_MIN_DELAY_MS = float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "300"))
+
+# Пул HTTP-соединений к LLM: один клиент на процесс, keep-alive между запросами
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "500"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "100"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "600"))
+# Схлопывать одинаковые одновременные запросы к LLM в одну генерацию
+LLM_COALESCE = os.getenv("LLM_COALESCE", "true").lower() in ("1", "true", "yes", "on")
+
+# Окно истории сессии: последние N ходов (вопрос + ответ) как есть, остальное — в конспект
+HISTORY_MAX_TURNS = int(os.getenv("HISTORY_MAX_TURNS", "10"))
+# Сворачиваем в конспект пачками, чтобы начало окна не сдвигалось на каждом ходе
+HISTORY_FOLD_BATCH_TURNS = int(os.getenv("HISTORY_FOLD_BATCH_TURNS", "4"))
+# Бюджет токенов на сообщения окна (без системного промпта)
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "6000"))
+# При сворачивании окно ужимается до этой отметки: запас под следующие ходы, чтобы
+# бюджет не превышался снова на каждом ходе (и конспект не менялся каждый раз)
+HISTORY_TOKEN_LOW_WATER = int(os.getenv("HISTORY_TOKEN_LOW_WATER", str(HISTORY_TOKEN_BUDGET * 2 // 3)))
+HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "800"))
+
+# Раскладка промпта: prefix_cache — стабильный префикс (агент → резюме → вакансия → история),
+# контекст RAG в конце; legacy — RAG в системном промпте
+LLM_PROMPT_LAYOUT = os.getenv("LLM_PROMPT_LAYOUT", "prefix_cache")
+
+# Кэш ответов /chat/completions (только temperature=0 или cache=true в запросе)
+# Бэкенд: memory (LRU в процессе) | redis (любой Redis-совместимый сервер) | off
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "memory")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "600"))
+LLM_CACHE_REDIS_URL = os.getenv("LLM_CACHE_REDIS_URL", "redis://localhost:6379/0")
@@ -0,0 +1,118 @@
+# app/llm_admission.py
+"""
+Admission control для генераций: на каждую модель не больше max_concurrent
+одновременных запросов к LLM, остальные ждут в ограниченной очереди с
+приоритетами. Интерактивные ходы интервью (/session) обслуживаются раньше
+массовых /chat/completions; при переполненной очереди запрос сразу получает
+429 с Retry-After, а не висит вместе со всеми.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+from contextlib import asynccontextmanager
+
+from app import metrics
+from app.config import LLM_MODELS, get_admission_limits_for_model
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+
+class LLMOverloadedError(Exception):
+    """Очередь к модели переполнена — отвечаем 429."""
+
+    def __init__(self, model: str, retry_after: int):
+        super().__init__(f"LLM queue for {model} is full")
+        self.model = model
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, model: str, max_concurrent: int, max_queue: int):
+        self.model = model
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiting = 0
+        # (priority, seq, future): меньше priority — раньше; seq сохраняет FIFO внутри приоритета
+        self._queue: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self.wait = metrics.get_latency(f"llm_admission.{model}.wait")
+        metrics.register_gauge(f"llm_admission.{model}.active", lambda: self.active)
+        metrics.register_gauge(f"llm_admission.{model}.queue_depth", lambda: self.waiting)
+
+    def retry_after(self) -> int:
+        """Оценка в секундах: типичное время ожидания в очереди."""
+        p50 = self.wait.percentile(50)
+        return max(1, math.ceil(p50 / 1000)) if p50 else 1
+
+    async def acquire(self, priority: int) -> None:
+        if self.active < self.max_concurrent and not self.waiting:
+            self.active += 1
+            self.wait.observe(0)
+            return
+
+        if self.waiting >= self.max_queue and not self._evict_lower(priority):
+            metrics.incr(f"llm_admission.{self.model}.shed")
+            raise LLMOverloadedError(self.model, self.retry_after())
+
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), fut))
+        self.waiting += 1
+        started = loop.time()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Слот успели передать, но ждущий уже ушёл — возвращаем слот
+                self.release()
+            else:
+                self.waiting -= 1
+            raise
+        self.wait.observe((loop.time() - started) * 1000)
+
+    def _evict_lower(self, priority: int) -> bool:
+        """Освобождает место в полной очереди, выбрасывая ждущего с более низким приоритетом."""
+        live = [entry for entry in self._queue if not entry[2].done()]
+        if not live:
+            return False
+        worst = max(live, key=lambda e: (e[0], e[1]))
+        if worst[0] <= priority:
+            return False
+        self.waiting -= 1
+        worst[2].set_exception(LLMOverloadedError(self.model, self.retry_after()))
+        metrics.incr(f"llm_admission.{self.model}.shed")
+        return True
+
+    def release(self) -> None:
+        while self._queue:
+            _, _, fut = heapq.heappop(self._queue)
+            if not fut.done():
+                # Слот переходит следующему в очереди, active не меняется
+                self.waiting -= 1
+                fut.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+_controllers: dict[str, AdmissionController] = {}
+
+
+def get_admission(model: str) -> AdmissionController:
+    controller = _controllers.get(model)
+    if controller is None:
+        if model not in LLM_MODELS:
+            raise ValueError(f"Unknown model: {model}")
+        max_concurrent, max_queue = get_admission_limits_for_model(model)
+        controller = _controllers[model] = AdmissionController(model, max_concurrent, max_queue)
+    return controller
@@ -0,0 +1,310 @@
+# app/llm_backends.py
+"""
+Пул OpenAI-совместимых эндпоинтов LLM.
+
+Каждую модель могут обслуживать несколько эндпоинтов (см. LLM_BACKENDS_BY_AGENT).
+Запрос уходит на эндпоинт с наименьшим числом незавершённых запросов среди
+доступных; эндпоинт, упавший LLM_CIRCUIT_FAILURES раз подряд или не прошедший
+health check, временно выводится из ротации. Потоковые запросы хеджируются:
+если первый токен не пришёл за перцентиль TTFT пула, тот же запрос
+отправляется на другой эндпоинт, и побеждает тот, кто ответит первым.
+"""
+import asyncio
+import logging
+import random
+import time
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+
+from app import metrics
+from app.config import (
+    LLM_MAX_CONNECTIONS,
+    LLM_MAX_KEEPALIVE_CONNECTIONS,
+    LLM_KEEPALIVE_EXPIRY,
+    LLM_TIMEOUT,
+    LLM_CIRCUIT_FAILURES,
+    LLM_CIRCUIT_COOLDOWN,
+    LLM_HEALTH_INTERVAL,
+    LLM_HEDGE_PERCENTILE,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_HEDGE_MIN_DELAY_MS,
+    LLM_MODEL_BY_AGENT,
+    LLM_MODELS,
+    get_backend_urls_for_model,
+)
+
+logger = logging.getLogger(__name__)
+
+# Ошибки, после которых имеет смысл повторить запрос на другом эндпоинте
+_RETRYABLE = (openai.APIConnectionError, openai.InternalServerError, openai.RateLimitError)
+
+
+class NoBackendAvailable(openai.APIConnectionError):
+    """У модели нет эндпоинтов, на которые можно отправить запрос."""
+
+    def __init__(self, model: str):
+        super().__init__(
+            message=f"No LLM backend available for model {model}",
+            request=httpx.Request("POST", "chat/completions"),
+        )
+
+
+class Backend:
+    """Один эндпоинт: клиент, текущая нагрузка и состояние circuit breaker."""
+
+    def __init__(self, url: str, http_client: httpx.AsyncClient):
+        self.url = url
+        # Повторы делает пул (на другом эндпоинте), а не клиент
+        self.client = AsyncOpenAI(api_key="not-needed", base_url=url, http_client=http_client, max_retries=0)
+        self.outstanding = 0
+        self.failures = 0
+        self.open_until = 0.0
+        self.healthy = True
+        self.ttft = metrics.get_latency(f"llm_backend.{url}.ttft")
+
+    def available(self, now: float) -> bool:
+        return self.healthy and now >= self.open_until
+
+    def record_success(self) -> None:
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        metrics.incr(f"llm_backend.{self.url}.errors")
+        if self.failures >= LLM_CIRCUIT_FAILURES:
+            # После cooldown эндпоинт снова получает запросы (half-open); новая ошибка — снова открываем
+            self.open_until = time.monotonic() + LLM_CIRCUIT_COOLDOWN
+            metrics.incr(f"llm_backend.{self.url}.circuit_open")
+            logger.warning("LLM backend %s: circuit open for %.0fs", self.url, LLM_CIRCUIT_COOLDOWN)
+
+
+@dataclass
+class StreamAttempt:
+    """Открытый поток на конкретном эндпоинте и чанки, прочитанные до первого токена."""
+
+    backend: Backend
+    stream: openai.AsyncStream
+    chunks: AsyncIterator  # оставшиеся чанки потока
+    head: list = field(default_factory=list)
+
+    async def close(self) -> None:
+        self.backend.outstanding -= 1
+        await self.stream.close()
+
+
+class BackendPool:
+    """Эндпоинты одной модели."""
+
+    def __init__(self, model: str, backends: list[Backend]):
+        self.model = model
+        self.backends = backends
+        self.ttft = metrics.get_latency(f"llm_pool.{model}.ttft")
+
+    def pick(self, exclude: set | frozenset = frozenset()) -> Backend | None:
+        """Эндпоинт с наименьшим числом незавершённых запросов среди доступных."""
+        candidates = [b for b in self.backends if b not in exclude]
+        if not candidates:
+            return None
+        now = time.monotonic()
+        # Если все выведены из ротации — всё равно пробуем, это лучше, чем сразу ошибка
+        ready = [b for b in candidates if b.available(now)] or candidates
+        return min(ready, key=lambda b: (b.outstanding, random.random()))
+
+    def hedge_delay(self) -> float | None:
+        """Через сколько секунд без первого токена дублировать запрос (None — не хеджировать)."""
+        if len(self.backends) < 2 or self.ttft.count < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        p = self.ttft.percentile(LLM_HEDGE_PERCENTILE)
+        return max(p, LLM_HEDGE_MIN_DELAY_MS) / 1000
+
+    async def complete(self, **kwargs):
+        """Обычный (не потоковый) запрос с переключением на другой эндпоинт при сбое."""
+        tried: set[Backend] = set()
+        last_error: Exception | None = None
+        while (backend := self.pick(tried)) is not None:
+            tried.add(backend)
+            backend.outstanding += 1
+            try:
+                response = await backend.client.chat.completions.create(model=self.model, **kwargs)
+            except _RETRYABLE as e:
+                backend.record_failure()
+                last_error = e
+                continue
+            finally:
+                backend.outstanding -= 1
+            backend.record_success()
+            return response
+        raise last_error or NoBackendAvailable(self.model)
+
+    async def open_stream(self, **kwargs) -> StreamAttempt:
+        """
+        Открывает поток и дожидается первого токена. Если он не пришёл за hedge_delay,
+        запускает копию запроса на другом эндпоинте; проигравший поток закрывается.
+        """
+        tried: set[Backend] = set()
+        pending: dict[asyncio.Task, Backend] = {}
+        last_error: Exception | None = None
+
+        def launch() -> bool:
+            backend = self.pick(tried)
+            if backend is None:
+                return False
+            tried.add(backend)
+            pending[asyncio.create_task(self._attempt(backend, kwargs))] = backend
+            return True
+
+        launch()
+        delay = self.hedge_delay()
+        hedged = False
+        winner: StreamAttempt | None = None
+        try:
+            while pending and winner is None:
+                done, _ = await asyncio.wait(
+                    pending,
+                    timeout=delay if not hedged else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    hedged = True
+                    if launch():
+                        metrics.incr(f"llm_pool.{self.model}.hedged")
+                    continue
+                fatal: Exception | None = None
+                for task in done:
+                    backend = pending.pop(task)
+                    try:
+                        attempt = task.result()
+                    except _RETRYABLE as e:
+                        backend.record_failure()
+                        last_error = e
+                        continue
+                    except Exception as e:
+                        # Сначала разбираем остальные завершённые копии: их открытые потоки надо закрыть
+                        fatal = fatal or e
+                        continue
+                    if winner is None:
+                        winner = attempt
+                    else:
+                        await attempt.close()
+                if fatal is not None:
+                    if winner is not None:
+                        await winner.close()
+                    raise fatal
+                if winner is None and not pending:
+                    launch()  # все запущенные упали — пробуем следующий эндпоинт
+        finally:
+            for task in pending:
+                task.cancel()
+                task.add_done_callback(_discard_attempt)
+        if winner is None:
+            raise last_error or NoBackendAvailable(self.model)
+        winner.backend.record_success()
+        return winner
+
+    async def _attempt(self, backend: Backend, kwargs: dict) -> StreamAttempt:
+        backend.outstanding += 1
+        started = time.perf_counter()
+        stream = None
+        try:
+            stream = await backend.client.chat.completions.create(model=self.model, stream=True, **kwargs)
+            chunks = stream.__aiter__()
+            head = []
+            async for chunk in chunks:
+                head.append(chunk)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    break
+            ttft_ms = (time.perf_counter() - started) * 1000
+            backend.ttft.observe(ttft_ms)
+            self.ttft.observe(ttft_ms)
+            return StreamAttempt(backend, stream, chunks, head)
+        except BaseException:
+            # Ошибка или отмена проигравшей копии при хеджировании
+            backend.outstanding -= 1
+            if stream is not None:
+                await stream.close()
+            raise
+
+
+def _discard_attempt(task: asyncio.Task) -> None:
+    """Закрывает поток копии, которая успела открыться уже после выбора победителя."""
+    if not task.cancelled() and task.exception() is None:
+        asyncio.ensure_future(task.result().close())
+
+
+_http_client: httpx.AsyncClient | None = None
+_backends: dict[str, Backend] = {}
+_pools: dict[str, BackendPool] = {}
+_health_task: asyncio.Task | None = None
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    """Общий на процесс HTTP-клиент: keep-alive пул соединений на все эндпоинты."""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=10.0),
+        )
+    return _http_client
+
+
+def _get_backend(url: str) -> Backend:
+    # Один Backend на URL: нагрузка на сервер общая для всех моделей, что он обслуживает
+    backend = _backends.get(url)
+    if backend is None:
+        backend = _backends[url] = Backend(url, _get_http_client())
+        metrics.register_gauge(f"llm_backend.{url}.outstanding", lambda: backend.outstanding)
+    return backend
+
+
+def get_pool(model: str) -> BackendPool:
+    pool = _pools.get(model)
+    if pool is None:
+        if model not in LLM_MODELS:
+            raise ValueError(f"Unknown model: {model}")
+        backends = [_get_backend(url) for url in get_backend_urls_for_model(model)]
+        pool = _pools[model] = BackendPool(model, backends)
+    return pool
+
+
+async def _health_loop() -> None:
+    while True:
+        for backend in list(_backends.values()):
+            try:
+                await asyncio.wait_for(backend.client.models.list(), timeout=5)
+                healthy = True
+            except Exception:
+                healthy = False
+            if healthy != backend.healthy:
+                logger.warning("LLM backend %s is now %s", backend.url, "healthy" if healthy else "unhealthy")
+            backend.healthy = healthy
+        await asyncio.sleep(LLM_HEALTH_INTERVAL)
+
+
+def start_health_checks() -> None:
+    global _health_task
+    # Пулы сконфигурированных моделей создаём сразу, чтобы проверять их эндпоинты с первого запуска
+    for model in set(LLM_MODEL_BY_AGENT.values()):
+        get_pool(model)
+    if LLM_HEALTH_INTERVAL > 0 and _health_task is None:
+        _health_task = asyncio.create_task(_health_loop())
+
+
+async def close_backends() -> None:
+    global _http_client, _health_task
+    if _health_task is not None:
+        _health_task.cancel()
+        _health_task = None
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+    _backends.clear()
+    _pools.clear()
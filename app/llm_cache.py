@@ -0,0 +1,114 @@
+# app/llm_cache.py
+"""
+Кэш ответов LLM для детерминированных запросов /chat/completions.
+
+Ключ — canonical_hash от (model, messages c уже подмешанным RAG, max_tokens,
+temperature). Бэкенд выбирается через LLM_CACHE_BACKEND: memory — LRU с TTL
+внутри процесса, redis — общий для всех воркеров Redis-совместимый сервер.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from app import metrics
+from app.config import (
+    LLM_CACHE_BACKEND,
+    LLM_CACHE_MAX_ENTRIES,
+    LLM_CACHE_TTL,
+    LLM_CACHE_REDIS_URL,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryCacheBackend:
+    """LRU с ограничением по числу записей и TTL."""
+
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> str | None:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    async def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class RedisCacheBackend:
+    """
+    Хранение в Redis (или совместимом: KeyDB, Dragonfly, Valkey).
+    TTL — через SETEX, вытеснение по размеру — политикой сервера (maxmemory-policy allkeys-lru).
+    """
+
+    def __init__(self, url: str, ttl: int, prefix: str = "llm-cache:"):
+        import redis.asyncio as redis
+
+        self.ttl = ttl
+        self.prefix = prefix
+        self._redis = redis.from_url(url, decode_responses=True)
+
+    async def get(self, key: str) -> str | None:
+        return await self._redis.get(self.prefix + key)
+
+    async def set(self, key: str, value: str) -> None:
+        await self._redis.set(self.prefix + key, value, ex=self.ttl)
+
+
+class ResponseCache:
+    """Обёртка над бэкендом: счётчики hit/miss и защита от сбоев хранилища."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def get(self, key: str) -> str | None:
+        try:
+            value = await self.backend.get(key)
+        except Exception:
+            logger.exception("LLM cache get failed")
+            metrics.incr("llm_cache.error")
+            return None
+        metrics.incr("llm_cache.hit" if value is not None else "llm_cache.miss")
+        return value
+
+    async def set(self, key: str, value: str) -> None:
+        try:
+            await self.backend.set(key, value)
+        except Exception:
+            logger.exception("LLM cache set failed")
+            metrics.incr("llm_cache.error")
+
+
+_cache: ResponseCache | None = None
+
+
+def get_response_cache() -> ResponseCache | None:
+    """Кэш согласно LLM_CACHE_BACKEND или None, если кэш выключен."""
+    global _cache
+    if _cache is None and LLM_CACHE_BACKEND != "off":
+        if LLM_CACHE_BACKEND == "redis":
+            backend = RedisCacheBackend(LLM_CACHE_REDIS_URL, LLM_CACHE_TTL)
+        else:
+            backend = MemoryCacheBackend(LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL)
+            metrics.register_gauge("llm_cache.size", backend.__len__)
+        _cache = ResponseCache(backend)
+    return _cache
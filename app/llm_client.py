@@ -0,0 +1,239 @@
+# app/llm_client.py
+"""
+Вызовы OpenAI-совместимого LLM (vLLM / llama.cpp) для всех роутеров.
+
+Одинаковые одновременные запросы (двойной клик, ретрай фронта) схлопываются
+в одну генерацию (single-flight): остальные ждут её результат, а в потоковом
+режиме опоздавший сначала получает уже сгенерированный префикс, затем —
+новые дельты вместе со всеми.
+
+Выбор эндпоинта, failover и hedging — в app/llm_backends.py, очередь
+с приоритетами и лимит одновременных генераций — в app/llm_admission.py.
+"""
+import asyncio
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+
+from app import metrics
+from app.config import LLM_COALESCE
+from app.llm_admission import get_admission, PRIORITY_INTERACTIVE
+from app.llm_backends import get_pool, start_health_checks, close_backends
+from app.llm_utils import canonical_hash
+
+
+@dataclass(frozen=True)
+class Completion:
+    text: str
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+
+
+def start_llm_client() -> None:
+    start_health_checks()
+
+
+async def close_llm_client() -> None:
+    await close_backends()
+
+
+def _request_key(model: str, messages: list[dict], max_tokens: int, temperature: float) -> str:
+    return canonical_hash({
+        "model": model,
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+    })
+
+
+# ---------------------------------------------------------------------------
+# Полный ответ
+# ---------------------------------------------------------------------------
+
+_inflight_calls: dict[str, asyncio.Task] = {}
+
+
+async def chat_completion(
+    model: str,
+    messages: list[dict],
+    max_tokens: int,
+    temperature: float,
+    priority: int = PRIORITY_INTERACTIVE,
+) -> Completion:
+    """Полный ответ модели (сырой, вместе с блоками think) и usage, если сервер его вернул."""
+    if not LLM_COALESCE:
+        return await _create_completion(model, messages, max_tokens, temperature, priority)
+
+    key = _request_key(model, messages, max_tokens, temperature)
+    task = _inflight_calls.get(key)
+    if task is None:
+        task = asyncio.ensure_future(
+            _create_completion(model, messages, max_tokens, temperature, priority)
+        )
+        _inflight_calls[key] = task
+        task.add_done_callback(lambda t: _forget_call(key, t))
+    else:
+        metrics.incr("llm.coalesced")
+    # shield: отмена одного из ожидающих не должна обрывать генерацию для остальных
+    return await asyncio.shield(task)
+
+
+def _forget_call(key: str, task: asyncio.Task) -> None:
+    if _inflight_calls.get(key) is task:
+        del _inflight_calls[key]
+    # Если все ожидающие отменились, исключение генерации никто не заберёт —
+    # забираем здесь, иначе asyncio пишет «Task exception was never retrieved»
+    if not task.cancelled():
+        task.exception()
+
+
+async def _create_completion(
+    model: str, messages: list[dict], max_tokens: int, temperature: float, priority: int
+) -> Completion:
+    async with get_admission(model).slot(priority):
+        response = await get_pool(model).complete(
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+        )
+    usage = response.usage
+    return Completion(
+        text=response.choices[0].message.content or "",
+        prompt_tokens=usage.prompt_tokens if usage else None,
+        completion_tokens=usage.completion_tokens if usage else None,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Потоковый ответ
+# ---------------------------------------------------------------------------
+
+class _Flight:
+    """Одна потоковая генерация и все, кто её читает."""
+
+    def __init__(self):
+        self.chunks: list[str] = []
+        self.finished = False
+        self.error: BaseException | None = None
+        self.readers = 0
+        self.opened = asyncio.Event()   # соединение с LLM установлено (или не удалось)
+        self.changed = asyncio.Condition()
+        self.task: asyncio.Task | None = None
+
+
+_inflight_streams: dict[str, _Flight] = {}
+
+
+async def open_chat_stream(
+    model: str,
+    messages: list[dict],
+    max_tokens: int,
+    temperature: float,
+    priority: int = PRIORITY_INTERACTIVE,
+) -> AsyncIterator[str]:
+    """
+    Открывает потоковую генерацию и возвращает итератор текстовых дельт.
+    Ошибки подключения к LLM и LLMOverloadedError поднимаются здесь, до первой итерации.
+    """
+    key = _request_key(model, messages, max_tokens, temperature) if LLM_COALESCE else None
+    flight = _inflight_streams.get(key) if key else None
+    if flight is None:
+        flight = _Flight()
+        if key:
+            _inflight_streams[key] = flight
+        flight.task = asyncio.create_task(
+            _pump(key, flight, model, messages, max_tokens, temperature, priority)
+        )
+    else:
+        metrics.incr("llm.coalesced")
+
+    flight.readers += 1
+    try:
+        await flight.opened.wait()
+    except asyncio.CancelledError:
+        # Клиент ушёл, пока запрос ждал очереди или подключения
+        flight.readers -= 1
+        if flight.readers == 0:
+            flight.task.cancel()
+        raise
+    if flight.error is not None and not flight.chunks:
+        flight.readers -= 1
+        raise flight.error
+    return _follow(flight)
+
+
+async def _pump(
+    key: str | None,
+    flight: _Flight,
+    model: str,
+    messages: list[dict],
+    max_tokens: int,
+    temperature: float,
+    priority: int,
+) -> None:
+    """Читает поток от LLM в буфер flight и будит читателей."""
+    admission = get_admission(model)
+    admitted = False
+    attempt = None
+    try:
+        await admission.acquire(priority)
+        admitted = True
+        attempt = await get_pool(model).open_stream(
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+        )
+        flight.opened.set()
+        for chunk in attempt.head:
+            await _push(flight, chunk)
+        async for chunk in attempt.chunks:
+            await _push(flight, chunk)
+    except asyncio.CancelledError:
+        pass  # все читатели ушли
+    except Exception as e:
+        flight.error = e
+        if attempt is not None:
+            attempt.backend.record_failure()
+    finally:
+        if key and _inflight_streams.get(key) is flight:
+            del _inflight_streams[key]
+        flight.finished = True
+        flight.opened.set()
+        async with flight.changed:
+            flight.changed.notify_all()
+        if attempt is not None:
+            # Генерация закончилась или все читатели ушли — закрываем соединение,
+            # чтобы LLM не работал впустую
+            await attempt.close()
+        if admitted:
+            admission.release()
+
+
+async def _push(flight: _Flight, chunk) -> None:
+    if not chunk.choices:
+        return
+    delta = chunk.choices[0].delta.content
+    if delta:
+        async with flight.changed:
+            flight.chunks.append(delta)
+            flight.changed.notify_all()
+
+
+async def _follow(flight: _Flight) -> AsyncIterator[str]:
+    """Отдаёт буфер flight с начала, затем новые дельты по мере поступления."""
+    i = 0
+    try:
+        while True:
+            while i < len(flight.chunks):
+                yield flight.chunks[i]
+                i += 1
+            if flight.finished:
+                if flight.error is not None:
+                    raise flight.error
+                return
+            async with flight.changed:
+                while i >= len(flight.chunks) and not flight.finished:
+                    await flight.changed.wait()
+    finally:
+        flight.readers -= 1
+        if flight.readers == 0 and not flight.finished:
+            flight.task.cancel()
@@ -1,4 +1,6 @@
 # app/llm_utils.py
+import hashlib
+import json
 import re
 
 _THINK_OPEN = "<" + "think" + ">"
@@ -10,4 +12,69 @@ def strip_think_tags(text: str) -> str:
     if not text or not text.strip():
         return text
     pattern = re.escape(_THINK_OPEN) + r".*?" + re.escape(_THINK_CLOSE)
-    return re.sub(pattern, "", text, flags=re.DOTALL).strip()
\ No newline at end of file
+    return re.sub(pattern, "", text, flags=re.DOTALL).strip()
+
+
+def canonical_hash(payload: dict) -> str:
+    """Стабильный sha256 от запроса к LLM: порядок ключей и пробелы JSON не влияют."""
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _partial_tag_len(data: str, tag: str, start: int) -> int:
+    """Длина хвоста data[start:], совпадающего с началом tag ("<", "</th" и т.п.)."""
+    # "<" в теге только первый символ, поэтому кандидат один — последний "<" в хвосте
+    i = data.rfind("<", max(start, len(data) - len(tag) + 1))
+    if i == -1 or not tag.startswith(data[i:]):
+        return 0
+    return len(data) - i
+
+
+class ThinkTagFilter:
+    """
+    Потоковый вариант strip_think_tags: принимает ответ модели кусками
+    и вырезает блоки think, даже если тег разрезан между кусками.
+
+    Видимый текст отдаётся сразу, как только ясно, что он не начало тега;
+    в буфере держится не больше len(тега) - 1 символов, поэтому весь поток
+    обрабатывается за O(n). Незакрытый блок think до конца потока считается
+    скрытым.
+    """
+
+    def __init__(self):
+        self._inside = False
+        self._pending = ""
+        self._started = False
+
+    def feed(self, chunk: str) -> str:
+        data = self._pending + chunk
+        self._pending = ""
+        out: list[str] = []
+        pos = 0
+        while True:
+            tag = _THINK_CLOSE if self._inside else _THINK_OPEN
+            idx = data.find(tag, pos)
+            if idx == -1:
+                end = len(data) - _partial_tag_len(data, tag, pos)
+                if not self._inside:
+                    out.append(data[pos:end])
+                self._pending = data[end:]
+                break
+            if not self._inside:
+                out.append(data[pos:idx])
+            pos = idx + len(tag)
+            self._inside = not self._inside
+        return self._emit("".join(out))
+
+    def flush(self) -> str:
+        """Отдаёт остаток буфера в конце потока."""
+        rest = "" if self._inside else self._pending
+        self._pending = ""
+        return self._emit(rest)
+
+    def _emit(self, text: str) -> str:
+        # Как и strip_think_tags, не отдаём пробелы/переводы строк перед первым видимым словом
+        if text and not self._started:
+            text = text.lstrip()
+            self._started = bool(text)
+        return text
@@ -1,13 +1,42 @@
 # main.py
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.database import engine, Base
-from app.routers import auth, resume, chat, session, vacancy, roadmap, goal
+from app.routers import auth, resume, chat, session, vacancy, roadmap, goal, metrics
 from app.config import FRONTEND_URL
+from app.llm_admission import LLMOverloadedError
+from app.llm_client import start_llm_client, close_llm_client
+from app.rag.settings import RAG_ENABLED
+from app.rag.vectorstore import warm_up as warm_up_rag
 
 Base.metadata.create_all(engine)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start_llm_client()
+    if RAG_ENABLED:
+        # В фоне: запросы, пришедшие раньше, дождутся инициализации под блокировкой
+        app.state.rag_warm_up = asyncio.create_task(asyncio.to_thread(warm_up_rag))
+    yield
+    await close_llm_client()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.exception_handler(LLMOverloadedError)
+async def llm_overloaded_handler(request: Request, exc: LLMOverloadedError):
+    # Очередь к модели переполнена — просим клиента повторить позже
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Модель перегружена, повторите запрос позже"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 
 app.add_middleware(
     CORSMiddleware,
@@ -23,4 +52,5 @@ app.include_router(chat.router)
 app.include_router(session.router)
 app.include_router(vacancy.router)
 app.include_router(roadmap.router)
-app.include_router(goal.router)
\ No newline at end of file
+app.include_router(goal.router)
+app.include_router(metrics.router)
\ No newline at end of file
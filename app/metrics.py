@@ -0,0 +1,80 @@
+# app/metrics.py
+import threading
+from collections import deque
+from collections.abc import Callable
+
+
+class LatencyStat:
+    """Скользящее окно последних замеров (в мс) для расчёта перцентилей."""
+
+    def __init__(self, window: int = 1000):
+        self._values: deque[float] = deque(maxlen=window)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value_ms: float) -> None:
+        with self._lock:
+            self._values.append(value_ms)
+            self._count += 1
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def percentile(self, q: float) -> float | None:
+        with self._lock:
+            values = sorted(self._values)
+        if not values:
+            return None
+        idx = min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))
+        return values[idx]
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self._count,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+_lock = threading.Lock()
+_latencies: dict[str, LatencyStat] = {}
+_counters: dict[str, int] = {}
+_gauges: dict[str, Callable[[], float]] = {}
+
+
+def get_latency(name: str) -> LatencyStat:
+    with _lock:
+        stat = _latencies.get(name)
+        if stat is None:
+            stat = _latencies[name] = LatencyStat()
+        return stat
+
+
+def observe(name: str, value_ms: float) -> None:
+    get_latency(name).observe(value_ms)
+
+
+def incr(name: str, n: int = 1) -> None:
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def register_gauge(name: str, fn: Callable[[], float]) -> None:
+    """Значение, которое считается в момент запроса метрик (размер кэша, длина очереди)."""
+    with _lock:
+        _gauges[name] = fn
+
+
+def snapshot() -> dict:
+    """Текущее состояние всех счётчиков, датчиков и латентностей (для GET /metrics)."""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        latencies = dict(_latencies)
+    return {
+        "counters": counters,
+        "gauges": {name: fn() for name, fn in gauges.items()},
+        "latency_ms": {name: stat.snapshot() for name, stat in latencies.items()},
+    }
@@ -56,6 +56,9 @@ class Session(Base):
     agent_type = Column(Enum(AgentType), nullable=False)
     status = Column(Enum(SessionStatus), default=SessionStatus.ACTIVE)
     vacancy_text = Column(Text, nullable=True)
+    # Конспект старой части диалога и id последнего свёрнутого в него сообщения
+    history_summary = Column(Text, nullable=True)
+    summarized_until_id = Column(Integer, nullable=True)
 
     user = relationship("User", back_populates="sessions")
     resume = relationship("Resume", back_populates="sessions")
@@ -70,6 +73,8 @@ class Message(Base):
     session_id = Column(Integer, ForeignKey("sessions.id"), nullable=False)
     role = Column(String(20), nullable=False)
     content = Column(Text, nullable=False)
+    # Размер промпта (в токенах), на который был сгенерирован ответ ассистента
+    prompt_tokens = Column(Integer, nullable=True)
 
     session = relationship("Session", back_populates="messages")
 
@@ -1,25 +1,302 @@
+"""
+Сборка индекса handbook в Chroma.
+
+Пересборка инкрементальная: рядом с индексом лежит манифест (RAG_INDEX_MANIFEST)
+с хешами файлов и чанков. Неизменённые файлы даже не перечитываются на чанки,
+эмбеддятся только новые и изменённые чанки, чанки удалённых файлов удаляются
+из коллекции. Если сменилась модель эмбеддингов, коллекция или чанкер, либо
+манифест не сходится с индексом — индекс собирается заново. Если сменились
+правила тем (app/rag/topics.py), перечитываются все файлы, но эмбеддятся
+только фрагменты с новой темой.
+
+Чанки идут в индекс потоком (см. vectorstore.upsert_stream): файлы читаются
+по одному, эмбеддинг и запись — пачками, память не растёт с размером корпуса.
+
+Почти-дубликаты фрагментов (зеркала статей, копии handbook среди скачанных
+страниц) отсекаются MinHash/LSH до эмбеддинга (app/rag/dedup.py, RAG_DEDUP);
+в манифесте у файла хранится, какой фрагмент чьим дубликатом оказался (id и
+хеш оригинала). Если оригинал изменился или исчез, файл с его дубликатами
+перечитывается.
+
+В конце по содержимому коллекции пересобирается лексический индекс BM25
+(app/rag/lexical.py) — если что-то изменилось или его ещё нет.
+
+Запуск:
+  python -m app.rag.build_index                          # инкрементально
+  python -m app.rag.build_index --full                   # игнорировать манифест
+  python -m app.rag.build_index --sources handbook         # без скачанных страниц
+"""
 from __future__ import annotations
 
-from app.rag.handbook_loader import load_handbook_chunks
-from app.rag.settings import RAG_HANDBOOK_DIR
-from app.rag.vectorstore import upsert_texts
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+from app.rag.dedup import MinHashDeduper
+from app.rag.handbook_loader import CHUNKER_VERSION, DocChunk, iter_file_chunks, list_handbook_files
+from app.rag.lexical import build_lexical_index
+from app.rag.query_cache import invalidate_query_cache
+from app.rag.scraped_loader import (
+    ID_PREFIX as SCRAPED_PREFIX,
+    iter_scraped_file_chunks,
+    list_scraped_files,
+    load_link_topics,
+)
+from app.rag.settings import (
+    RAG_COLLECTION,
+    RAG_DEDUP,
+    RAG_DEDUP_BANDS,
+    RAG_DEDUP_PATH,
+    RAG_DEDUP_PERMUTATIONS,
+    RAG_DEDUP_SHINGLE,
+    RAG_DEDUP_THRESHOLD,
+    RAG_EMBED_MODEL,
+    RAG_HANDBOOK_DIR,
+    RAG_INDEX_MANIFEST,
+    RAG_LEXICAL_DIR,
+    RAG_SCRAPED_DIR,
+    RAG_SCRAPED_LINKS,
+    RAG_SOURCES,
+)
+from app.rag.topics import EXTERNAL_TOPIC, TOPICS_VERSION
+from app.rag.vectorstore import delete_ids, get_documents, list_ids, upsert_stream
+
+MANIFEST_VERSION = 1
+
+
+@dataclass
+class BuildReport:
+    files: int = 0
+    files_changed: int = 0
+    added: int = 0
+    changed: int = 0
+    removed: int = 0
+    unchanged: int = 0
+    deduplicated: int = 0                     # почти-дубликаты, не попавшие в индекс (сэкономленные векторы)
+    full: bool = False
+    seconds: float = 0.0
+    embed_seconds: float = 0.0
+
+    @property
+    def chunks_per_sec(self) -> float:
+        embedded = self.added + self.changed
+        return embedded / self.embed_seconds if self.embed_seconds else 0.0
+
+    def __str__(self) -> str:
+        mode = "full" if self.full else "incremental"
+        return (
+            f"{mode} build: files={self.files} (changed {self.files_changed}), "
+            f"chunks added={self.added} changed={self.changed} removed={self.removed} "
+            f"unchanged={self.unchanged} deduplicated={self.deduplicated}, {self.seconds:.1f}s ({self.chunks_per_sec:.1f} chunks/s)"
+        )
+
+
+@dataclass
+class _SourceFile:
+    key: str                                  # ключ в манифесте, он же префикс id чанков
+    path: Path
+    load: Callable[[], Iterable[DocChunk]]
+    extra: str = ""                           # входит в хеш файла: метаданные не из его текста
 
 
-def build_index() -> int:
-    chunks = load_handbook_chunks(RAG_HANDBOOK_DIR)
-    if not chunks:
+def _handbook_files() -> list[_SourceFile]:
+    root = Path(RAG_HANDBOOK_DIR).expanduser().resolve()
+    files = list_handbook_files(root)
+    if not files:
         raise RuntimeError(
             "No handbook documents found to index. "
             "Check RAG_HANDBOOK_DIR and that tech-interview-handbook-main is available inside the container."
         )
-    ids = [c.id for c in chunks]
-    texts = [c.text for c in chunks]
-    metas = [{"source": c.source, "title": c.title} for c in chunks]
-    upsert_texts(ids=ids, texts=texts, metadatas=metas)
-    return len(chunks)
+    return [
+        _SourceFile(str(p.relative_to(root)), p, lambda p=p: iter_file_chunks(p, root))
+        for p in files
+    ]
 
 
-if __name__ == "__main__":
-    count = build_index()
-    print(f"Indexed chunks: {count}")
+def _scraped_files() -> list[_SourceFile]:
+    root = Path(RAG_SCRAPED_DIR).expanduser().resolve()
+    topics = load_link_topics(Path(RAG_SCRAPED_LINKS).expanduser())
+    files = []
+    for p, url in list_scraped_files(root):
+        topic = topics.get(url, EXTERNAL_TOPIC)
+        files.append(_SourceFile(SCRAPED_PREFIX + str(p.relative_to(root)), p,
+                                 lambda p=p, url=url, topic=topic: iter_scraped_file_chunks(p, root, url, topic),
+                                 extra=topic))
+    return files
+
+
+_SOURCES = {"handbook": _handbook_files, "scraped": _scraped_files}
+
+
+def _file_hash(path: Path, extra: str = "") -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    h.update(extra.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _chunk_hash(chunk: DocChunk) -> str:
+    # В хеш входят и метаданные: смена заголовка тоже должна попасть в индекс
+    payload = "\0".join((chunk.text, chunk.source, chunk.title or "", chunk.section or "", chunk.topic or ""))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
 
+def _chunk_metadata(chunk: DocChunk) -> dict:
+    meta = {"source": chunk.source, "title": chunk.title}
+    if chunk.section:
+        meta["section"] = chunk.section
+    if chunk.topic:
+        meta["topic"] = chunk.topic
+    return meta
+
+
+def _dedup_version() -> str:
+    if not RAG_DEDUP:
+        return "off"
+    # by-topic: дубликаты ищутся в пределах темы, прежние сборки отбрасывали и межтемные
+    return f"minhash-{RAG_DEDUP_PERMUTATIONS}x{RAG_DEDUP_BANDS}-w{RAG_DEDUP_SHINGLE}-{RAG_DEDUP_THRESHOLD}-by-topic"
+
+
+def _manifest_header() -> dict:
+    return {
+        "version": MANIFEST_VERSION,
+        "embed_model": RAG_EMBED_MODEL,
+        "collection": RAG_COLLECTION,
+        "chunker": CHUNKER_VERSION,
+        "topics": TOPICS_VERSION,
+        "dedup": _dedup_version(),
+    }
+
+
+def _load_manifest(path: str) -> dict | None:
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # Смена правил тем не требует новых эмбеддингов: файлы перечитываются, а
+    # переписываются только фрагменты, у которых поменялась тема (она входит в хеш)
+    if any(manifest.get(k) != v for k, v in _manifest_header().items() if k != "topics"):
+        return None
+    return manifest
+
+
+def _save_manifest(path: str, files: dict) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({**_manifest_header(), "files": files}, f, ensure_ascii=False)
+    # Атомарная замена: прерванная сборка не оставит битый манифест
+    os.replace(tmp, path)
+
+
+def _print_progress(started: float) -> Callable[[int], None]:
+    def on_progress(done: int) -> None:
+        elapsed = time.perf_counter() - started
+        print(f"  embedded {done} chunks, {done / elapsed:.1f} chunks/s", file=sys.stderr)
+    return on_progress
+
+
+def build_index(full: bool = False, sources: list[str] | None = None, progress: bool = False) -> BuildReport:
+    started = time.perf_counter()
+    files: list[_SourceFile] = []
+    for name in sources or RAG_SOURCES:
+        if name not in _SOURCES:
+            raise ValueError(f"Unknown RAG source: {name} (expected one of {', '.join(_SOURCES)})")
+        files.extend(_SOURCES[name]())
+
+    manifest = None if full else _load_manifest(RAG_INDEX_MANIFEST)
+    old_files: dict = manifest["files"] if manifest else {}
+    existing_ids = set(list_ids())
+    if manifest and existing_ids != {cid for f in old_files.values() for cid in f["chunks"]}:
+        # Индекс трогали мимо манифеста (удалили persist-каталог, собрали другим способом)
+        old_files = {}
+    report = BuildReport(files=len(files), full=not old_files)
+    old_ids = {cid for f in old_files.values() for cid in f["chunks"]}
+    digests = {f.key: _file_hash(f.path, f.extra) for f in files}
+    unchanged = {f.key for f in files if f.key in old_files and old_files[f.key]["sha256"] == digests[f.key]}
+    if manifest and manifest.get("topics") != TOPICS_VERSION:
+        unchanged = set()
+    new_files: dict = {key: old_files[key] for key in unchanged}
+    hashes = {cid: h for f in new_files.values() for cid, h in f["chunks"].items()}
+    embedded: set[str] = set()
+
+    deduper = None
+    if RAG_DEDUP:
+        deduper = MinHashDeduper(RAG_DEDUP_THRESHOLD, RAG_DEDUP_PERMUTATIONS, RAG_DEDUP_BANDS, RAG_DEDUP_SHINGLE)
+        # Неизменённые файлы не перечитываются — их фрагменты сверяются по сохранённым сигнатурам
+        deduper.load(RAG_DEDUP_PATH, {cid for key in unchanged for cid in old_files[key]["chunks"]})
+
+    def changed_records(batch: list[_SourceFile]) -> Iterator[tuple[str, str, dict]]:
+        """Чанки, которые нужно (пере)эмбеддить; попутно заполняет new_files."""
+        for f in batch:
+            old = old_files.get(f.key)
+            old_chunks = old["chunks"] if old else {}
+            chunks, duplicates = {}, {}
+            for chunk in f.load():
+                original = deduper.check(chunk.id, chunk.text, chunk.topic) if deduper is not None else None
+                if original is not None:
+                    duplicates[chunk.id] = [original, hashes[original]]
+                    continue
+                chunks[chunk.id] = hashes[chunk.id] = _chunk_hash(chunk)
+                if chunk.id in embedded or old_chunks.get(chunk.id) == chunks[chunk.id]:
+                    continue
+                embedded.add(chunk.id)
+                yield chunk.id, chunk.text, _chunk_metadata(chunk)
+            new_files[f.key] = {"sha256": digests[f.key], "chunks": chunks}
+            if duplicates:
+                new_files[f.key]["duplicates"] = duplicates
+
+    pending = [f for f in files if f.key not in unchanged]
+    while pending:
+        embed_started = time.perf_counter()
+        upsert_stream(changed_records(pending), on_progress=_print_progress(embed_started) if progress else None)
+        report.embed_seconds += time.perf_counter() - embed_started
+        live = {cid: h for f in new_files.values() for cid, h in f["chunks"].items()}
+        # Оригинал дубликата изменился, исчез или сам стал дубликатом — файл перечитывается,
+        # иначе его текст пропадёт из индекса. Во втором проходе все оригиналы уже актуальны.
+        pending = [
+            f for f in files
+            if any(live.get(orig) != h for orig, h in new_files[f.key].get("duplicates", {}).values())
+        ]
+
+    live_ids = {cid for f in new_files.values() for cid in f["chunks"]}
+    report.files_changed = len(files) - len(unchanged)
+    report.added = len(embedded - old_ids)
+    report.changed = len(embedded & old_ids)
+    report.unchanged = len(live_ids) - len(embedded)
+    report.deduplicated = sum(len(f.get("duplicates", {})) for f in new_files.values())
+    stale = sorted(existing_ids - live_ids)
+    report.removed = len(stale)
+    delete_ids(stale)
+    if report.added or report.changed or report.removed or not os.path.isfile(
+        os.path.join(RAG_LEXICAL_DIR, "postings.npz")
+    ):
+        build_lexical_index(*get_documents())
+    if deduper is not None:
+        deduper.save(RAG_DEDUP_PATH, live_ids)
+    _save_manifest(RAG_INDEX_MANIFEST, new_files)
+    invalidate_query_cache()
+
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сборка RAG-индекса по Tech Interview Handbook")
+    parser.add_argument("--full", action="store_true", help="Пересобрать всё, игнорируя манифест")
+    parser.add_argument("--sources", default=None, help="Источники через запятую (по умолчанию RAG_SOURCES)")
+    cli_args = parser.parse_args()
+    print(build_index(
+        full=cli_args.full,
+        sources=cli_args.sources.split(",") if cli_args.sources else None,
+        progress=True,
+    ))
@@ -0,0 +1,225 @@
+"""
+Чанкер markdown с учётом структуры.
+
+Текст режется по заголовкам, абзацам и fenced-блокам кода (```/~~~), а не
+по фиксированному числу символов: фрагмент не обрывается посреди
+предложения или кода, и нет дублирующего перекрытия. Размер считается
+в токенах модели эмбеддингов (RAG_CHUNK_TOKENS). Путь заголовков
+(«Раздел > Подраздел») отдаётся вместе с текстом и пишется в метаданные.
+
+Строки читаются потоком, в памяти — только текущий фрагмент.
+"""
+from __future__ import annotations
+
+import logging
+import re
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from functools import lru_cache
+
+from app.rag.settings import RAG_CHUNK_MIN_TOKENS, RAG_CHUNK_TOKENIZER, RAG_CHUNK_TOKENS, RAG_EMBED_MODEL
+
+logger = logging.getLogger(__name__)
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+# Служебные строки MDX: import/export и строки, состоящие из одного HTML/JSX-тега
+_MDX_NOISE_RE = re.compile(r"^\s*((import|export)\s|</?[A-Za-z][^>]*>\s*$)")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+_FRONT_TITLE_RE = re.compile(r"^title:\s*(.+?)\s*$")
+
+
+@dataclass(frozen=True)
+class TextChunk:
+    text: str
+    section: str          # путь заголовков, "" — до первого заголовка
+    tokens: int
+
+
+def _count_words(text: str) -> int:
+    return len(_WORD_RE.findall(text))
+
+
+@lru_cache(maxsize=1)
+def get_token_counter() -> Callable[[str], int]:
+    """
+    Счётчик токенов модели эмбеддингов (её же токенизатор из FastEmbed).
+    Если модель недоступна или RAG_CHUNK_TOKENIZER=words — приближение по словам
+    и знакам препинания.
+    """
+    if RAG_CHUNK_TOKENIZER == "words":
+        return _count_words
+    try:
+        from app.rag.vectorstore import get_tokenizer
+
+        tokenizer = get_tokenizer()
+    except Exception:
+        tokenizer = None
+    if tokenizer is None:
+        logger.warning("Tokenizer for %s unavailable, estimating tokens by words", RAG_EMBED_MODEL)
+        return _count_words
+    # Токенизатор общий с моделью и обрезает вход до её окна — для решения «влезает ли
+    # в RAG_CHUNK_TOKENS» этого достаточно, настройки не трогаем
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+def _iter_blocks(lines: Iterable[str], meta: dict) -> Iterator[tuple[str, str]]:
+    """
+    Блоки markdown: ("heading", строка), ("code", весь fenced-блок), ("text", абзац).
+    Front matter пропускается, его title кладётся в meta["title"].
+    """
+    para: list[str] = []
+    code: list[str] | None = None
+    fence = ""
+    first = True
+    in_front = False
+    for raw in lines:
+        line = raw.rstrip("\n").rstrip()
+        if first:
+            first = False
+            if line == "---":
+                in_front = True
+                continue
+        if in_front:
+            if line == "---":
+                in_front = False
+            elif m := _FRONT_TITLE_RE.match(line):
+                meta.setdefault("title", m.group(1).strip("'\""))
+            continue
+
+        if code is not None:
+            code.append(line)
+            if line.strip().startswith(fence):
+                yield "code", "\n".join(code)
+                code = None
+            continue
+        if m := _FENCE_RE.match(line):
+            if para:
+                yield "text", "\n".join(para)
+                para = []
+            code = [line]
+            fence = m.group(1)
+            continue
+        if _HEADING_RE.match(line):
+            if para:
+                yield "text", "\n".join(para)
+                para = []
+            yield "heading", line
+            continue
+        if not line.strip() or _MDX_NOISE_RE.match(line):
+            if para:
+                yield "text", "\n".join(para)
+                para = []
+            continue
+        para.append(line)
+
+    if code is not None:
+        yield "code", "\n".join(code)  # незакрытый блок кода — отдаём как есть
+    if para:
+        yield "text", "\n".join(para)
+
+
+def markdown_title(lines: Iterable[str]) -> str | None:
+    """
+    Заголовок документа: title из front matter или первый заголовок вне блоков кода.
+    Читает строки только до первого заголовка.
+    """
+    meta: dict = {}
+    for kind, text in _iter_blocks(lines, meta):
+        if kind == "heading":
+            return meta.get("title") or _HEADING_RE.match(text).group(2)
+    return meta.get("title")
+
+
+def _split_units(kind: str, text: str) -> tuple[list[str], str, str]:
+    """Единицы, на которые можно резать блок, и обрамление для кусков кода."""
+    if kind == "code":
+        lines = text.split("\n")
+        opening = lines[0]
+        closing = lines[-1] if len(lines) > 1 and _FENCE_RE.match(lines[-1]) else ""
+        body = lines[1:-1] if closing else lines[1:]
+        return body, opening + "\n", ("\n" + closing if closing else "")
+    lines = text.split("\n")
+    if len(lines) > 1:
+        return lines, "", ""
+    sentences = _SENTENCE_RE.split(text)
+    if len(sentences) > 1:
+        return sentences, "", ""
+    return text.split(" "), "", ""
+
+
+def _fit(kind: str, text: str, count: Callable[[str], int], max_tokens: int) -> Iterator[tuple[str, int]]:
+    """Блок целиком, если влезает, иначе — куски не больше max_tokens (рекурсивно: строки → предложения → слова)."""
+    n = count(text)
+    if n <= max_tokens:
+        yield text, n
+        return
+    units, prefix, suffix = _split_units(kind, text)
+    if len(units) <= 1:
+        yield text, n  # неделимый кусок (одно очень длинное слово)
+        return
+    budget = max(1, max_tokens - count(prefix + suffix))
+    sep = " " if kind == "text" and "\n" not in text else "\n"
+    buf: list[str] = []
+    buf_tokens = 0
+    for unit in units:
+        unit_tokens = count(unit)
+        if unit_tokens > budget:
+            if buf:
+                yield prefix + sep.join(buf) + suffix, buf_tokens
+                buf, buf_tokens = [], 0
+            for piece, piece_tokens in _fit("text", unit, count, budget):
+                yield prefix + piece + suffix, piece_tokens
+            continue
+        if buf and buf_tokens + unit_tokens > budget:
+            yield prefix + sep.join(buf) + suffix, buf_tokens
+            buf, buf_tokens = [], 0
+        buf.append(unit)
+        buf_tokens += unit_tokens
+    if buf:
+        yield prefix + sep.join(buf) + suffix, buf_tokens
+
+
+def iter_markdown_chunks(
+    lines: Iterable[str],
+    max_tokens: int = RAG_CHUNK_TOKENS,
+    min_tokens: int = RAG_CHUNK_MIN_TOKENS,
+    count_tokens: Callable[[str], int] | None = None,
+    meta: dict | None = None,
+) -> Iterator[TextChunk]:
+    """
+    Фрагменты до max_tokens токенов. Новый заголовок начинает новый фрагмент,
+    если в текущем уже набралось min_tokens — иначе короткий раздел
+    приклеивается к следующему, а не превращается в отдельный огрызок.
+    """
+    count = count_tokens or get_token_counter()
+    meta = meta if meta is not None else {}
+    path: list[tuple[int, str]] = []
+    buf: list[str] = []
+    buf_tokens = 0
+    section = ""
+
+    def section_path() -> str:
+        return " > ".join(title for _, title in path)
+
+    for kind, text in _iter_blocks(lines, meta):
+        if kind == "heading":
+            m = _HEADING_RE.match(text)
+            level, title = len(m.group(1)), m.group(2)
+            if buf and buf_tokens >= min_tokens:
+                yield TextChunk("\n\n".join(buf), section, buf_tokens)
+                buf, buf_tokens = [], 0
+            path = [h for h in path if h[0] < level] + [(level, title)]
+            if not buf:
+                section = section_path()
+        for piece, n in _fit(kind, text, count, max_tokens):
+            if buf and buf_tokens + n > max_tokens:
+                yield TextChunk("\n\n".join(buf), section, buf_tokens)
+                buf, buf_tokens = [], 0
+            if not buf:
+                section = section_path()
+            buf.append(piece)
+            buf_tokens += n
+    if buf:
+        yield TextChunk("\n\n".join(buf), section, buf_tokens)
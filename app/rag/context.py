@@ -0,0 +1,149 @@
+"""
+Сборка контекста RAG для промпта из найденных фрагментов.
+
+Раньше фрагменты шли в промпт по рангу, пока не кончится RAG_MAX_CONTEXT_CHARS.
+Соседние фрагменты одного файла при этом повторяли друг друга (перекрытие
+старого чанкера) и съедали бюджет. Теперь:
+  1. порядок — MMR по эмбеддингам, которые уже вернул поиск: следующим берётся
+     фрагмент, релевантный, но не похожий на уже выбранные;
+  2. выбранные фрагменты одного файла с соседними номерами (<путь>::chunk::N,
+     N+1, …) склеиваются в один отрывок, перекрытие вырезается;
+  3. отрывки идут в промпт в порядке MMR, пока помещаются в бюджет.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+from app import metrics
+from app.rag.settings import RAG_MAX_CONTEXT_CHARS, RAG_MMR_LAMBDA, RAG_TOP_K
+
+_CHUNK_ID_RE = re.compile(r"^(?P<file>.*)::chunk::(?P<idx>\d+)$")
+# Перекрытие старого чанкера — 200 символов; ищем с запасом
+_MAX_OVERLAP_CHARS = 400
+CONTEXT_HEADER = "TECH INTERVIEW HANDBOOK (RAG):\n"
+
+
+@dataclass
+class _Span:
+    file: str
+    first: int
+    last: int
+    rank: int                          # позиция лучшего фрагмента в порядке MMR
+    meta: dict[str, Any]
+    text: str
+
+
+def mmr_order(hits: list[dict[str, Any]], limit: int, lambda_: float = RAG_MMR_LAMBDA) -> list[dict[str, Any]]:
+    """
+    Maximal Marginal Relevance: score = λ·релевантность − (1−λ)·max cos с выбранными.
+    Релевантность — по рангу в выдаче (у RRF- и BM25-попаданий нет сопоставимой
+    distance). Фрагменты без эмбеддинга (только из BM25) штрафа за похожесть не получают.
+    """
+    if len(hits) <= 1 or lambda_ >= 1:
+        return hits[:limit]
+    n = len(hits)
+    relevance = 1 - np.arange(n, dtype=np.float32) / n
+    vectors = np.zeros((n, 0), dtype=np.float32)
+    has_vec = np.array([h.get("embedding") is not None for h in hits])
+    if has_vec.any():
+        dim = len(next(h["embedding"] for h in hits if h.get("embedding") is not None))
+        vectors = np.zeros((n, dim), dtype=np.float32)
+        for i, h in enumerate(hits):
+            if has_vec[i]:
+                vec = np.asarray(h["embedding"], dtype=np.float32)
+                norm = float(np.linalg.norm(vec))
+                vectors[i] = vec / norm if norm else vec
+    similarity = vectors @ vectors.T if vectors.shape[1] else np.zeros((n, n), dtype=np.float32)
+
+    selected: list[int] = []
+    max_sim = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    while available.any() and len(selected) < limit:
+        scores = np.where(available, lambda_ * relevance - (1 - lambda_) * max_sim, -np.inf)
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        max_sim = np.maximum(max_sim, similarity[best])
+    return [hits[i] for i in selected]
+
+
+def _overlap(left: str, right: str) -> int:
+    """Длина самого длинного суффикса left, который является префиксом right."""
+    tail = left[-_MAX_OVERLAP_CHARS:]
+    probe = right[:32]
+    if not probe:
+        return 0
+    pos = tail.find(probe)
+    while pos != -1:
+        if right.startswith(tail[pos:]):
+            return len(tail) - pos
+        pos = tail.find(probe, pos + 1)
+    return 0
+
+
+def _join(left: str, right: str) -> str:
+    cut = _overlap(left, right)
+    if cut:
+        return left + right[cut:]
+    return left.rstrip() + "\n\n" + right.lstrip()
+
+
+def merge_spans(hits: list[dict[str, Any]]) -> list[_Span]:
+    """Соседние фрагменты одного файла → отрывки; порядок — по лучшему рангу внутри отрывка."""
+    by_file: dict[str, list[tuple[int, int, dict[str, Any]]]] = {}
+    spans: list[_Span] = []
+    for rank, hit in enumerate(hits):
+        m = _CHUNK_ID_RE.match(hit["id"])
+        if m is None:
+            spans.append(_Span(hit["id"], 0, 0, rank, hit.get("meta") or {}, hit.get("text") or ""))
+            continue
+        by_file.setdefault(m["file"], []).append((int(m["idx"]), rank, hit))
+
+    for file, items in by_file.items():
+        items.sort(key=lambda item: item[0])
+        span: _Span | None = None
+        for idx, rank, hit in items:
+            text = hit.get("text") or ""
+            if span is not None and idx == span.last + 1:
+                span.text = _join(span.text, text)
+                span.last = idx
+                span.rank = min(span.rank, rank)
+                continue
+            if span is not None and idx == span.last:
+                continue  # тот же фрагмент дважды (из разных частей запроса)
+            span = _Span(file, idx, idx, rank, hit.get("meta") or {}, text)
+            spans.append(span)
+    spans.sort(key=lambda s: s.rank)
+    return spans
+
+
+def build_context(
+    hits: list[dict[str, Any]],
+    max_chars: int = RAG_MAX_CONTEXT_CHARS,
+    top_k: int = RAG_TOP_K,
+) -> str:
+    """Блок контекста для промпта ("" — если нечего подмешать)."""
+    if not hits:
+        return ""
+    spans = merge_spans(mmr_order(hits, top_k))
+    blocks: list[str] = []
+    total = 0
+    for span in spans:
+        meta = span.meta
+        src = meta.get("source") or "unknown"
+        title = meta.get("title")
+        header = f"[{len(blocks) + 1}] {title + ' — ' if title else ''}{src}"
+        block = f"{header}\n{span.text.strip()}"
+        # Не влезший отрывок пропускаем: следующий может оказаться короче
+        if total + len(block) > max_chars:
+            continue
+        blocks.append(block)
+        total += len(block) + 2
+    if not blocks:
+        return ""
+    metrics.incr("rag.context_chars", total)
+    return CONTEXT_HEADER + "\n\n".join(blocks)
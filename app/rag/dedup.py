@@ -0,0 +1,148 @@
+"""
+Удаление почти-дубликатов фрагментов при сборке индекса (MinHash + LSH).
+
+Скачанные страницы часто зеркалят друг друга и сам handbook (копии статей
+на dev.to и Medium, страницы самого techinterviewhandbook.org), и без
+фильтра один и тот же текст попадает в индекс несколько раз: лишние
+векторы, а в выдаче — повторы вместо разных фрагментов.
+
+Фрагмент → множество шинглов (по RAG_DEDUP_SHINGLE слов подряд) →
+MinHash-сигнатура из RAG_DEDUP_PERMUTATIONS минимумов. Сигнатура режется на
+RAG_DEDUP_BANDS полос, фрагменты с совпавшей полосой — кандидаты; дубликатом
+считается кандидат, у которого доля совпавших минимумов (оценка Jaccard)
+не ниже RAG_DEDUP_THRESHOLD. В индекс попадает первый встреченный фрагмент
+(handbook идёт раньше скачанных страниц). Фрагменты сравниваются только в
+пределах одной темы: иначе вместо выброшенного остался бы фрагмент, который
+агенту с другим фильтром тем не виден.
+
+Сигнатуры оставленных фрагментов сохраняются в RAG_DEDUP_PATH: при
+инкрементальной сборке неизменённые файлы не перечитываются, а новые
+фрагменты всё равно сверяются с ними.
+"""
+from __future__ import annotations
+
+import os
+import re
+import zlib
+
+import numpy as np
+
+_WORD_RE = re.compile(r"\w+")
+_SHINGLE_BASE = np.uint64(0x9E3779B97F4A7C15)
+
+
+class MinHashDeduper:
+    def __init__(self, threshold: float, num_perm: int, bands: int, shingle: int, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError(f"RAG_DEDUP_PERMUTATIONS ({num_perm}) must be divisible by RAG_DEDUP_BANDS ({bands})")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle = shingle
+        # Перестановки h(x) = (a·x + b) mod 2^64 >> 32 (multiply-shift); seed фиксирован —
+        # сигнатуры стабильны между сборками
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(0, 1 << 64, num_perm, dtype=np.uint64, endpoint=False) | np.uint64(1)
+        self._b = rng.integers(0, 1 << 64, num_perm, dtype=np.uint64, endpoint=False)
+        self._word_hashes: dict[str, int] = {}
+        self._ids: list[str] = []
+        self._positions: dict[str, int] = {}
+        self._signatures: list[np.ndarray] = []
+        self._topics: list[str] = []
+        self._buckets: dict[tuple[str, int, bytes], list[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def signature(self, text: str) -> np.ndarray | None:
+        """MinHash-сигнатура (uint32, num_perm); None — в тексте нет слов."""
+        words = _WORD_RE.findall(text.lower())
+        if not words:
+            return None
+        cache = self._word_hashes
+        hashes = np.array(
+            [cache.get(w) or cache.setdefault(w, zlib.crc32(w.encode("utf-8"))) for w in words],
+            dtype=np.uint64,
+        )
+        # Хеш шингла — полиномиальный по хешам слов, все 64 бита: без переполнения
+        # в a·x перестановки стали бы монотонными и минимум всегда давал бы один шингл
+        k = min(self.shingle, len(words))
+        n = len(words) - k + 1
+        shingles = hashes[:n].copy()
+        for j in range(1, k):
+            shingles = shingles * _SHINGLE_BASE + hashes[j:j + n]
+        shingles = np.unique(shingles)
+        return ((shingles[:, None] * self._a + self._b) >> np.uint64(32)).min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray, topic: str) -> list[tuple[str, int, bytes]]:
+        return [
+            (topic, band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def find(self, signature: np.ndarray, topic: str = "") -> str | None:
+        """id самого похожего из уже добавленных фрагментов той же темы, если он ближе порога."""
+        candidates = {i for key in self._band_keys(signature, topic) for i in self._buckets.get(key, ())}
+        best, best_similarity = None, self.threshold
+        for i in candidates:
+            similarity = float(np.count_nonzero(self._signatures[i] == signature)) / self.num_perm
+            if similarity >= best_similarity:
+                best, best_similarity = i, similarity
+        return self._ids[best] if best is not None else None
+
+    def add(self, chunk_id: str, signature: np.ndarray, topic: str = "") -> None:
+        idx = len(self._ids)
+        self._positions[chunk_id] = idx
+        self._ids.append(chunk_id)
+        self._signatures.append(signature)
+        self._topics.append(topic)
+        for key in self._band_keys(signature, topic):
+            self._buckets.setdefault(key, []).append(idx)
+
+    def check(self, chunk_id: str, text: str, topic: str | None = None) -> str | None:
+        """
+        id фрагмента той же темы, почти-дубликатом которого является text (его
+        индексировать не нужно), или None — тогда фрагмент запоминается как оригинал.
+        Уже запомненный оригинал (повторная проверка того же файла) остаётся оригиналом.
+        """
+        if chunk_id in self._positions:
+            return None
+        signature = self.signature(text)
+        if signature is None:
+            return None
+        topic = topic or ""
+        duplicate_of = self.find(signature, topic)
+        if duplicate_of is None:
+            self.add(chunk_id, signature, topic)
+        return duplicate_of
+
+    def save(self, path: str, keep_ids: set[str]) -> None:
+        """Сигнатуры фрагментов из keep_ids (тех, что остались в индексе)."""
+        rows = [i for i, cid in enumerate(self._ids) if cid in keep_ids]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp.npz"
+        np.savez(
+            tmp,
+            ids=np.array([self._ids[i] for i in rows], dtype=str),
+            topics=np.array([self._topics[i] for i in rows], dtype=str),
+            signatures=np.stack([self._signatures[i] for i in rows]) if rows
+            else np.zeros((0, self.num_perm), dtype=np.uint32),
+        )
+        os.replace(tmp, path)
+
+    def load(self, path: str, keep_ids: set[str]) -> int:
+        """Добавляет сохранённые сигнатуры фрагментов из keep_ids; возвращает, сколько добавлено."""
+        try:
+            with np.load(path) as data:
+                ids, topics, signatures = data["ids"], data["topics"], data["signatures"]
+        except (OSError, ValueError, KeyError):
+            return 0
+        if signatures.ndim != 2 or signatures.shape[1] != self.num_perm:
+            return 0
+        added = 0
+        for cid, topic, signature in zip(ids.tolist(), topics.tolist(), signatures):
+            if cid in keep_ids:
+                self.add(cid, signature, topic)
+                added += 1
+        return added
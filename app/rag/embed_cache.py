@@ -0,0 +1,94 @@
+"""
+LRU-кэш эмбеддингов запросов.
+
+Запрос в RAG каждый ход почти одинаковый (хвост резюме и вакансии + короткая
+реплика), а прогон ONNX-модели стоит миллисекунды CPU. Ключ — хеш
+нормализованного текста, значение — float32-вектор numpy (в ~7 раз компактнее
+списка Python float). Размер ограничен и числом записей, и байтами.
+"""
+from __future__ import annotations
+
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+from app import metrics
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Нормализация, не меняющая смысл для модели: NFC и схлопнутые пробелы."""
+    return _WS_RE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, max_entries: int, max_bytes: int, name: str = "rag.embed_cache"):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._data: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        # Средняя стоимость одного эмбеддинга — для оценки сэкономленного времени
+        self._embed_ms = 0.0
+        metrics.register_gauge(f"{name}.size", self.__len__)
+        metrics.register_gauge(f"{name}.bytes", lambda: self.nbytes)
+        metrics.register_gauge(f"{name}.hit_rate", self.hit_rate)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return round(self.hits / total, 4) if total else 0.0
+
+    def get(self, key: str) -> np.ndarray | None:
+        with self._lock:
+            vec = self._data.get(key)
+            if vec is None:
+                self.misses += 1
+            else:
+                self._data.move_to_end(key)
+                self.hits += 1
+            saved_ms = self._embed_ms
+        if vec is None:
+            metrics.incr(f"{self.name}.miss")
+        else:
+            metrics.incr(f"{self.name}.hit")
+            metrics.incr(f"{self.name}.saved_ms", round(saved_ms))
+        return vec
+
+    def put(self, key: str, vec: np.ndarray, embed_ms: float | None = None) -> np.ndarray:
+        vec = np.asarray(vec, dtype=np.float32)
+        vec.setflags(write=False)  # вектор отдаётся всем читателям — запрещаем правку на месте
+        with self._lock:
+            if embed_ms is not None:
+                # Экспоненциальное среднее: стоимость меняется с нагрузкой на CPU
+                self._embed_ms = embed_ms if not self._embed_ms else 0.9 * self._embed_ms + 0.1 * embed_ms
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            if vec.nbytes > self.max_bytes:
+                return vec
+            self._data[key] = vec
+            self.nbytes += vec.nbytes
+            while len(self._data) > self.max_entries or self.nbytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+        return vec
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
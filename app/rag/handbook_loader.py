@@ -1,8 +1,15 @@
 from __future__ import annotations
 
+import io
+import itertools
+from collections.abc import Callable, Iterator
 from dataclasses import dataclass
 from pathlib import Path
 
+from app.rag.chunker import iter_markdown_chunks, markdown_title
+from app.rag.settings import RAG_CHUNKER, RAG_CHUNK_MIN_TOKENS, RAG_CHUNK_TOKENIZER, RAG_CHUNK_TOKENS
+from app.rag.topics import topic_for_path
+
 
 @dataclass(frozen=True)
 class DocChunk:
@@ -10,9 +17,11 @@ class DocChunk:
     text: str
     source: str
     title: str | None = None
+    section: str | None = None   # путь заголовков внутри документа
+    topic: str | None = None     # тема по пути файла (app/rag/topics.py)
 
 
-def _iter_markdown_files(root: Path) -> list[Path]:
+def list_handbook_files(root: Path) -> list[Path]:
     # Берём только контент handbook (markdown). Исключаем исходники сайта.
     patterns = [
         "contents/**/*.md",
@@ -38,41 +47,85 @@ def _guess_title(text: str, fallback: str) -> str:
     return fallback
 
 
-def _chunk_text(text: str, chunk_size: int = 1200, overlap: int = 200) -> list[str]:
+# Меняется при любой правке чанкера — индекс по старому манифесту пересобирается целиком
+CHUNKER_VERSION = (
+    f"markdown-{RAG_CHUNK_TOKENIZER}-{RAG_CHUNK_TOKENS}-{RAG_CHUNK_MIN_TOKENS}-v1"
+    if RAG_CHUNKER == "markdown" else "chars-1200-200"
+)
+
+# Файл читается блоками такого размера (в символах), а не целиком
+READ_BLOCK_CHARS = 1 << 16
+
+
+def iter_chunk_text(read: Callable[[int], str], chunk_size: int = 1200, overlap: int = 200) -> Iterator[str]:
+    """
+    Окна по chunk_size символов с перекрытием overlap из потока текста.
+    read(n) — как у файла: следующие до n символов, "" в конце. В памяти
+    держится только текущее окно и один блок чтения.
+    """
     # Очень простой чанкер по длине, чтобы не тянуть зависимости.
-    if len(text) <= chunk_size:
-        return [text]
-    chunks: list[str] = []
-    i = 0
-    while i < len(text):
-        end = min(len(text), i + chunk_size)
-        chunk = text[i:end]
-        chunks.append(chunk)
-        if end == len(text):
-            break
-        i = max(0, end - overlap)
-    return chunks
+    buf = ""
+    eof = False
+    while True:
+        while not eof and len(buf) <= chunk_size:
+            block = read(READ_BLOCK_CHARS)
+            eof = not block
+            buf += block
+        yield buf[:chunk_size]
+        if eof and len(buf) <= chunk_size:
+            return
+        buf = buf[chunk_size - overlap:]
 
 
-def load_handbook_chunks(handbook_root: str) -> list[DocChunk]:
-    root = Path(handbook_root).expanduser().resolve()
-    files = _iter_markdown_files(root)
-
-    out: list[DocChunk] = []
-    for path in files:
-        raw = path.read_text(encoding="utf-8", errors="ignore")
-        title = _guess_title(raw, fallback=path.stem)
-        rel = str(path.relative_to(root))
-        pieces = _chunk_text(raw)
-        for idx, piece in enumerate(pieces):
-            chunk_id = f"{rel}::chunk::{idx}"
-            out.append(
-                DocChunk(
-                    id=chunk_id,
-                    text=piece,
+def chunk_text(text: str, chunk_size: int = 1200, overlap: int = 200) -> list[str]:
+    return list(iter_chunk_text(io.StringIO(text).read, chunk_size, overlap))
+
+
+def iter_file_chunks(path: Path, root: Path) -> Iterator[DocChunk]:
+    """Чанки одного файла по мере чтения; id вида <путь от корня>::chunk::<N>."""
+    rel = str(path.relative_to(root))
+    topic = topic_for_path(rel)
+    with path.open(encoding="utf-8", errors="ignore") as f:
+        if RAG_CHUNKER == "markdown":
+            # Заголовок нужен уже первому фрагменту, а он может закончиться до первого
+            # «#» — файл просматривается до заголовка и читается заново с начала
+            title = markdown_title(f) or path.stem
+            f.seek(0)
+            for idx, piece in enumerate(iter_markdown_chunks(f)):
+                yield DocChunk(
+                    id=f"{rel}::chunk::{idx}",
+                    text=piece.text,
                     source=rel,
                     title=title,
+                    section=piece.section or None,
+                    topic=topic,
                 )
+            return
+
+        # Заголовок ищем в первом блоке, дальше файл читается потоком
+        head = f.read(READ_BLOCK_CHARS)
+        title = _guess_title(head, fallback=path.stem)
+        stream = itertools.chain([head], iter(lambda: f.read(READ_BLOCK_CHARS), ""))
+        for idx, piece in enumerate(iter_chunk_text(lambda _n: next(stream, ""))):
+            yield DocChunk(
+                id=f"{rel}::chunk::{idx}",
+                text=piece,
+                source=rel,
+                title=title,
+                topic=topic,
             )
-    return out
 
+
+def load_file_chunks(path: Path, root: Path) -> list[DocChunk]:
+    return list(iter_file_chunks(path, root))
+
+
+def iter_handbook_chunks(handbook_root: str) -> Iterator[DocChunk]:
+    """Чанки handbook файл за файлом: в памяти только текущий файл."""
+    root = Path(handbook_root).expanduser().resolve()
+    for path in list_handbook_files(root):
+        yield from iter_file_chunks(path, root)
+
+
+def load_handbook_chunks(handbook_root: str) -> list[DocChunk]:
+    return list(iter_handbook_chunks(handbook_root))
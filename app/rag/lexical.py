@@ -0,0 +1,194 @@
+"""
+Лексический индекс BM25 по тем же фрагментам, что и в Chroma.
+
+Плотный поиск промахивается по точным терминам («Dijkstra», «STAR», «CAP
+theorem»), которые кандидат пишет дословно. Инвертированный индекс хранится
+массивами numpy в формате CSR: для терма t его постинги — doc_ids[offsets[t]:
+offsets[t+1]] и tfs[…] (int32 + uint16, 6 байт на постинг). Запрос — несколько
+векторных операций над постингами своих термов, без модели эмбеддингов, поэтому
+отвечает и тогда, когда модель ещё не загружена или перегружена.
+
+Индекс строится в конце build_index по всему содержимому коллекции и лежит
+в RAG_PERSIST_DIR/lexical/.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any
+
+import numpy as np
+
+from app import metrics
+from app.rag.settings import RAG_BM25_B, RAG_BM25_K1, RAG_LEXICAL_DIR
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from has have how i if in into is it its "
+    "me my no not of on or our so such than that the their them then there these they this "
+    "to was we were what when where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS and (len(t) > 1 or t.isdigit())]
+
+
+class LexicalIndex:
+    def __init__(
+        self,
+        vocab: dict[str, int],
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        tfs: np.ndarray,
+        doc_len: np.ndarray,
+        ids: list[str],
+        texts: list[str],
+        metas: list[dict[str, Any]],
+    ):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.ids = ids
+        self.texts = texts
+        self.metas = metas
+        self.avg_len = float(doc_len.mean()) if len(doc_len) else 0.0
+        self._topic_masks: dict[frozenset[str], np.ndarray] = {}
+        # Знаменатель BM25 без tf зависит только от документа — считаем один раз
+        self._len_norm = (RAG_BM25_K1 * (1 - RAG_BM25_B + RAG_BM25_B * doc_len / (self.avg_len or 1))).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, ids: list[str], texts: list[str], metas: list[dict[str, Any]]) -> LexicalIndex:
+        vocab: dict[str, int] = {}
+        postings: list[list[tuple[int, int]]] = []
+        doc_len = np.zeros(len(ids), dtype=np.int32)
+        for doc, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_len[doc] = sum(counts.values())
+            for term, tf in counts.items():
+                tid = vocab.setdefault(term, len(vocab))
+                if tid == len(postings):
+                    postings.append([])
+                postings[tid].append((doc, tf))
+        offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(p) for p in postings])
+        doc_ids = np.fromiter((d for p in postings for d, _ in p), dtype=np.int32, count=int(offsets[-1]))
+        tfs = np.fromiter((min(tf, 65535) for p in postings for _, tf in p), dtype=np.uint16, count=int(offsets[-1]))
+        return cls(vocab, offsets, doc_ids, tfs, doc_len, ids, texts, metas)
+
+    def _topic_mask(self, topics: list[str]) -> np.ndarray:
+        key = frozenset(topics)
+        mask = self._topic_masks.get(key)
+        if mask is None:
+            mask = np.array([m.get("topic") in key for m in self.metas], dtype=bool)
+            self._topic_masks[key] = mask
+        return mask
+
+    def search(self, query: str, top_k: int, topics: list[str] | None = None) -> list[dict[str, Any]]:
+        """
+        Top-k по BM25; формат как у vectorstore.query_vector, вместо distance — score.
+        topics — только фрагменты этих тем.
+        """
+        n = len(self.ids)
+        terms = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        if not terms or not n:
+            return []
+        scores = np.zeros(n, dtype=np.float32)
+        for tid in terms:
+            start, end = self.offsets[tid], self.offsets[tid + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            df = end - start
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            # Внутри постингов терма документы уникальны — можно складывать по индексу
+            scores[docs] += idf * tf * (RAG_BM25_K1 + 1) / (tf + self._len_norm[docs])
+        if topics:
+            scores *= self._topic_mask(topics)
+        k = min(top_k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {"id": self.ids[i], "text": self.texts[i], "meta": self.metas[i], "score": float(scores[i])}
+            for i in top
+        ]
+
+    def save(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        tmp_arrays = os.path.join(path, "postings.tmp.npz")
+        tmp_docs = os.path.join(path, "docs.tmp.json")
+        np.savez(tmp_arrays, offsets=self.offsets, doc_ids=self.doc_ids, tfs=self.tfs, doc_len=self.doc_len)
+        terms = sorted(self.vocab, key=self.vocab.get)
+        with open(tmp_docs, "w", encoding="utf-8") as f:
+            json.dump({"terms": terms, "ids": self.ids, "texts": self.texts, "metas": self.metas}, f, ensure_ascii=False)
+        os.replace(tmp_arrays, os.path.join(path, "postings.npz"))
+        os.replace(tmp_docs, os.path.join(path, "docs.json"))
+
+    @classmethod
+    def load(cls, path: str) -> LexicalIndex:
+        with np.load(os.path.join(path, "postings.npz")) as arrays:
+            offsets, doc_ids, tfs, doc_len = (arrays[k] for k in ("offsets", "doc_ids", "tfs", "doc_len"))
+        with open(os.path.join(path, "docs.json"), encoding="utf-8") as f:
+            docs = json.load(f)
+        vocab = {term: i for i, term in enumerate(docs["terms"])}
+        return cls(vocab, offsets, doc_ids, tfs, doc_len, docs["ids"], docs["texts"], docs["metas"])
+
+
+_lock = threading.Lock()
+_index: LexicalIndex | None = None
+_loaded = False
+
+
+def get_lexical_index() -> LexicalIndex | None:
+    """Индекс из RAG_LEXICAL_DIR (загружается один раз) или None, если он ещё не построен."""
+    global _index, _loaded
+    if not _loaded:
+        with _lock:
+            if not _loaded:
+                try:
+                    _index = LexicalIndex.load(RAG_LEXICAL_DIR)
+                except FileNotFoundError:
+                    logger.warning("Lexical index not found in %s, run app.rag.build_index", RAG_LEXICAL_DIR)
+                    _index = None
+                _loaded = True
+    return _index
+
+
+def build_lexical_index(ids: list[str], texts: list[str], metas: list[dict[str, Any]]) -> LexicalIndex:
+    """Строит индекс, сохраняет его и подменяет загруженный в процессе."""
+    global _index, _loaded
+    index = LexicalIndex.build(ids, texts, metas)
+    index.save(RAG_LEXICAL_DIR)
+    with _lock:
+        _index, _loaded = index, True
+    return index
+
+
+def reload_lexical_index() -> None:
+    global _index, _loaded
+    with _lock:
+        _index, _loaded = None, False
+
+
+def lexical_search(query: str, top_k: int, topics: list[str] | None = None) -> list[dict[str, Any]]:
+    index = get_lexical_index()
+    if index is None:
+        return []
+    started = time.perf_counter()
+    hits = index.search(query, top_k, topics)
+    metrics.observe("rag.lexical", (time.perf_counter() - started) * 1000)
+    return hits
@@ -0,0 +1,390 @@
+"""
+Векторный индекс на numpy: полный перебор по матрице в memory-mapped файле.
+
+Корпус — несколько тысяч фрагментов, и HNSW с SQLite в Chroma для него
+избыточны: открытие индекса и память стоят дороже самого поиска. Здесь
+нормированные эмбеддинги лежат одной матрицей .npy, тексты и метаданные —
+в docs.json рядом. Матрица открывается через mmap, запрос — одно
+матрично-векторное произведение и argpartition для top-k.
+
+Форматы матрицы (RAG_NUMPY_DTYPE): float16; int8 с масштабом на строку
+(4× меньше float32); binary — по биту на измерение (знак, 32× меньше),
+близость считается через расстояние Хэмминга. При RAG_NUMPY_RESCORE > 0
+рядом хранятся и исходные float32-векторы (full.npy, тоже через mmap):
+по сжатой матрице отбирается top_k × RAG_NUMPY_RESCORE кандидатов, и только
+их строки читаются с диска и пересчитываются точно.
+
+NumpyCollection повторяет ту часть API коллекции Chroma, которой пользуется
+vectorstore (count/upsert/delete/get/query), поэтому бэкенд выбирается одной
+настройкой RAG_BACKEND. Каждая запись переписывает файлы целиком, поэтому
+сборка индекса пишет внутри bulk(): пачки копятся в памяти и сохраняются один раз.
+"""
+from __future__ import annotations
+
+import contextlib
+import itertools
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DTYPES = ("float16", "int8", "binary")
+# Строк в блоке при переводе матрицы в float32 для произведения: блок помещается в кэш CPU
+_SCORE_BLOCK_ROWS = 512
+# Число единичных бит в байте — для numpy без bitwise_count
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    """Состояние индекса; запросы читают снимок целиком, запись подменяет его атомарно."""
+    matrix: np.ndarray                 # (n, dim) float16/int8 или (n, dim/8) uint8 для binary
+    scales: np.ndarray | None          # (n,) float32 для int8
+    full: np.ndarray | None            # (n, dim) float32 для пересчёта кандидатов
+    dim: int
+    ids: list[str]
+    texts: list[str]
+    metas: list[dict[str, Any]]
+    # Строки под фильтры запросов: снимок неизменяем, поэтому кэш живёт до следующей записи
+    _filtered: dict[tuple, np.ndarray] = field(default_factory=dict, compare=False, repr=False)
+
+    @property
+    def rows(self) -> dict[str, int]:
+        return {id_: i for i, id_ in enumerate(self.ids)}
+
+    def rows_where(self, where: dict[str, Any]) -> np.ndarray:
+        """
+        Номера строк, чьи метаданные подходят под фильтр в синтаксисе Chroma
+        (поддерживаются {"key": value}, {"key": {"$eq": value}} и {"key": {"$in": [...]}}).
+        """
+        (key, cond), = where.items()
+        if isinstance(cond, dict):
+            (op, value), = cond.items()
+            if op not in ("$eq", "$in"):
+                raise ValueError(f"Unsupported filter operator for numpy index: {op}")
+            values = frozenset(value if op == "$in" else [value])
+        else:
+            values = frozenset([cond])
+        cache_key = (key, values)
+        rows = self._filtered.get(cache_key)
+        if rows is None:
+            rows = np.array([i for i, m in enumerate(self.metas) if m.get(key) in values], dtype=np.int64)
+            self._filtered[cache_key] = rows
+        return rows
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _encode(vectors: np.ndarray, dtype: str) -> tuple[np.ndarray, np.ndarray | None]:
+    """Нормированные векторы → матрица хранения (и масштабы строк для int8)."""
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    if dtype == "binary":
+        return np.packbits(vectors > 0, axis=1), None
+    return vectors.astype(np.float16), None
+
+
+def _decode(snapshot: _Snapshot, rows: np.ndarray | slice = slice(None)) -> np.ndarray:
+    """Векторы строк rows в float32: исходные, если сохранены, иначе восстановленные из сжатых."""
+    if snapshot.full is not None:
+        return np.asarray(snapshot.full[rows], dtype=np.float32)
+    if snapshot.matrix.dtype == np.uint8:
+        bits = np.unpackbits(snapshot.matrix[rows], axis=1, count=snapshot.dim).astype(np.float32)
+        return (bits * 2 - 1) / np.sqrt(snapshot.dim)
+    matrix = np.asarray(snapshot.matrix[rows], dtype=np.float32)
+    return matrix * snapshot.scales[rows, None] if snapshot.scales is not None else matrix
+
+
+def _popcount(x: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x)
+    return _POPCOUNT[x]
+
+
+def _scores(snapshot: _Snapshot, query: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray:
+    """
+    Косинусная близость запроса ко всем строкам или только к rows (запрос уже
+    нормирован); для binary — оценка.
+    """
+    matrix = snapshot.matrix if rows is None else snapshot.matrix[rows]
+    scales = snapshot.scales if rows is None or snapshot.scales is None else snapshot.scales[rows]
+    out = np.empty(len(matrix), dtype=np.float32)
+    if matrix.dtype == np.uint8:
+        # Для знаковых векторов cos ≈ 1 - 2·hamming/dim
+        query_bits = np.packbits(query > 0)
+        for start in range(0, len(matrix), _SCORE_BLOCK_ROWS):
+            block = matrix[start:start + _SCORE_BLOCK_ROWS]
+            hamming = _popcount(block ^ query_bits).sum(axis=1, dtype=np.int32)
+            out[start:start + len(block)] = 1 - 2 * hamming / snapshot.dim
+        return out
+    buf = np.empty((min(_SCORE_BLOCK_ROWS, len(matrix)), matrix.shape[1]), dtype=np.float32)
+    for start in range(0, len(matrix), _SCORE_BLOCK_ROWS):
+        block = matrix[start:start + _SCORE_BLOCK_ROWS]
+        rows = len(block)
+        np.copyto(buf[:rows], block, casting="unsafe")
+        np.dot(buf[:rows], query, out=out[start:start + rows])
+    if scales is not None:
+        out *= scales
+    return out
+
+
+def search(
+    snapshot: _Snapshot,
+    query: np.ndarray,
+    top_k: int,
+    rescore: int = 0,
+    rows: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Индексы top_k строк по убыванию близости и сами близости. При rescore > 0
+    и сохранённых float32-векторах кандидаты (top_k × rescore) пересчитываются точно.
+    rows — перебирать только эти строки (фильтр по метаданным).
+    """
+    sims = _scores(snapshot, query, rows)
+    k = min(top_k, len(sims))
+    if k == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    if rescore > 0 and snapshot.full is not None:
+        n_candidates = min(len(sims), k * rescore)
+        candidates = np.sort(np.argpartition(-sims, n_candidates - 1)[:n_candidates])
+        if rows is not None:
+            candidates = rows[candidates]
+        # Из mmap читаются только строки кандидатов, по возрастанию — меньше случайных чтений
+        exact = snapshot.full[candidates] @ query
+        order = np.argsort(-exact)[:k]
+        return candidates[order], exact[order]
+    top = np.argpartition(-sims, k - 1)[:k]
+    top = top[np.argsort(-sims[top])]
+    return (top if rows is None else rows[top]), sims[top]
+
+
+class NumpyCollection:
+    def __init__(self, path: str, dtype: str = "int8", rescore: int = 0):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown numpy index dtype: {dtype} (expected one of {', '.join(DTYPES)})")
+        self.path = path
+        self.dtype = dtype
+        self.rescore = rescore
+        self._write_lock = threading.Lock()
+        # Пачки upsert внутри bulk(): (ids, тексты, метаданные, нормированные векторы)
+        self._pending: list[tuple[list[str], list[str], list[dict], np.ndarray]] | None = None
+        self._snapshot = self._load()
+
+    # --- хранение ---
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load(self) -> _Snapshot | None:
+        try:
+            with open(self._file("docs.json"), encoding="utf-8") as f:
+                docs = json.load(f)
+            matrix = np.load(self._file("vectors.npy"), mmap_mode="r")
+            scales = np.load(self._file("scales.npy")) if docs["dtype"] == "int8" else None
+        except FileNotFoundError:
+            return None
+        full = None
+        if docs.get("full"):
+            full = np.load(self._file("full.npy"), mmap_mode="r")
+        if len(matrix) != len(docs["ids"]) or (full is not None and len(full) != len(matrix)):
+            raise RuntimeError(f"Numpy index in {self.path} is inconsistent, rebuild it with --full")
+        if docs["dtype"] != self.dtype:
+            # Перекодировать int8 обратно без потерь нельзя — работаем в том формате, что на диске
+            logger.warning(
+                "Numpy index in %s is stored as %s, not %s; remove it and rebuild to switch",
+                self.path, docs["dtype"], self.dtype,
+            )
+            self.dtype = docs["dtype"]
+        if self.rescore and full is None and docs["ids"]:
+            logger.warning("Numpy index in %s has no float32 vectors, rescoring is off until --full rebuild", self.path)
+        dim = docs.get("dim") or matrix.shape[1]
+        return _Snapshot(matrix, scales, full, dim, docs["ids"], docs["texts"], docs["metas"])
+
+    def _save(self, snapshot: _Snapshot) -> _Snapshot:
+        os.makedirs(self.path, exist_ok=True)
+        # Сначала массивы, последним docs.json: по нему проверяется согласованность при загрузке
+        arrays = {"vectors.npy": snapshot.matrix, "scales.npy": snapshot.scales, "full.npy": snapshot.full}
+        for name, array in arrays.items():
+            if array is not None:
+                np.save(self._file(name + ".tmp.npy"), array)
+                os.replace(self._file(name + ".tmp.npy"), self._file(name))
+        with open(self._file("docs.json.tmp"), "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "dtype": self.dtype,
+                    "dim": snapshot.dim,
+                    "full": snapshot.full is not None,
+                    "ids": snapshot.ids,
+                    "texts": snapshot.texts,
+                    "metas": snapshot.metas,
+                },
+                f, ensure_ascii=False,
+            )
+        os.replace(self._file("docs.json.tmp"), self._file("docs.json"))
+        if snapshot.full is None:
+            # Пересчёт выключили — float32-копия прежней сборки больше не нужна
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._file("full.npy"))
+        # После записи читаем матрицы снова через mmap, а не держим копию в памяти
+        return self._load()
+
+    # --- API коллекции Chroma ---
+
+    def count(self) -> int:
+        snapshot = self._snapshot
+        return len(snapshot.ids) if snapshot else 0
+
+    def upsert(self, ids: list[str], documents: list[str], metadatas: list[dict], embeddings) -> None:
+        vectors = _normalize(embeddings)
+        if self._pending is not None:
+            self._pending.append((list(ids), list(documents), list(metadatas), vectors))
+            return
+        self._write(list(ids), list(documents), list(metadatas), vectors)
+
+    @contextmanager
+    def bulk(self):
+        """
+        Пакетная запись: upsert внутри блока копятся в памяти, а матрица и docs.json
+        сохраняются один раз на выходе, а не на каждую пачку. Запросы до выхода
+        видят прежний снимок; при исключении накопленное отбрасывается.
+        """
+        if self._pending is not None:
+            yield  # вложенный блок — пишет внешний
+            return
+        self._pending = []
+        try:
+            yield
+            pending = self._pending
+        finally:
+            self._pending = None
+        if not pending:
+            return
+        ids = list(itertools.chain.from_iterable(p[0] for p in pending))
+        documents = list(itertools.chain.from_iterable(p[1] for p in pending))
+        metadatas = list(itertools.chain.from_iterable(p[2] for p in pending))
+        vectors = np.concatenate([p[3] for p in pending])
+        # Один id в разных пачках — как при записи по очереди: место первой, данные последней
+        last = {id_: i for i, id_ in enumerate(ids)}
+        if len(last) < len(ids):
+            keep = list(last.values())
+            ids, documents, metadatas = [ids[i] for i in keep], [documents[i] for i in keep], [metadatas[i] for i in keep]
+            vectors = vectors[keep]
+        self._write(ids, documents, metadatas, vectors)
+
+    def _write(self, ids: list[str], documents: list[str], metadatas: list[dict], vectors: np.ndarray) -> None:
+        matrix, scales = _encode(vectors, self.dtype)
+        full = vectors if self.rescore else None
+        with self._write_lock:
+            old = self._snapshot
+            if old is None:
+                new = _Snapshot(matrix, scales, full, vectors.shape[1],
+                                list(ids), list(documents), [m or {} for m in metadatas])
+                self._snapshot = self._save(new)
+                return
+            rows = old.rows
+            new_matrix = np.array(old.matrix)
+            new_scales = np.array(old.scales) if old.scales is not None else None
+            new_full = None
+            if full is not None:
+                # Индекс без float32-векторов: до полной пересборки берём восстановленные из сжатых
+                new_full = np.array(old.full) if old.full is not None else _decode(old)
+            all_ids, texts, metas = list(old.ids), list(old.texts), list(old.metas)
+            append: list[int] = []
+            for i, id_ in enumerate(ids):
+                row = rows.get(id_)
+                if row is None:
+                    append.append(i)
+                    continue
+                new_matrix[row] = matrix[i]
+                if new_scales is not None:
+                    new_scales[row] = scales[i]
+                if new_full is not None:
+                    new_full[row] = full[i]
+                texts[row], metas[row] = documents[i], metadatas[i] or {}
+            if append:
+                new_matrix = np.concatenate([new_matrix, matrix[append]])
+                if new_scales is not None:
+                    new_scales = np.concatenate([new_scales, scales[append]])
+                if new_full is not None:
+                    new_full = np.concatenate([new_full, full[append]])
+                all_ids += [ids[i] for i in append]
+                texts += [documents[i] for i in append]
+                metas += [metadatas[i] or {} for i in append]
+            new = _Snapshot(new_matrix, new_scales, new_full, old.dim, all_ids, texts, metas)
+            self._snapshot = self._save(new)
+
+    def delete(self, ids: list[str]) -> None:
+        with self._write_lock:
+            old = self._snapshot
+            if old is None:
+                return
+            drop = set(ids)
+            keep = np.array([id_ not in drop for id_ in old.ids], dtype=bool)
+            if keep.all():
+                return
+            new = _Snapshot(
+                np.asarray(old.matrix)[keep],
+                old.scales[keep] if old.scales is not None else None,
+                np.asarray(old.full)[keep] if old.full is not None else None,
+                old.dim,
+                [id_ for id_, k in zip(old.ids, keep) if k],
+                [t for t, k in zip(old.texts, keep) if k],
+                [m for m, k in zip(old.metas, keep) if k],
+            )
+            self._snapshot = self._save(new)
+
+    def get(self, include: list[str] | None = None) -> dict[str, Any]:
+        snapshot = self._snapshot
+        include = include if include is not None else ["documents", "metadatas"]
+        res: dict[str, Any] = {"ids": list(snapshot.ids) if snapshot else []}
+        if "documents" in include:
+            res["documents"] = list(snapshot.texts) if snapshot else []
+        if "metadatas" in include:
+            res["metadatas"] = list(snapshot.metas) if snapshot else []
+        if "embeddings" in include:
+            res["embeddings"] = _decode(snapshot) if snapshot else np.empty((0, 0), dtype=np.float32)
+        return res
+
+    def query(
+        self,
+        query_embeddings,
+        n_results: int,
+        where: dict[str, Any] | None = None,
+        include: list[str] | None = None,
+    ) -> dict[str, Any]:
+        snapshot = self._snapshot
+        rows = snapshot.rows_where(where) if snapshot is not None and where else None
+        include = include if include is not None else ["documents", "metadatas", "distances"]
+        res: dict[str, list] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if "embeddings" in include:
+            res["embeddings"] = []
+        for emb in query_embeddings:
+            top: list[int] = []
+            sims: list[float] = []
+            if snapshot is not None and snapshot.ids:
+                query = _normalize(np.asarray(emb, dtype=np.float32)[None, :])[0]
+                top_arr, sims_arr = search(snapshot, query, n_results, self.rescore, rows)
+                top, sims = top_arr.tolist(), sims_arr.tolist()
+                if "embeddings" in include:
+                    res["embeddings"].append(_decode(snapshot, top_arr))
+            elif "embeddings" in include:
+                res["embeddings"].append(np.empty((0, 0), dtype=np.float32))
+            res["ids"].append([snapshot.ids[i] for i in top])
+            res["documents"].append([snapshot.texts[i] for i in top])
+            res["metadatas"].append([snapshot.metas[i] for i in top])
+            # Как в Chroma с hnsw:space=cosine: distance = 1 - cos
+            res["distances"].append([1 - s for s in sims])
+        return res
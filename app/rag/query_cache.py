@@ -0,0 +1,159 @@
+"""
+Семантический кэш результатов поиска RAG.
+
+Соседние ходы интервью дают почти одинаковый запрос (те же резюме и вакансия,
+похожая реплика), а частые вопросы («explain two pointers») повторяются у
+разных пользователей. Если вектор нового запроса ближе порога
+(RAG_QUERY_CACHE_THRESHOLD по косинусу) к уже закэшированному с теми же
+параметрами поиска (top_k, темы, режим слияния), отдаём сохранённую плотную
+выдачу без векторного поиска. BM25 в гибридном режиме кэшем не покрывается:
+близость векторов не означает совпадения точных терминов реплики.
+
+Векторы ключей лежат одной матрицей, поиск ближайшего — одно произведение.
+Размер ограничен (вытесняется давно не использованная запись), у записей
+есть TTL. Кэш сбрасывается при пересборке индекса: в этом процессе — явно,
+из другого процесса — по смене времени изменения манифеста индекса.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any
+
+import numpy as np
+
+from app import metrics
+from app.rag.settings import (
+    RAG_INDEX_MANIFEST,
+    RAG_QUERY_CACHE_MAX_ENTRIES,
+    RAG_QUERY_CACHE_THRESHOLD,
+    RAG_QUERY_CACHE_TTL_S,
+)
+
+
+def _ema(old: float, value: float) -> float:
+    return value if not old else 0.9 * old + 0.1 * value
+
+
+def _index_stamp() -> int | None:
+    try:
+        return os.stat(RAG_INDEX_MANIFEST).st_mtime_ns
+    except OSError:
+        return None
+
+
+class SemanticQueryCache:
+    def __init__(self, max_entries: int, ttl_s: float, threshold: float, name: str = "rag.query_cache"):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.threshold = threshold
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._stamp = _index_stamp()
+        self._vectors: np.ndarray | None = None            # (max_entries, dim) float32
+        self._param_ids = np.full(max_entries, -1, dtype=np.int32)
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._results: list[list[dict[str, Any]] | None] = [None] * max_entries
+        self._params: dict[tuple, int] = {}
+        # Скользящие средние близости: на попаданиях и к ближайшему вообще — для подбора порога
+        self._hit_similarity = 0.0
+        self._nearest_similarity = 0.0
+        metrics.register_gauge(f"{name}.size", self.__len__)
+        metrics.register_gauge(f"{name}.hit_rate", self.hit_rate)
+        metrics.register_gauge(f"{name}.hit_similarity", lambda: round(self._hit_similarity, 4))
+        metrics.register_gauge(f"{name}.nearest_similarity", lambda: round(self._nearest_similarity, 4))
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._param_ids >= 0))
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return round(self.hits / total, 4) if total else 0.0
+
+    def _check_index(self) -> None:
+        """Под блокировкой: индекс пересобран другим процессом — всё закэшированное устарело."""
+        stamp = _index_stamp()
+        if stamp != self._stamp:
+            self._clear()
+            self._stamp = stamp
+
+    def _clear(self) -> None:
+        self._param_ids[:] = -1
+        self._results = [None] * self.max_entries
+        self._params.clear()
+
+    def get(self, vec: np.ndarray, params: tuple) -> list[dict[str, Any]] | None:
+        query = np.asarray(vec, dtype=np.float32)
+        norm = float(np.linalg.norm(query))
+        if not norm:
+            return None
+        query = query / norm
+        now = time.monotonic()
+        result = None
+        similarity = None
+        with self._lock:
+            self._check_index()
+            pid = self._params.get(params)
+            if pid is not None and self._vectors is not None and self._vectors.shape[1] == len(query):
+                sims = self._vectors @ query
+                sims[(self._param_ids != pid) | (self._expires <= now)] = -np.inf
+                best = int(np.argmax(sims))
+                if np.isfinite(sims[best]):
+                    similarity = float(sims[best])
+                    self._nearest_similarity = _ema(self._nearest_similarity, similarity)
+                    if similarity >= self.threshold:
+                        self._last_used[best] = now
+                        result = list(self._results[best])
+                        self._hit_similarity = _ema(self._hit_similarity, similarity)
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        metrics.incr(f"{self.name}.{'miss' if result is None else 'hit'}")
+        return result
+
+    def put(self, vec: np.ndarray, params: tuple, results: list[dict[str, Any]]) -> None:
+        query = np.asarray(vec, dtype=np.float32)
+        norm = float(np.linalg.norm(query))
+        if not norm:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._check_index()
+            if self._vectors is None or self._vectors.shape[1] != len(query):
+                # Первая запись или сменилась модель эмбеддингов
+                self._vectors = np.zeros((self.max_entries, len(query)), dtype=np.float32)
+                self._clear()
+            free = np.flatnonzero((self._param_ids < 0) | (self._expires <= now))
+            slot = int(free[0]) if len(free) else int(np.argmin(self._last_used))
+            pid = self._params.setdefault(params, len(self._params))
+            self._vectors[slot] = query / norm
+            self._param_ids[slot] = pid
+            self._expires[slot] = now + self.ttl_s
+            self._last_used[slot] = now
+            self._results[slot] = list(results)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._clear()
+            self._stamp = _index_stamp()
+
+
+_cache = (
+    SemanticQueryCache(RAG_QUERY_CACHE_MAX_ENTRIES, RAG_QUERY_CACHE_TTL_S, RAG_QUERY_CACHE_THRESHOLD)
+    if RAG_QUERY_CACHE_MAX_ENTRIES > 0 else None
+)
+
+
+def get_query_cache() -> SemanticQueryCache | None:
+    return _cache
+
+
+def invalidate_query_cache() -> None:
+    """Сброс после пересборки или перезагрузки индекса."""
+    if _cache is not None:
+        _cache.invalidate()
@@ -0,0 +1,201 @@
+"""
+Поиск по handbook для интервью: запрос из нескольких частей.
+
+Раньше реплика кандидата, хвост вакансии и резюме склеивались в одну строку
+и эмбеддились целиком каждый ход. Теперь каждая часть эмбеддится отдельно:
+резюме и вакансия в пределах сессии не меняются, их векторы приходят из
+кэша эмбеддингов, и на ходе считается только вектор новой реплики. Вклад
+частей задаётся весами (RAG_QUERY_WEIGHT_*).
+
+При RAG_HYBRID к плотному поиску добавляется BM25 по реплике (точные термины
+вроде «Dijkstra» или «STAR»), списки сливаются через RRF. Если модель
+эмбеддингов ещё грузится или все слоты заняты, ответ собирается только из BM25.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+from app import metrics
+from app.rag.lexical import lexical_search
+from app.rag.query_cache import get_query_cache
+from app.rag.settings import (
+    RAG_HYBRID,
+    RAG_INDEX_MANIFEST,
+    RAG_LEXICAL_WEIGHT,
+    RAG_QUERY_FUSION,
+    RAG_QUERY_WEIGHT_MESSAGE,
+    RAG_QUERY_WEIGHT_VACANCY,
+    RAG_QUERY_WEIGHT_RESUME,
+    RAG_RRF_K,
+)
+from app.rag.vectorstore import embed_query, query_vector, try_embed_query
+
+logger = logging.getLogger(__name__)
+
+VACANCY_QUERY_CHARS = 800
+RESUME_QUERY_CHARS = 1200
+
+
+@dataclass(frozen=True)
+class QueryPart:
+    text: str
+    weight: float
+
+
+def interview_query_parts(message: str, vacancy_text: str | None, resume_text: str | None) -> list[QueryPart]:
+    """Части запроса для хода интервью: реплика кандидата, вакансия, резюме."""
+    parts = [QueryPart(message, RAG_QUERY_WEIGHT_MESSAGE)]
+    if vacancy_text:
+        parts.append(QueryPart(f"Vacancy:\n{vacancy_text[:VACANCY_QUERY_CHARS]}", RAG_QUERY_WEIGHT_VACANCY))
+    if resume_text:
+        parts.append(QueryPart(f"Resume:\n{resume_text[:RESUME_QUERY_CHARS]}", RAG_QUERY_WEIGHT_RESUME))
+    return [p for p in parts if p.text.strip() and p.weight > 0]
+
+
+def retrieve(
+    parts: list[QueryPart],
+    top_k: int,
+    fusion: str = RAG_QUERY_FUSION,
+    hybrid: bool = RAG_HYBRID,
+    topics: list[str] | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Фрагменты handbook по многочастному запросу (формат как у query_text).
+    topics — искать только по этим темам (см. app/rag/topics.py).
+    Плотная выдача для почти совпадающих запросов берётся из семантического кэша.
+    """
+    if not parts:
+        return []
+    started = time.perf_counter()
+    params = (top_k, fusion, hybrid, tuple(sorted(topics)) if topics else None)
+    if hybrid:
+        hits = _hybrid_search(parts, top_k, fusion, topics, params)
+    else:
+        vectors = [embed_query(p.text) for p in parts]
+        weights = [p.weight for p in parts]
+        hits = _cached(vectors, weights, params, lambda: _dense_search(vectors, weights, top_k, fusion, topics))
+    if not hits and topics and not _index_has_topics():
+        # Индекс собран до появления тем (нет метаданных topic) — ищем по всему.
+        # Если темы есть, пустая выдача — честный ответ: фильтр агента не снимается
+        return retrieve(parts, top_k, fusion, hybrid)
+    metrics.observe("rag.query", (time.perf_counter() - started) * 1000)
+    return hits
+
+
+def _index_has_topics() -> bool:
+    """Есть ли у фрагментов индекса темы: build_index пишет их версию в манифест."""
+    try:
+        with open(RAG_INDEX_MANIFEST, encoding="utf-8") as f:
+            return "topics" in json.load(f)
+    except (OSError, ValueError):
+        return False
+
+
+def _cached(
+    vectors: list[np.ndarray],
+    weights: list[float],
+    params: tuple,
+    search: Callable[[], list[dict[str, Any]]],
+) -> list[dict[str, Any]]:
+    """Поиск через семантический кэш; ключ — взвешенный вектор всех частей запроса."""
+    cache = get_query_cache()
+    if cache is None:
+        return search()
+    key = _fuse_vectors(vectors, weights)
+    hits = cache.get(key, params)
+    if hits is None:
+        hits = search()
+        if hits:
+            cache.put(key, params, hits)
+    return hits
+
+
+def _dense_search(
+    vectors: list[np.ndarray],
+    weights: list[float],
+    top_k: int,
+    fusion: str,
+    topics: list[str] | None,
+) -> list[dict[str, Any]]:
+    if fusion == "rrf" and len(vectors) > 1:
+        return _rrf([(query_vector(vec, top_k * 2, topics), w) for vec, w in zip(vectors, weights)], top_k)
+    return query_vector(_fuse_vectors(vectors, weights), top_k, topics)
+
+
+def _hybrid_search(
+    parts: list[QueryPart],
+    top_k: int,
+    fusion: str,
+    topics: list[str] | None,
+    params: tuple,
+) -> list[dict[str, Any]]:
+    # BM25 только по реплике: вакансия и резюме длинные и размыли бы точные термины
+    primary = try_embed_query(parts[0].text)
+    if primary is None:
+        lexical = lexical_search(parts[0].text, top_k * 2, topics)
+        if lexical:
+            metrics.incr("rag.lexical_only")
+            return lexical[:top_k]
+        # Лексического индекса нет (или в нём ничего не нашлось) — ждём модель
+        primary = embed_query(parts[0].text)
+
+    vectors, weights = [primary], [parts[0].weight]
+    for part in parts[1:]:
+        vec = try_embed_query(part.text)
+        if vec is not None:
+            vectors.append(vec)
+            weights.append(part.weight)
+
+    # В семантическом кэше — только плотный список: ключ — вектор, в котором в сессии
+    # преобладают резюме и вакансия, и «Dijkstra» с «Prim» в нём почти неразличимы.
+    # BM25 по реплике и слияние считаются заново на каждый запрос (доли миллисекунды)
+    lexical = lexical_search(parts[0].text, top_k * 2, topics)
+    try:
+        dense = _cached(
+            vectors, weights, params, lambda: _dense_search(vectors, weights, top_k * 2, fusion, topics)
+        )
+    except Exception:
+        if not lexical:
+            raise
+        logger.exception("Dense retrieval failed, answering from BM25 only")
+        metrics.incr("rag.lexical_only")
+        return lexical[:top_k]
+    if not lexical:
+        return dense[:top_k]
+    return _rrf([(dense, 1.0), (lexical, RAG_LEXICAL_WEIGHT)], top_k)
+
+
+def _fuse_vectors(vectors: list[np.ndarray], weights: list[float]) -> np.ndarray:
+    """Взвешенная сумма нормированных векторов, снова нормированная (для косинусной метрики)."""
+    fused = np.zeros_like(vectors[0], dtype=np.float32)
+    for vec, weight in zip(vectors, weights):
+        norm = float(np.linalg.norm(vec))
+        if norm:
+            fused += (weight / norm) * vec
+    norm = float(np.linalg.norm(fused))
+    return fused / norm if norm else fused
+
+
+def _rrf(ranked_lists: list[tuple[list[dict[str, Any]], float]], top_k: int) -> list[dict[str, Any]]:
+    """
+    Слияние списков (Reciprocal Rank Fusion): score = Σ weight / (k + rank).
+    Списки стоит брать с запасом: фрагмент из хвоста одного поднимается за счёт другого.
+    """
+    scores: dict[str, float] = {}
+    best: dict[str, dict[str, Any]] = {}
+    for hits, weight in ranked_lists:
+        for rank, hit in enumerate(hits, start=1):
+            scores[hit["id"]] = scores.get(hit["id"], 0.0) + weight / (RAG_RRF_K + rank)
+            # Из дублей оставляем ближайший по вектору; у BM25-попаданий distance нет
+            prev = best.get(hit["id"])
+            if prev is None or hit.get("distance", np.inf) < prev.get("distance", np.inf):
+                best[hit["id"]] = hit
+    ranked = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    return [{**best[id_], "score": scores[id_]} for id_ in ranked]
@@ -0,0 +1,87 @@
+"""
+Тексты страниц, скачанных scripts/fetch_handbook_links.py --fetch.
+
+Список страниц берётся из manifest.json в каталоге (url → путь к .txt);
+если манифеста нет — все .txt в подкаталогах доменов. PDF скрипт сохраняет
+как есть, такие файлы пропускаются.
+
+Тема страницы — самая частая тема страниц handbook, которые на неё ссылаются
+(handbook_links.json того же скрипта), иначе агенты её не увидят.
+"""
+from __future__ import annotations
+
+import itertools
+import json
+from collections import Counter
+from collections.abc import Iterator
+from pathlib import Path
+
+from app.rag.chunker import iter_markdown_chunks
+from app.rag.handbook_loader import READ_BLOCK_CHARS, DocChunk, iter_chunk_text
+from app.rag.settings import RAG_CHUNKER
+from app.rag.topics import EXTERNAL_TOPIC, topic_for_path
+
+# Префикс id и ключей манифеста индекса, чтобы не пересечься с путями handbook
+ID_PREFIX = "scraped/"
+
+
+def list_scraped_files(root: Path) -> list[tuple[Path, str | None]]:
+    """Пары (путь к тексту, исходный URL) в стабильном порядке."""
+    manifest_path = root / "manifest.json"
+    if manifest_path.is_file():
+        entries = json.loads(manifest_path.read_text(encoding="utf-8"))
+        files = {
+            (root / e["path"]).resolve(): e["url"]
+            for e in entries
+            if e.get("path") and e.get("status") in ("ok", "cached")
+        }
+    else:
+        files = {p.resolve(): None for p in root.glob("*/**/*.txt")}
+    return sorted(((p, url) for p, url in files.items() if p.is_file() and not _is_pdf(p)), key=lambda item: item[0])
+
+
+def _is_pdf(path: Path) -> bool:
+    with path.open("rb") as f:
+        return f.read(5) == b"%PDF-"
+
+
+def load_link_topics(links_path: Path) -> dict[str, str]:
+    """url → самая частая тема ссылающихся страниц handbook (при равенстве — первая)."""
+    try:
+        links = json.loads(links_path.read_text(encoding="utf-8")).get("links") or {}
+    except (OSError, ValueError):
+        return {}
+    return {
+        url: Counter(topic_for_path(ref["source"]) for ref in refs).most_common(1)[0][0]
+        for url, refs in links.items()
+        if refs
+    }
+
+
+def iter_scraped_file_chunks(
+    path: Path, root: Path, url: str | None = None, topic: str = EXTERNAL_TOPIC,
+) -> Iterator[DocChunk]:
+    rel = ID_PREFIX + str(path.relative_to(root))
+    with path.open(encoding="utf-8", errors="ignore") as f:
+        # В скачанном тексте заголовок страницы обычно первая непустая строка
+        lead: list[str] = []
+        for line in f:
+            lead.append(line)
+            if line.strip():
+                break
+        title = lead[-1].strip()[:200] if lead and lead[-1].strip() else path.stem
+        if RAG_CHUNKER == "markdown":
+            chunks = iter_markdown_chunks(itertools.chain(lead, f))
+            pieces = ((c.text, c.section or None) for c in chunks)
+        else:
+            stream = itertools.chain(["".join(lead)], iter(lambda: f.read(READ_BLOCK_CHARS), ""))
+            pieces = ((text, None) for text in iter_chunk_text(lambda _n: next(stream, "")))
+        for idx, (text, section) in enumerate(pieces):
+            yield DocChunk(
+                id=f"{rel}::chunk::{idx}",
+                text=text,
+                source=url or rel,
+                title=title,
+                section=section,
+                topic=topic,
+            )
@@ -12,6 +12,8 @@ RAG_HANDBOOK_DIR = os.getenv(
 # Где хранить индекс Chroma (persist)
 RAG_PERSIST_DIR = os.getenv("RAG_PERSIST_DIR", "/app/rag_store")
 RAG_COLLECTION = os.getenv("RAG_COLLECTION", "tech_interview_handbook")
+# Манифест индекса: хеши файлов и чанков для инкрементальной пересборки
+RAG_INDEX_MANIFEST = os.getenv("RAG_INDEX_MANIFEST", os.path.join(RAG_PERSIST_DIR, "index_manifest.json"))
 
 # Модель эмбеддингов (FastEmbed)
 RAG_EMBED_MODEL = os.getenv("RAG_EMBED_MODEL", "BAAI/bge-small-en-v1.5")
@@ -22,3 +24,85 @@ RAG_TOP_K = int(os.getenv("RAG_TOP_K", "6"))
 # Ограничение на размер контекста, который подмешиваем
 RAG_MAX_CONTEXT_CHARS = int(os.getenv("RAG_MAX_CONTEXT_CHARS", "6000"))
 
+# Сборка контекста (app/rag/context.py): из RAG_CONTEXT_CANDIDATES найденных фрагментов
+# MMR выбирает RAG_TOP_K непохожих друг на друга; λ=1 — только релевантность
+RAG_CONTEXT_CANDIDATES = int(os.getenv("RAG_CONTEXT_CANDIDATES", str(RAG_TOP_K * 2)))
+RAG_MMR_LAMBDA = float(os.getenv("RAG_MMR_LAMBDA", "0.7"))
+
+
+# Кэш эмбеддингов запросов (LRU): лимит по числу векторов и по памяти; 0 — выключен
+RAG_EMBED_CACHE_MAX_ENTRIES = int(os.getenv("RAG_EMBED_CACHE_MAX_ENTRIES", "4096"))
+RAG_EMBED_CACHE_MAX_MB = float(os.getenv("RAG_EMBED_CACHE_MAX_MB", "32"))
+
+# Запрос в RAG из интервью раскладывается на части, каждая эмбеддится отдельно
+# (резюме и вакансия не меняются всю сессию — их векторы берутся из кэша).
+# vector — взвешенная сумма векторов и один поиск; rrf — поиск по каждой части
+# и слияние списков (Reciprocal Rank Fusion) с теми же весами
+RAG_QUERY_FUSION = os.getenv("RAG_QUERY_FUSION", "vector").lower()
+RAG_QUERY_WEIGHT_MESSAGE = float(os.getenv("RAG_QUERY_WEIGHT_MESSAGE", "1.0"))
+RAG_QUERY_WEIGHT_VACANCY = float(os.getenv("RAG_QUERY_WEIGHT_VACANCY", "0.5"))
+RAG_QUERY_WEIGHT_RESUME = float(os.getenv("RAG_QUERY_WEIGHT_RESUME", "0.3"))
+RAG_RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+
+# Сборка индекса: размер пачки для модели эмбеддингов, число процессов FastEmbed
+# (пусто — в текущем процессе, 0 — по числу ядер) и размер пачки записи в Chroma
+RAG_EMBED_BATCH_SIZE = int(os.getenv("RAG_EMBED_BATCH_SIZE", "64"))
+RAG_EMBED_PARALLEL = int(os.getenv("RAG_EMBED_PARALLEL")) if os.getenv("RAG_EMBED_PARALLEL") else None
+RAG_UPSERT_BATCH_SIZE = int(os.getenv("RAG_UPSERT_BATCH_SIZE", "512"))
+
+# Источники индекса через запятую: handbook, scraped (тексты из scripts/fetch_handbook_links.py)
+RAG_SOURCES = [s.strip() for s in os.getenv("RAG_SOURCES", "handbook").split(",") if s.strip()]
+RAG_SCRAPED_DIR = os.getenv("RAG_SCRAPED_DIR", "/app/data/scraped_pages")
+# Ссылки handbook (fetch_handbook_links.py --out): тема скачанной страницы — тема
+# страниц handbook, которые на неё ссылаются
+RAG_SCRAPED_LINKS = os.getenv("RAG_SCRAPED_LINKS", "/app/data/handbook_links.json")
+
+# Почти-дубликаты фрагментов (MinHash + LSH, app/rag/dedup.py) не попадают в индекс:
+# порог — оценка Jaccard по шинглам из RAG_DEDUP_SHINGLE слов; сигнатура из
+# RAG_DEDUP_PERMUTATIONS минимумов режется на RAG_DEDUP_BANDS полос
+RAG_DEDUP = os.getenv("RAG_DEDUP", "true").lower() in ("1", "true", "yes", "on")
+RAG_DEDUP_THRESHOLD = float(os.getenv("RAG_DEDUP_THRESHOLD", "0.8"))
+RAG_DEDUP_PERMUTATIONS = int(os.getenv("RAG_DEDUP_PERMUTATIONS", "128"))
+RAG_DEDUP_BANDS = int(os.getenv("RAG_DEDUP_BANDS", "32"))
+RAG_DEDUP_SHINGLE = int(os.getenv("RAG_DEDUP_SHINGLE", "5"))
+RAG_DEDUP_PATH = os.getenv("RAG_DEDUP_PATH", os.path.join(RAG_PERSIST_DIR, "dedup_signatures.npz"))
+
+# Чанкер: markdown — по заголовкам/абзацам/коду с размером в токенах модели,
+# chars — старые окна по 1200 символов с перекрытием 200
+RAG_CHUNKER = os.getenv("RAG_CHUNKER", "markdown").lower()
+RAG_CHUNK_TOKENS = int(os.getenv("RAG_CHUNK_TOKENS", "256"))
+RAG_CHUNK_MIN_TOKENS = int(os.getenv("RAG_CHUNK_MIN_TOKENS", "48"))
+# Чем считать токены: model — токенизатор модели эмбеддингов, words — приближение по словам
+RAG_CHUNK_TOKENIZER = os.getenv("RAG_CHUNK_TOKENIZER", "model").lower()
+
+# Гибридный поиск: BM25 по инвертированному индексу (app/rag/lexical.py) + векторный,
+# списки сливаются через RRF. Если модель эмбеддингов не прогрета или занята —
+# ответ только по BM25, без ожидания
+RAG_HYBRID = os.getenv("RAG_HYBRID", "true").lower() in ("1", "true", "yes", "on")
+RAG_LEXICAL_WEIGHT = float(os.getenv("RAG_LEXICAL_WEIGHT", "1.0"))
+RAG_LEXICAL_DIR = os.getenv("RAG_LEXICAL_DIR", os.path.join(RAG_PERSIST_DIR, "lexical"))
+RAG_BM25_K1 = float(os.getenv("RAG_BM25_K1", "1.2"))
+RAG_BM25_B = float(os.getenv("RAG_BM25_B", "0.75"))
+# Сколько запросов одновременно считают эмбеддинг запроса
+RAG_EMBED_MAX_CONCURRENCY = int(os.getenv("RAG_EMBED_MAX_CONCURRENCY", "4"))
+
+# Где хранить векторы: chroma — HNSW + SQLite; numpy — матрица в mmap-файле и полный
+# перебор (app/rag/numpy_store.py), быстрее стартует и меньше весит на корпусе в тысячи фрагментов
+RAG_BACKEND = os.getenv("RAG_BACKEND", "chroma").lower()
+RAG_NUMPY_DIR = os.getenv("RAG_NUMPY_DIR", os.path.join(RAG_PERSIST_DIR, "numpy"))
+# Формат матрицы: int8 (масштаб на строку), float16 или binary (бит на измерение)
+RAG_NUMPY_DTYPE = os.getenv("RAG_NUMPY_DTYPE", "int8").lower()
+# Пересчёт кандидатов по float32: берётся top_k × N по сжатой матрице; 0 — без пересчёта
+# (и без float32-копии на диске, она в 4 раза больше int8-матрицы). int8 и float16 почти
+# не теряют recall и по умолчанию обходятся без неё; binary без пересчёта неточен, ему ×10
+RAG_NUMPY_RESCORE = int(os.getenv("RAG_NUMPY_RESCORE", "10" if RAG_NUMPY_DTYPE == "binary" else "0"))
+
+# Поиск агента только по его темам handbook (app/rag/topics.py); темы по агентам
+# можно переопределить через RAG_TOPICS_HR, RAG_TOPICS_TECH_LEAD и т.д.
+RAG_AGENT_FILTERS = os.getenv("RAG_AGENT_FILTERS", "true").lower() in ("1", "true", "yes", "on")
+
+# Семантический кэш результатов поиска: запрос ближе порога (косинус) к закэшированному
+# с теми же параметрами получает его фрагменты без поиска; 0 записей — выключен
+RAG_QUERY_CACHE_MAX_ENTRIES = int(os.getenv("RAG_QUERY_CACHE_MAX_ENTRIES", "1024"))
+RAG_QUERY_CACHE_TTL_S = float(os.getenv("RAG_QUERY_CACHE_TTL_S", "600"))
+RAG_QUERY_CACHE_THRESHOLD = float(os.getenv("RAG_QUERY_CACHE_THRESHOLD", "0.95"))
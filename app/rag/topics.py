@@ -0,0 +1,79 @@
+"""
+Темы фрагментов индекса и фильтры поиска для агентов.
+
+Тема выводится из пути файла в handbook и пишется в метаданные фрагмента
+(topic). Каждый агент ищет только по своим темам: HR не получает
+шпаргалки по графам, Tech Lead — советы по переговорам о зарплате и
+посты блога. Поиск при этом перебирает лишь часть векторов, а в промпт
+не уходит нерелевантный контекст.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+from fnmatch import fnmatch
+
+from app.rag.settings import RAG_AGENT_FILTERS
+
+# Правила по порядку: первая подходящая маска пути (от корня handbook) задаёт тему
+_TOPIC_RULES: list[tuple[str, tuple[str, ...]]] = [
+    ("algorithms", ("contents/algorithms/*", "contents/_courses/*")),
+    ("coding", (
+        "contents/coding-interview*",
+        "contents/best-practice-questions.md",
+        "contents/best-coding-interview-courses.md",
+        "contents/programming-languages-for-coding-interviews.md",
+    )),
+    ("behavioral", (
+        "contents/behavioral-interview*",
+        "contents/self-introduction.md",
+        "contents/final-questions.md",
+    )),
+    ("system_design", ("contents/system-design*", "experimental/design/*")),
+    ("resume", ("contents/resume*",)),
+    ("career", (
+        "contents/negotiation*",
+        "contents/understanding-compensation.md",
+        "contents/career-growth.md",
+        "contents/engineering-levels.md",
+        "contents/choosing-between-companies.md",
+    )),
+    ("domain", ("experimental/domain/*", "experimental/front-end/*")),
+    ("blog", ("blog/*",)),
+]
+DEFAULT_TOPIC = "general"
+EXTERNAL_TOPIC = "external"          # страницы по внешним ссылкам (scraped)
+
+# Входит в заголовок манифеста индекса: правка правил меняет темы в метаданных,
+# а неизменённые файлы без этого не перечитываются
+TOPICS_VERSION = hashlib.sha1(repr((_TOPIC_RULES, DEFAULT_TOPIC, EXTERNAL_TOPIC)).encode("utf-8")).hexdigest()[:12]
+
+# None — поиск по всему индексу
+_AGENT_TOPICS: dict[str, list[str] | None] = {
+    "hr": ["behavioral", "resume", "career", "general"],
+    "tech_lead": ["algorithms", "coding", "system_design", "domain", "general"],
+    "code_review": ["algorithms", "coding", "domain"],
+    "mentor": None,
+}
+
+
+def topic_for_path(rel_path: str) -> str:
+    rel_path = rel_path.replace(os.sep, "/")
+    for topic, patterns in _TOPIC_RULES:
+        if any(fnmatch(rel_path, pattern) for pattern in patterns):
+            return topic
+    return DEFAULT_TOPIC
+
+
+def agent_topics(agent_type: str) -> list[str] | None:
+    """
+    Темы, по которым ищет агент (None — весь индекс). Переопределяется через
+    RAG_TOPICS_<AGENT> (через запятую; "*" — весь индекс), выключается RAG_AGENT_FILTERS=false.
+    """
+    if not RAG_AGENT_FILTERS:
+        return None
+    override = os.getenv(f"RAG_TOPICS_{agent_type.upper()}")
+    if override is not None:
+        topics = [t.strip() for t in override.split(",") if t.strip()]
+        return None if not topics or "*" in topics else topics
+    return _AGENT_TOPICS.get(agent_type)
@@ -1,63 +1,279 @@
 from __future__ import annotations
 
-from typing import Any
+import contextlib
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterable
+from typing import TYPE_CHECKING, Any
 
-import chromadb
-from chromadb.config import Settings
-from fastembed import TextEmbedding
+import numpy as np
 
+from app import metrics
+from app.rag.embed_cache import EmbeddingCache, text_key
+from app.rag.lexical import get_lexical_index, reload_lexical_index
+from app.rag.numpy_store import NumpyCollection
+from app.rag.query_cache import invalidate_query_cache
 from app.rag.settings import (
+    RAG_BACKEND,
     RAG_COLLECTION,
     RAG_EMBED_MODEL,
     RAG_PERSIST_DIR,
+    RAG_EMBED_CACHE_MAX_ENTRIES,
+    RAG_EMBED_CACHE_MAX_MB,
+    RAG_EMBED_BATCH_SIZE,
+    RAG_EMBED_PARALLEL,
+    RAG_UPSERT_BATCH_SIZE,
+    RAG_EMBED_MAX_CONCURRENCY,
+    RAG_NUMPY_DIR,
+    RAG_NUMPY_DTYPE,
+    RAG_NUMPY_RESCORE,
 )
 
+if TYPE_CHECKING:
+    import chromadb
+    from fastembed import TextEmbedding
 
+
+logger = logging.getLogger(__name__)
+
+# Клиент Chroma, коллекция (Chroma или NumpyCollection) и модель эмбеддингов — одни
+# на процесс; их создание (открытие SQLite, загрузка HNSW и ONNX-модели) дороже самого поиска.
+# Запросы идут из пула потоков, поэтому инициализация под блокировкой.
+_lock = threading.Lock()
 _embedder: TextEmbedding | None = None
+_client: chromadb.ClientAPI | None = None
+_collection = None
+_query_cache = (
+    EmbeddingCache(RAG_EMBED_CACHE_MAX_ENTRIES, int(RAG_EMBED_CACHE_MAX_MB * 1024 * 1024))
+    if RAG_EMBED_CACHE_MAX_ENTRIES > 0 else None
+)
+# Сколько запросов одновременно считают эмбеддинг; остальные ждут (embed_query)
+# или сразу уходят в лексический поиск (try_embed_query)
+_embed_slots = threading.BoundedSemaphore(max(1, RAG_EMBED_MAX_CONCURRENCY))
 
 
 def _get_embedder() -> TextEmbedding:
     global _embedder
     if _embedder is None:
-        _embedder = TextEmbedding(model_name=RAG_EMBED_MODEL)
+        with _lock:
+            if _embedder is None:
+                # Как и chromadb, импорт FastEmbed (~1 с) откладывается до первой нужды
+                from fastembed import TextEmbedding
+
+                _embedder = TextEmbedding(model_name=RAG_EMBED_MODEL)
     return _embedder
 
 
-def _embed(texts: list[str]) -> list[list[float]]:
+def get_tokenizer():
+    """Токенизатор модели эмбеддингов (tokenizers.Tokenizer) или None, если FastEmbed его не отдаёт."""
+    return getattr(_get_embedder().model, "tokenizer", None)
+
+
+def _embed(texts: list[str]) -> np.ndarray:
+    """Эмбеддинги пачки текстов: матрица float32 (len(texts), dim)."""
     embedder = _get_embedder()
-    vectors = list(embedder.embed(texts))
-    return [v.tolist() for v in vectors]
+    return np.asarray(list(embedder.embed(texts)), dtype=np.float32)
+
+
+def _embed_query(text: str, blocking: bool) -> np.ndarray | None:
+    key = text_key(text) if _query_cache is not None else None
+    if key is not None:
+        vec = _query_cache.get(key)
+        if vec is not None:
+            return vec
+    if not _embed_slots.acquire(blocking=blocking):
+        return None
+    try:
+        started = time.perf_counter()
+        vec = _embed([text])[0]
+    finally:
+        _embed_slots.release()
+    if key is not None:
+        vec = _query_cache.put(key, vec, embed_ms=(time.perf_counter() - started) * 1000)
+    return vec
+
+
+def embed_query(text: str) -> np.ndarray:
+    """Эмбеддинг запроса через LRU-кэш (ключ — хеш нормализованного текста)."""
+    return _embed_query(text, blocking=True)
+
+
+def try_embed_query(text: str) -> np.ndarray | None:
+    """
+    Эмбеддинг запроса без ожидания: из кэша или, если модель загружена и есть
+    свободный слот, посчитанный сейчас. None — модель ещё не прогрета или все
+    слоты заняты; вызывающий обходится без плотного поиска.
+    """
+    if _embedder is None:
+        return _query_cache.get(text_key(text)) if _query_cache is not None else None
+    return _embed_query(text, blocking=False)
+
+
+def clear_embed_cache() -> None:
+    """Сбрасывает LRU-кэш эмбеддингов запросов: следующий embed_query снова вызовет модель."""
+    if _query_cache is not None:
+        _query_cache.clear()
 
 
 def get_collection():
-    client = chromadb.PersistentClient(
-        path=RAG_PERSIST_DIR,
-        settings=Settings(anonymized_telemetry=False),
-    )
-    return client.get_or_create_collection(name=RAG_COLLECTION, metadata={"hnsw:space": "cosine"})
+    """Коллекция Chroma или NumpyCollection с тем же API (RAG_BACKEND)."""
+    global _client, _collection
+    if _collection is None:
+        with _lock:
+            if _collection is None and RAG_BACKEND == "numpy":
+                _collection = NumpyCollection(RAG_NUMPY_DIR, dtype=RAG_NUMPY_DTYPE, rescore=RAG_NUMPY_RESCORE)
+            elif _collection is None:
+                # chromadb импортируется здесь: с RAG_BACKEND=numpy его загрузка (~1 с) не нужна
+                import chromadb
+                from chromadb.config import Settings
+
+                _client = chromadb.PersistentClient(
+                    path=RAG_PERSIST_DIR,
+                    settings=Settings(anonymized_telemetry=False),
+                )
+                _collection = _client.get_or_create_collection(
+                    name=RAG_COLLECTION, metadata={"hnsw:space": "cosine"}
+                )
+    return _collection
+
+
+def reload_collection() -> None:
+    """
+    Сбрасывает клиент и коллекцию (а с ними лексический индекс и кэш результатов):
+    следующий запрос откроет индекс заново. Нужен после пересборки индекса другим процессом или смены RAG_PERSIST_DIR.
+    """
+    global _client, _collection
+    with _lock:
+        if _client is not None:
+            # Chroma кэширует систему по пути — без сброса новый клиент получит старое состояние
+            _client.clear_system_cache()
+        _client = None
+        _collection = None
+    reload_lexical_index()
+    invalidate_query_cache()
+
+
+def warm_up() -> None:
+    """Открывает индекс и прогревает модель эмбеддингов, чтобы первый запрос не платил за загрузку."""
+    started = time.perf_counter()
+    try:
+        count = get_collection().count()
+        # Лексический индекс поднимается первым: он отвечает, пока грузится модель
+        get_lexical_index()
+        _embed(["warm up"])
+    except Exception:
+        logger.exception("RAG warm-up failed")
+        return
+    logger.info("RAG warm-up: %d chunks, %.0f ms", count, (time.perf_counter() - started) * 1000)
 
 
 def upsert_texts(ids: list[str], texts: list[str], metadatas: list[dict[str, Any]]):
-    col = get_collection()
-    embeddings = _embed(texts)
-    col.upsert(ids=ids, documents=texts, metadatas=metadatas, embeddings=embeddings)
+    upsert_stream(zip(ids, texts, metadatas))
 
 
-def query_text(query: str, top_k: int) -> list[dict[str, Any]]:
+def upsert_stream(
+    records: Iterable[tuple[str, str, dict[str, Any]]],
+    on_progress: Callable[[int], None] | None = None,
+) -> int:
+    """
+    Потоковая запись в индекс: записи (id, text, metadata) читаются лениво,
+    эмбеддятся пачками по RAG_EMBED_BATCH_SIZE (с RAG_EMBED_PARALLEL процессами
+    FastEmbed) и пишутся в Chroma пачками по RAG_UPSERT_BATCH_SIZE. В памяти
+    одновременно только текущие пачки, а не весь корпус; numpy-индекс копит
+    пачки до конца потока и сохраняет файлы один раз (NumpyCollection.bulk).
+    Возвращает число записанных фрагментов.
+    """
+    records = iter(records)
+    first = next(records, None)
+    if first is None:
+        return 0  # не грузим модель эмбеддингов, если писать нечего
+    records = itertools.chain([first], records)
+
     col = get_collection()
-    emb = _embed([query])[0]
-    res = col.query(
+    # FastEmbed отдаёт векторы в порядке входа — сопоставляем их с записями через очередь
+    pending: deque[tuple[str, str, dict[str, Any]]] = deque()
+
+    def texts() -> Iterable[str]:
+        for record in records:
+            pending.append(record)
+            yield record[1]
+
+    vectors = _get_embedder().embed(texts(), batch_size=RAG_EMBED_BATCH_SIZE, parallel=RAG_EMBED_PARALLEL)
+    batch: list[tuple[str, str, dict[str, Any]]] = []
+    batch_vectors: list[np.ndarray] = []
+    total = 0
+
+    def flush() -> None:
+        nonlocal total
+        col.upsert(
+            ids=[r[0] for r in batch],
+            documents=[r[1] for r in batch],
+            metadatas=[r[2] for r in batch],
+            embeddings=np.asarray(batch_vectors, dtype=np.float32),
+        )
+        total += len(batch)
+        batch.clear()
+        batch_vectors.clear()
+        if on_progress is not None:
+            on_progress(total)
+
+    with col.bulk() if isinstance(col, NumpyCollection) else contextlib.nullcontext():
+        for vec in vectors:
+            batch.append(pending.popleft())
+            batch_vectors.append(vec)
+            if len(batch) >= RAG_UPSERT_BATCH_SIZE:
+                flush()
+        if batch:
+            flush()
+    return total
+
+
+def delete_ids(ids: list[str]) -> None:
+    if ids:
+        get_collection().delete(ids=ids)
+
+
+def list_ids() -> list[str]:
+    return get_collection().get(include=[])["ids"]
+
+
+def get_documents() -> tuple[list[str], list[str], list[dict[str, Any]]]:
+    """Все фрагменты коллекции: (ids, тексты, метаданные) — для лексического индекса."""
+    res = get_collection().get(include=["documents", "metadatas"])
+    return res["ids"], res["documents"], [m or {} for m in res["metadatas"]]
+
+
+def query_vector(emb: np.ndarray, top_k: int, topics: list[str] | None = None) -> list[dict[str, Any]]:
+    """
+    Ближайшие к готовому вектору фрагменты (id, text, meta, distance, embedding).
+    Эмбеддинги фрагментов нужны сборке контекста (MMR), второй раз их не считаем.
+    topics — искать только среди фрагментов этих тем (метаданные topic).
+    """
+    res = get_collection().query(
         query_embeddings=[emb],
         n_results=top_k,
-        include=["documents", "metadatas", "distances"],
+        where={"topic": {"$in": topics}} if topics else None,
+        include=["documents", "metadatas", "distances", "embeddings"],
     )
 
+    ids = res.get("ids", [[]])[0]
     docs = res.get("documents", [[]])[0]
     metas = res.get("metadatas", [[]])[0]
     dists = res.get("distances", [[]])[0]
+    embs = res.get("embeddings")
+    embs = embs[0] if embs is not None else [None] * len(ids)
 
     out: list[dict[str, Any]] = []
-    for doc, meta, dist in zip(docs, metas, dists):
-        out.append({"text": doc, "meta": meta or {}, "distance": dist})
+    for id_, doc, meta, dist, vec in zip(ids, docs, metas, dists, embs):
+        out.append({"id": id_, "text": doc, "meta": meta or {}, "distance": dist, "embedding": vec})
     return out
 
+
+def query_text(query: str, top_k: int, topics: list[str] | None = None) -> list[dict[str, Any]]:
+    started = time.perf_counter()
+    out = query_vector(embed_query(query), top_k, topics)
+    metrics.observe("rag.query", (time.perf_counter() - started) * 1000)
+    return out
@@ -1,11 +1,16 @@
 # routers/chat.py
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from app.security import get_current_user
-from app.config import VLLM_BASE_URL, LLM_DEFAULT_MODEL
-from app.llm_utils import strip_think_tags
-from app.rag.settings import RAG_ENABLED, RAG_TOP_K, RAG_MAX_CONTEXT_CHARS
-from app.rag.vectorstore import query_text
+from app.config import LLM_DEFAULT_MODEL, LLM_MODELS, LLM_PROMPT_LAYOUT
+from app.llm_cache import get_response_cache
+from app.llm_admission import PRIORITY_BULK
+from app.llm_client import chat_completion
+from app.llm_utils import strip_think_tags, canonical_hash
+from app.rag.settings import RAG_ENABLED, RAG_CONTEXT_CANDIDATES
+from app.rag.context import build_context
+from app.rag.retriever import QueryPart, retrieve
 
 router = APIRouter(prefix="/chat")
 
@@ -22,6 +27,7 @@ class ChatRequest(BaseModel):
     messages: list[Message]
     max_tokens: int = 10000
     temperature: float = 0.7
+    cache: bool = False    # разрешить ответ из кэша при temperature > 0
 
 
 class ChatChoice(BaseModel):
@@ -38,11 +44,13 @@ class ChatResponse(BaseModel):
 # --- Эндпоинт ---
 
 @router.post("/completions", response_model=ChatResponse)
-def chat_completions(
+async def chat_completions(
     request: ChatRequest,
     current_user=Depends(get_current_user),
 ):
-    reply = _call_llm(request)
+    if request.model not in LLM_MODELS:
+        raise HTTPException(status_code=400, detail=f"Unknown model: {request.model}")
+    reply = await _call_llm(request)
 
     return ChatResponse(
         model=request.model,
@@ -56,45 +64,61 @@ def chat_completions(
     )
 
 
-def _call_llm(request: ChatRequest) -> str:
+async def _call_llm(request: ChatRequest) -> str:
     """Вызов LLM по OpenAI-совместимому API (vLLM / llama.cpp и т.д.)."""
-    from openai import OpenAI
+    # RAG считает эмбеддинги на CPU — уводим из event loop
+    messages = await run_in_threadpool(_build_chat_messages, request)
+
+    # Кэшируем только детерминированные запросы или по явной просьбе клиента
+    cache = get_response_cache() if request.temperature == 0 or request.cache else None
+    if cache:
+        cache_key = canonical_hash({
+            "model": request.model,
+            "messages": messages,  # уже с контекстом RAG
+            "max_tokens": request.max_tokens,
+            "temperature": request.temperature,
+        })
+        cached = await cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    completion = await chat_completion(
+        request.model,
+        messages,
+        max_tokens=request.max_tokens,
+        temperature=request.temperature,
+        priority=PRIORITY_BULK,
+    )
+    reply = strip_think_tags(completion.text)
+    if cache:
+        await cache.set(cache_key, reply)
+    return reply
+
+
+def _build_chat_messages(request: ChatRequest) -> list[dict]:
+    """
+    Сообщения запроса + контекст из handbook (RAG).
 
+    В режиме prefix_cache контекст добавляется к последнему сообщению
+    пользователя, чтобы системный промпт и история клиента оставались
+    неизменным префиксом для кэша сервера; в legacy — отдельным system в начале.
+    """
     messages = [m.model_dump() for m in request.messages]
     if RAG_ENABLED:
         last_user = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
         if last_user.strip():
             try:
-                hits = query_text(last_user, top_k=RAG_TOP_K)
+                hits = retrieve([QueryPart(last_user, 1.0)], top_k=RAG_CONTEXT_CANDIDATES)
             except Exception:
                 hits = []
-            if hits:
-                context_lines: list[str] = []
-                total = 0
-                for i, h in enumerate(hits, start=1):
-                    meta = h.get("meta") or {}
-                    src = meta.get("source") or "unknown"
-                    title = meta.get("title")
-                    header = f"[{i}] {title + ' — ' if title else ''}{src}"
-                    snippet = (h.get("text") or "").strip()
-                    block = f"{header}\n{snippet}"
-                    if total + len(block) > RAG_MAX_CONTEXT_CHARS:
-                        break
-                    context_lines.append(block)
-                    total += len(block) + 2
-
-                rag_system = "TECH INTERVIEW HANDBOOK (RAG):\n" + "\n\n".join(context_lines)
-                messages = [{"role": "system", "content": rag_system}] + messages
-
-    client = OpenAI(
-        api_key="not-needed",
-        base_url=VLLM_BASE_URL,
-    )
-    response = client.chat.completions.create(
-        model=request.model,
-        messages=messages,
-        max_tokens=request.max_tokens,
-        temperature=request.temperature,
-    )
-    raw = response.choices[0].message.content or ""
-    return strip_think_tags(raw)
\ No newline at end of file
+            rag_block = build_context(hits)
+            if rag_block:
+                if LLM_PROMPT_LAYOUT == "prefix_cache" and messages[-1]["role"] == "user":
+                    messages[-1] = {
+                        "role": "user",
+                        "content": f"{rag_block}\n\n{messages[-1]['content']}",
+                    }
+                else:
+                    messages = [{"role": "system", "content": rag_block}] + messages
+
+    return messages
@@ -0,0 +1,13 @@
+# routers/metrics.py
+from fastapi import APIRouter, Depends
+
+from app import metrics
+from app.security import get_current_user
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+def get_metrics(current_user=Depends(get_current_user)):
+    """Счётчики и перцентили латентности текущего процесса (только для авторизованных)."""
+    return metrics.snapshot()
@@ -1,18 +1,29 @@
 # routers/session.py
+import json
+import logging
 import re
+import time
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session as DBSession
 from pydantic import BaseModel
 
-from app.database import get_db
+from app import metrics
+from app.database import get_db, SessionLocal
 from app.models import Session, Message, Resume, AgentType, SessionStatus, RoadmapItem, RoadmapStatus, Goal
 from app.security import get_current_user
-from app.config import VLLM_BASE_URL, get_model_for_agent
-from app.llm_utils import strip_think_tags
-from app.rag.settings import RAG_ENABLED, RAG_TOP_K, RAG_MAX_CONTEXT_CHARS
-from app.rag.vectorstore import query_text
+from app.config import get_model_for_agent, LLM_PROMPT_LAYOUT
+from app.history import split_history, fold_into_summary, messages_tokens
+from app.llm_client import chat_completion, open_chat_stream
+from app.llm_utils import strip_think_tags, ThinkTagFilter
+from app.rag.settings import RAG_ENABLED, RAG_CONTEXT_CANDIDATES
+from app.rag.context import build_context
+from app.rag.retriever import interview_query_parts, retrieve
+from app.rag.topics import agent_topics
 
 router = APIRouter(prefix="/session")
+logger = logging.getLogger(__name__)
 
 
 # --- Промты для каждого агента ---
@@ -84,6 +95,7 @@ class MessageOut(BaseModel):
     id: int
     role: str
     content: str
+    prompt_tokens: int | None = None
     model_config = {"from_attributes": True}
 
 
@@ -146,33 +158,50 @@ def create_session(
 
 
 @router.post("/{session_id}/message", response_model=MessageOut)
-def send_message(
+async def send_message(
     session_id: int,
     payload: UserMessage,
     db: DBSession = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
-    session = db.query(Session).filter(
-        Session.id == session_id,
-        Session.user_id == current_user.id,
-    ).first()
-    if not session:
-        raise HTTPException(status_code=404, detail="Сессия не найдена")
-    if session.status == SessionStatus.COMPLETED:
-        raise HTTPException(status_code=400, detail="Сессия завершена")
+    # Сессия БД синхронная — все обращения к ней уводим из event loop, иначе медленный
+    # запрос к базе остановит все идущие SSE-стримы
+    session = await run_in_threadpool(_open_turn, session_id, current_user.id, payload.content, db)
+    reply_text, prompt_tokens = await _get_agent_reply(session, db)
+    return await run_in_threadpool(_add_assistant_message, session, reply_text, prompt_tokens, db)
 
-    user_msg = Message(session_id=session.id, role="user", content=payload.content)
-    db.add(user_msg)
-    db.flush()
 
-    reply_text = _get_agent_reply(session, db)
+@router.post("/{session_id}/message/stream")
+async def send_message_stream(
+    session_id: int,
+    payload: UserMessage,
+    db: DBSession = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    То же, что /message, но ответ агента отдаётся потоком (Server-Sent Events).
 
-    agent_msg = Message(session_id=session.id, role="assistant", content=reply_text)
-    db.add(agent_msg)
-    db.flush()
+    События:
+      delta — очередной фрагмент текста: {"content": "..."}
+      done  — ответ сохранён: MessageOut + ttft_ms / total_ms
+      error — генерация прервалась: {"detail": "..."}
+    """
+    started = time.perf_counter()
+    session = await run_in_threadpool(_open_turn, session_id, current_user.id, payload.content, db)
 
-    db.refresh(agent_msg)
-    return agent_msg
+    # Промпт собираем до ответа: к моменту стриминга зависимость get_db уже закрыта
+    model = get_model_for_agent(session.agent_type.value)
+    window = await _prepare_history(session, db, model)
+    messages = await run_in_threadpool(_build_agent_messages, session, window)
+    deltas = await open_chat_stream(model, messages, max_tokens=10000, temperature=0.7)
+    # После commit атрибуты session просрочены — дальше только session_id, без похода в БД
+    await run_in_threadpool(db.commit)
+
+    return StreamingResponse(
+        _stream_agent_reply(session_id, deltas, started, messages_tokens(messages)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.post("/{session_id}/save_roadmap")
@@ -479,10 +508,63 @@ def _save_roadmap_items(text: str, user_id: int, goal_id: int | None, db: DBSess
 # Вызов LLM
 # ---------------------------------------------------------------------------
 
-def _get_agent_reply(session: Session, db: DBSession) -> str:
+def _open_turn(session_id: int, user_id: int, content: str, db: DBSession) -> Session:
+    """Проверяет сессию и сохраняет реплику кандидата (синхронно — вызывать в threadpool)."""
+    session = db.query(Session).filter(
+        Session.id == session_id,
+        Session.user_id == user_id,
+    ).first()
+    if not session:
+        raise HTTPException(status_code=404, detail="Сессия не найдена")
+    if session.status == SessionStatus.COMPLETED:
+        raise HTTPException(status_code=400, detail="Сессия завершена")
+
+    user_msg = Message(session_id=session.id, role="user", content=content)
+    db.add(user_msg)
+    db.flush()
+    return session
+
+
+def _add_assistant_message(session: Session, content: str, prompt_tokens: int, db: DBSession) -> Message:
+    agent_msg = Message(
+        session_id=session.id,
+        role="assistant",
+        content=content,
+        prompt_tokens=prompt_tokens,
+    )
+    db.add(agent_msg)
+    db.flush()
+    db.refresh(agent_msg)
+    return agent_msg
+
+
+async def _prepare_history(session: Session, db: DBSession, model: str) -> list[Message]:
+    """Окно истории для промпта; если окно переполнено — дописывает выпавшее в конспект."""
+    to_fold, window = await run_in_threadpool(split_history, session)
+    if to_fold:
+        try:
+            session.history_summary = await fold_into_summary(model, session.history_summary, to_fold)
+            session.summarized_until_id = to_fold[-1].id
+            await run_in_threadpool(db.flush)
+        except Exception:
+            # Конспект допишем на следующем ходе, сейчас отвечаем по окну
+            logger.exception("History summary failed for session %s", session.id)
+    return window
+
+
+def _build_agent_messages(session: Session, window: list[Message]) -> list[dict]:
+    """
+    Системный промпт (агент + резюме + вакансия + конспект), окно истории и контекст RAG.
+
+    В режиме LLM_PROMPT_LAYOUT=prefix_cache контекст RAG (меняется каждый ход)
+    ставится в конец — перед последним сообщением кандидата. Всё, что до него,
+    побайтно совпадает с промптом прошлого хода, и сервер (vLLM automatic prefix
+    caching, llama.cpp cache_prompt) не пересчитывает этот префикс.
+    В режиме legacy RAG дописывается в системный промпт, как раньше.
+    """
     # Оборачиваем пользовательские сообщения в явный тег — защита от prompt injection
     history = []
-    for msg in session.messages:
+    for msg in window:
         if msg.role == "user":
             history.append({
                 "role": "user",
@@ -496,46 +578,104 @@ def _get_agent_reply(session: Session, db: DBSession) -> str:
         system_prompt += f"\n\nРЕЗЮМЕ КАНДИДАТА:\n{session.resume.raw_text[:3000]}"
     if session.vacancy_text:
         system_prompt += f"\n\nВАКАНСИЯ:\n{session.vacancy_text[:1000]}"
+    if session.history_summary:
+        system_prompt += f"\n\nКРАТКОЕ СОДЕРЖАНИЕ НАЧАЛА ИНТЕРВЬЮ:\n{session.history_summary}"
 
     if RAG_ENABLED:
-        last_user = next((m["content"] for m in reversed(history) if m["role"] == "user"), "")
-        rag_query = last_user
-        if session.vacancy_text:
-            rag_query += f"\n\nVacancy:\n{session.vacancy_text[:800]}"
-        if session.resume:
-            rag_query += f"\n\nResume:\n{session.resume.raw_text[:1200]}"
-
+        last_user = next((m.content for m in reversed(window) if m.role == "user"), "")
+        # Резюме и вакансия эмбеддятся отдельно от реплики, их векторы переиспользуются между ходами
+        parts = interview_query_parts(
+            last_user,
+            session.vacancy_text,
+            session.resume.raw_text if session.resume else None,
+        )
         try:
-            hits = query_text(rag_query, top_k=RAG_TOP_K)
+            # Каждый агент ищет по своим темам handbook: HR не нужны шпаргалки по графам
+            hits = retrieve(parts, top_k=RAG_CONTEXT_CANDIDATES, topics=agent_topics(session.agent_type.value))
         except Exception:
             hits = []
 
-        if hits:
-            context_lines: list[str] = []
-            total = 0
-            for i, h in enumerate(hits, start=1):
-                meta = h.get("meta") or {}
-                src = meta.get("source") or "unknown"
-                title = meta.get("title")
-                header = f"[{i}] {title + ' — ' if title else ''}{src}"
-                snippet = (h.get("text") or "").strip()
-                block = f"{header}\n{snippet}"
-                if total + len(block) > RAG_MAX_CONTEXT_CHARS:
-                    break
-                context_lines.append(block)
-                total += len(block) + 2
-
-            system_prompt += "\n\nTECH INTERVIEW HANDBOOK (RAG):\n" + "\n\n".join(context_lines)
-
-    from openai import OpenAI
+        rag_block = build_context(hits)
+        if rag_block:
+            if LLM_PROMPT_LAYOUT == "prefix_cache" and history and history[-1]["role"] == "user":
+                history[-1] = {
+                    "role": "user",
+                    "content": f"{rag_block}\n\n{history[-1]['content']}",
+                }
+            else:
+                system_prompt += "\n\n" + rag_block
+
+    return [{"role": "system", "content": system_prompt}] + history
 
+
+async def _get_agent_reply(session: Session, db: DBSession) -> tuple[str, int]:
+    """Ответ агента и размер промпта в токенах."""
     model = get_model_for_agent(session.agent_type.value)
-    client = OpenAI(api_key="not-needed", base_url=VLLM_BASE_URL)
-    response = client.chat.completions.create(
-        model=model,
-        messages=[{"role": "system", "content": system_prompt}] + history,
-        max_tokens=10000,
-        temperature=0.7,
+    window = await _prepare_history(session, db, model)
+    # Сборка промпта ходит в БД и в RAG (эмбеддинги на CPU) — уводим из event loop
+    messages = await run_in_threadpool(_build_agent_messages, session, window)
+    completion = await chat_completion(model, messages, max_tokens=10000, temperature=0.7)
+    prompt_tokens = completion.prompt_tokens or messages_tokens(messages)
+    logger.info("session %s: prompt_tokens=%s window=%s", session.id, prompt_tokens, len(window))
+    return strip_think_tags(completion.text), prompt_tokens
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _save_assistant_message(session_id: int, content: str, prompt_tokens: int) -> dict:
+    db = SessionLocal()
+    try:
+        agent_msg = Message(
+            session_id=session_id,
+            role="assistant",
+            content=content,
+            prompt_tokens=prompt_tokens,
+        )
+        db.add(agent_msg)
+        db.commit()
+        db.refresh(agent_msg)
+        return MessageOut.model_validate(agent_msg).model_dump()
+    finally:
+        db.close()
+
+
+async def _stream_agent_reply(session_id: int, deltas, started: float, prompt_tokens: int):
+    """
+    Пробрасывает дельты от LLM клиенту по мере генерации (без блоков think), а в конце
+    сохраняет итоговое сообщение ассистента в собственной сессии БД.
+    """
+    ttft_ms = None
+    parts: list[str] = []
+    think_filter = ThinkTagFilter()
+    try:
+        async for raw_delta in deltas:
+            delta = think_filter.feed(raw_delta)
+            if not delta:
+                continue
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - started) * 1000
+                metrics.observe("session.ttft", ttft_ms)
+            parts.append(delta)
+            yield _sse("delta", {"content": delta})
+        tail = think_filter.flush()
+        if tail:
+            parts.append(tail)
+            yield _sse("delta", {"content": tail})
+    except Exception:
+        logger.exception("LLM stream failed for session %s", session_id)
+        yield _sse("error", {"detail": "Ошибка генерации ответа"})
+        return
+
+    total_ms = (time.perf_counter() - started) * 1000
+    metrics.observe("session.stream_total", total_ms)
+    out = await run_in_threadpool(
+        _save_assistant_message, session_id, "".join(parts).strip(), prompt_tokens
+    )
+
+    logger.info(
+        "session %s: ttft=%.0fms total=%.0fms prompt_tokens~%s",
+        session_id, ttft_ms or -1, total_ms, prompt_tokens,
     )
-    raw = response.choices[0].message.content or ""
-    return strip_think_tags(raw)
\ No newline at end of file
+    yield _sse("done", {**out, "ttft_ms": ttft_ms, "total_ms": total_ms})
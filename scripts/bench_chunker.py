@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк чанкеров: старые окна по 1200 символов с перекрытием 200 против
+markdown-чанкера по структуре документа (app/rag/chunker.py).
+
+Сравниваются: число фрагментов и их суммарный размер (символы, токены,
+байты индекса), доля продублированного перекрытием текста, время нарезки и
+эмбеддинга, recall@k. Запросы для recall — случайные предложения корпуса;
+фрагмент считается релевантным, если содержит середину предложения целиком
+(то есть предложение не разрезано границей фрагмента).
+
+Использование (из корня проекта):
+  python scripts/bench_chunker.py --handbook tech-interview-handbook-main/apps/website
+  python scripts/bench_chunker.py --no-embed          # только размеры и время нарезки
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.rag.chunker import get_token_counter, iter_markdown_chunks  # noqa: E402
+from app.rag.handbook_loader import chunk_text, list_handbook_files  # noqa: E402
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def sample_queries(texts: list[str], n: int, seed: int) -> list[str]:
+    sentences = []
+    for text in texts:
+        for para in text.split("\n\n"):
+            if para.lstrip().startswith(("```", "#", "<", "import ", "|", "---")):
+                continue
+            for s in _SENTENCE_RE.split(para.replace("\n", " ")):
+                if 10 <= len(s.split()) <= 40:
+                    sentences.append(s.strip())
+    random.Random(seed).shuffle(sentences)
+    return sentences[:n]
+
+
+def recall_at_k(chunks: list[str], vectors, queries: list[str], qvecs, k: int) -> float:
+    import numpy as np
+
+    scores = qvecs @ vectors.T
+    top = np.argsort(-scores, axis=1)[:, :k]
+    found = 0
+    for qi, q in enumerate(queries):
+        # Середина предложения: не зависит от того, куда чанкер поставил границу абзаца
+        mid = q[len(q) // 4: len(q) * 3 // 4]
+        if any(mid in chunks[ci] for ci in top[qi]):
+            found += 1
+    return found / len(queries)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Сравнение чанкеров RAG")
+    ap.add_argument("--handbook", type=Path, default=Path("tech-interview-handbook-main/apps/website"))
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--top-k", type=int, default=6)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--no-embed", action="store_true", help="Не считать эмбеддинги и recall")
+    args = ap.parse_args()
+
+    root = args.handbook.resolve()
+    files = list_handbook_files(root)
+    texts = [p.read_text(encoding="utf-8", errors="ignore") for p in files]
+    source_chars = sum(len(t) for t in texts)
+    count = get_token_counter()
+
+    chunkers = {
+        "chars-1200/200": lambda text: chunk_text(text),
+        "markdown": lambda text: [c.text for c in iter_markdown_chunks(text.splitlines(keepends=True))],
+    }
+    results = {}
+    for name, chunker in chunkers.items():
+        started = time.perf_counter()
+        chunks = [c for t in texts for c in chunker(t)]
+        chunk_s = time.perf_counter() - started
+        tokens = [count(c) for c in chunks]
+        results[name] = {"chunks": chunks, "chunk_s": chunk_s, "tokens": tokens}
+
+    embedder = None
+    if not args.no_embed:
+        import numpy as np
+        from app.rag.vectorstore import _get_embedder
+
+        embedder = _get_embedder()
+        queries = sample_queries(texts, args.queries, args.seed)
+        qvecs = np.asarray(list(embedder.embed(queries)), dtype=np.float32)
+
+    print(f"Файлов: {len(files)}, символов в исходниках: {source_chars}\n")
+    for name, r in results.items():
+        chunks, tokens = r["chunks"], r["tokens"]
+        chars = sum(len(c) for c in chunks)
+        line = (
+            f"{name:<16} chunks={len(chunks):5d}  chars={chars:8d} ({chars / source_chars:5.0%} of source)  "
+            f"tokens avg={sum(tokens) / len(tokens):6.1f} max={max(tokens):5d}  chunk={r['chunk_s'] * 1000:7.1f} ms"
+        )
+        if embedder is not None:
+            started = time.perf_counter()
+            vectors = np.asarray(list(embedder.embed(chunks)), dtype=np.float32)
+            embed_s = time.perf_counter() - started
+            recall = recall_at_k(chunks, vectors, queries, qvecs, args.top_k)
+            line += (
+                f"  embed={embed_s:6.1f} s  vectors={vectors.nbytes / 1e6:5.1f} MB"
+                f"  recall@{args.top_k}={recall:.3f}"
+            )
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
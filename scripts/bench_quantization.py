@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Отчёт «recall против памяти» для форматов матрицы numpy-бэкенда RAG
+(app/rag/numpy_store.py): float16, int8, binary — с пересчётом кандидатов
+по float32 (RAG_NUMPY_RESCORE) и без.
+
+Эталон — точный поиск по float32. Для каждого формата печатаются байты
+на вектор и размер сканируемой матрицы (она читается целиком на каждый
+запрос), размер float32-копии на диске (нужна только для пересчёта, с диска
+читаются лишь строки кандидатов), recall@k и латентность.
+
+Векторы: из текущего индекса (--from-index), эмбеддинги handbook (--handbook,
+нужна модель) или синтетические кластеризованные (по умолчанию). Запросы —
+векторы корпуса с шумом.
+
+Использование (из корня проекта):
+  python scripts/bench_quantization.py --docs 20000
+  python scripts/bench_quantization.py --from-index --json-out quant.json
+  python scripts/bench_quantization.py --handbook tech-interview-handbook-main/apps/website
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.rag.numpy_store import _encode, _normalize, _Snapshot, search  # noqa: E402
+
+# (формат, пересчёт кандидатов top_k × N)
+CONFIGS = [
+    ("float16", 0),
+    ("int8", 0),
+    ("int8", 2),
+    ("int8", 4),
+    ("binary", 0),
+    ("binary", 4),
+    ("binary", 10),
+    ("binary", 20),
+]
+
+
+def synthetic_vectors(n: int, dim: int, seed: int) -> np.ndarray:
+    """Кластеры вокруг случайных центров: ближе к реальным эмбеддингам, чем равномерный шум."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, n // 50), dim)).astype(np.float32)
+    labels = rng.integers(0, len(centers), n)
+    return _normalize(centers[labels] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32))
+
+
+def index_vectors() -> np.ndarray:
+    from app.rag.vectorstore import get_collection
+
+    return _normalize(np.asarray(get_collection().get(include=["embeddings"])["embeddings"], dtype=np.float32))
+
+
+def handbook_vectors(root: Path) -> np.ndarray:
+    from app.rag.handbook_loader import iter_handbook_chunks
+    from app.rag.vectorstore import _embed
+
+    texts = [c.text for c in iter_handbook_chunks(root.resolve())]
+    return _normalize(_embed(texts))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Recall против памяти для квантования векторов RAG")
+    ap.add_argument("--from-index", action="store_true", help="Векторы из текущего индекса (RAG_BACKEND)")
+    ap.add_argument("--handbook", type=Path, default=None, help="Эмбеддинги фрагментов handbook (нужна модель)")
+    ap.add_argument("--docs", type=int, default=10000, help="Размер синтетического корпуса")
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--queries", type=int, default=300)
+    ap.add_argument("--noise", type=float, default=0.5, help="Шум запросов относительно векторов корпуса")
+    ap.add_argument("--top-k", type=int, default=6)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json-out", type=Path, default=None)
+    args = ap.parse_args()
+
+    if args.from_index:
+        vectors = index_vectors()
+    elif args.handbook:
+        vectors = handbook_vectors(args.handbook)
+    else:
+        vectors = synthetic_vectors(args.docs, args.dim, args.seed)
+    n, dim = vectors.shape
+
+    rng = np.random.default_rng(args.seed + 1)
+    picked = vectors[rng.integers(0, n, args.queries)]
+    queries = _normalize(picked + args.noise / np.sqrt(dim) * rng.standard_normal(picked.shape).astype(np.float32))
+    exact = [set(np.argsort(-(vectors @ q))[:args.top_k].tolist()) for q in queries]
+
+    def measure(snapshot: _Snapshot, rescore: int) -> tuple[float, float]:
+        found, samples = 0, []
+        for q, truth in zip(queries, exact):
+            started = time.perf_counter()
+            top, _ = search(snapshot, q, args.top_k, rescore)
+            samples.append((time.perf_counter() - started) * 1000)
+            found += len(truth & set(top.tolist()))
+        return found / (len(queries) * args.top_k), statistics.median(samples)
+
+    ids = [str(i) for i in range(n)]
+    rows = []
+    full_mb = vectors.nbytes / 1e6
+    baseline = _Snapshot(vectors, None, None, dim, ids, [], [])
+    recall, p50 = measure(baseline, 0)
+    rows.append({"format": "float32", "rescore": 0, "bytes_per_vector": dim * 4,
+                 "scan_mb": full_mb, "full_mb": 0.0, "recall": recall, "p50_ms": p50})
+    for dtype, rescore in CONFIGS:
+        matrix, scales = _encode(vectors, dtype)
+        snapshot = _Snapshot(matrix, scales, vectors if rescore else None, dim, ids, [], [])
+        recall, p50 = measure(snapshot, rescore)
+        scan_bytes = matrix.nbytes + (scales.nbytes if scales is not None else 0)
+        rows.append({
+            "format": dtype, "rescore": rescore, "bytes_per_vector": scan_bytes / n,
+            "scan_mb": scan_bytes / 1e6, "full_mb": full_mb if rescore else 0.0,
+            "recall": recall, "p50_ms": p50,
+        })
+
+    print(f"Векторов: {n}, dim={dim}, запросов: {len(queries)}, recall@{args.top_k} против точного float32\n")
+    print(f"{'format':<8} {'rescore':>7} {'B/vec':>7} {'scan MB':>8} {'+full MB':>9} {'recall':>7} {'p50 ms':>7}")
+    for r in rows:
+        print(
+            f"{r['format']:<8} {r['rescore']:>7} {r['bytes_per_vector']:>7.0f} {r['scan_mb']:>8.2f} "
+            f"{r['full_mb']:>9.2f} {r['recall']:>7.3f} {r['p50_ms']:>7.2f}"
+        )
+    if args.json_out:
+        args.json_out.write_text(json.dumps({"docs": n, "dim": dim, "top_k": args.top_k, "rows": rows}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
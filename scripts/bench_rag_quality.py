@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк качества и латентности RAG на размеченном наборе запросов.
+
+Набор (data/rag_eval/queries_v*.json, с версией) — вопросы в духе интервью,
+у каждого агент и файлы handbook (meta source), которые должны найтись.
+Для каждой конфигурации (бэкенд × чанкер, плюс любые переменные RAG_* через
+--env) индекс собирается заново во временной папке в отдельном процессе —
+настройки читаются при импорте. Затем по каждому запросу, как в ходе
+интервью (retrieve с темами агента → build_context):
+  - recall@k — доля ожидаемых файлов среди первых k фрагментов;
+  - MRR — 1/ранг первого фрагмента из ожидаемого файла;
+  - токены контекста, который уходит в промпт;
+  - время эмбеддинга запроса, векторного поиска (query_vector) и всего
+    retrieve (с BM25 и слиянием; вектор уже в кэше).
+Семантический кэш запросов выключен, чтобы мерить поиск, а не кэш.
+
+Отчёт — JSON (--out): версия набора, коммит, агрегаты и строки по запросам.
+С --baseline сравнивает с прошлым отчётом и завершается с кодом 1, если
+recall или MRR просели больше допуска либо p95 поиска вырос.
+
+Использование (из корня проекта):
+  python scripts/bench_rag_quality.py --out rag_quality.json
+  python scripts/bench_rag_quality.py --configs numpy-int8-markdown --env RAG_CHUNK_TOKENS=384
+  python scripts/bench_rag_quality.py --baseline rag_quality.json --out new.json
+  python scripts/bench_rag_quality.py --persist-dir rag_store --configs chroma-markdown
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+DEFAULT_QUERIES = ROOT / "data" / "rag_eval" / "queries_v1.json"
+
+CONFIGS = {
+    "chroma-markdown": {"RAG_BACKEND": "chroma", "RAG_CHUNKER": "markdown"},
+    "chroma-chars": {"RAG_BACKEND": "chroma", "RAG_CHUNKER": "chars"},
+    "numpy-int8-markdown": {"RAG_BACKEND": "numpy", "RAG_NUMPY_DTYPE": "int8", "RAG_CHUNKER": "markdown"},
+    "numpy-int8-chars": {"RAG_BACKEND": "numpy", "RAG_NUMPY_DTYPE": "int8", "RAG_CHUNKER": "chars"},
+}
+# Переменные, которые бенчмарк выставляет всегда
+BASE_ENV = {"RAG_QUERY_CACHE_MAX_ENTRIES": "0"}
+
+
+def percentile(samples: list[float], q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))] if samples else 0.0
+
+
+def dir_mb(path: str) -> float:
+    return sum(p.stat().st_size for p in Path(path).rglob("*") if p.is_file()) / 1e6
+
+
+def load_queries(path: Path) -> dict:
+    data = json.loads(path.read_text(encoding="utf-8"))
+    if "version" not in data or not data.get("queries"):
+        raise ValueError(f"{path}: ожидается {{'version': N, 'queries': [...]}}")
+    return data
+
+
+def score_hits(hits: list[dict], expected: set[str], k: int) -> tuple[float, float]:
+    """recall@k по файлам и reciprocal rank первого фрагмента из ожидаемого файла."""
+    sources = [(h.get("meta") or {}).get("source") for h in hits]
+    recall = len(expected & set(sources[:k])) / len(expected)
+    rank = next((i + 1 for i, src in enumerate(sources) if src in expected), None)
+    return recall, 1 / rank if rank else 0.0
+
+
+def build(sources: list[str] | None) -> None:
+    """Полная сборка индекса выбранной (через окружение) конфигурации; итог — JSON в stdout."""
+    from app.rag.build_index import build_index
+
+    started = time.perf_counter()
+    report = build_index(full=True, sources=sources)
+    print(json.dumps({"build_s": round(time.perf_counter() - started, 2), "report": str(report)}))
+
+
+def child(queries_path: Path, k: int) -> None:
+    """Прогон набора запросов в свежем процессе; результат — одна строка JSON в stdout."""
+    from app.rag.chunker import get_token_counter
+    from app.rag.context import build_context
+    from app.rag.retriever import QueryPart, retrieve
+    from app.rag.settings import RAG_CONTEXT_CANDIDATES
+    from app.rag.topics import agent_topics
+    from app.rag.vectorstore import embed_query, get_collection, query_vector, warm_up
+
+    data = load_queries(queries_path)
+    count_tokens = get_token_counter()
+    candidates = max(k, RAG_CONTEXT_CANDIDATES)
+
+    started = time.perf_counter()
+    warm_up()
+    load_ms = (time.perf_counter() - started) * 1000
+
+    rows = []
+    for q in data["queries"]:
+        topics = agent_topics(q["agent"])
+        t = time.perf_counter()
+        vec = embed_query(q["query"])
+        embed_ms = (time.perf_counter() - t) * 1000
+        t = time.perf_counter()
+        query_vector(vec, candidates, topics=topics)
+        search_ms = (time.perf_counter() - t) * 1000
+        t = time.perf_counter()
+        hits = retrieve([QueryPart(q["query"], 1.0)], top_k=candidates, topics=topics)
+        retrieve_ms = (time.perf_counter() - t) * 1000
+        recall, rr = score_hits(hits, set(q["sources"]), k)
+        rows.append({
+            "id": q["id"], "agent": q["agent"], "recall": recall, "rr": rr,
+            "context_tokens": count_tokens(build_context(hits)),
+            "embed_ms": embed_ms, "search_ms": search_ms, "retrieve_ms": retrieve_ms,
+            "top_sources": [(h.get("meta") or {}).get("source") for h in hits[:k]],
+        })
+
+    def column(name: str) -> list[float]:
+        return [r[name] for r in rows]
+
+    print(json.dumps({
+        "chunks": get_collection().count(),
+        "load_ms": load_ms,
+        "metrics": {
+            f"recall@{k}": statistics.fmean(column("recall")),
+            "mrr": statistics.fmean(column("rr")),
+            "context_tokens_mean": statistics.fmean(column("context_tokens")),
+            **{
+                f"{name}_{label}": percentile(column(name), q)
+                for name in ("embed_ms", "search_ms", "retrieve_ms")
+                for label, q in (("p50", 0.5), ("p95", 0.95))
+            },
+        },
+        "queries": rows,
+    }))
+
+
+def run_child(env: dict, args: argparse.Namespace, mode: str) -> dict:
+    cmd = [sys.executable, __file__, mode, "--queries", str(args.queries), "--top-k", str(args.top_k)]
+    if args.sources:
+        cmd += ["--sources", args.sources]
+    out = subprocess.run(cmd, env={**os.environ, **env}, cwd=ROOT, check=True, capture_output=True, text=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+def compare(report: dict, baseline: dict, args: argparse.Namespace) -> list[str]:
+    """Регрессии относительно прошлого отчёта (только для общих конфигураций)."""
+    if baseline.get("query_set", {}).get("version") != report["query_set"]["version"]:
+        return ["версии набора запросов различаются — отчёты несравнимы"]
+    problems = []
+    recall_key = f"recall@{args.top_k}"
+    for name, cur in report["configs"].items():
+        old = baseline.get("configs", {}).get(name)
+        if old is None:
+            continue
+        cur_m, old_m = cur["metrics"], old["metrics"]
+        for key in (recall_key, "mrr"):
+            if key in old_m and cur_m[key] < old_m[key] - args.max_quality_drop:
+                problems.append(f"{name}: {key} {old_m[key]:.3f} → {cur_m[key]:.3f}")
+        for key in ("search_ms_p95", "retrieve_ms_p95"):
+            if old_m.get(key) and cur_m[key] > old_m[key] * args.max_latency_ratio:
+                problems.append(f"{name}: {key} {old_m[key]:.2f} → {cur_m[key]:.2f} ms")
+    return problems
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Recall@k, MRR, токены контекста и латентность RAG на размеченных запросах")
+    ap.add_argument("mode", nargs="?", default="run", choices=["run", "build", "child"], help=argparse.SUPPRESS)
+    ap.add_argument("--queries", type=Path, default=DEFAULT_QUERIES, help="Размеченный набор запросов")
+    ap.add_argument("--configs", default=",".join(CONFIGS), help="Через запятую: " + ", ".join(CONFIGS))
+    ap.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                    help="Доп. переменная для всех конфигураций (можно повторять)")
+    ap.add_argument("--sources", default=None, help="Источники индекса через запятую (по умолчанию RAG_SOURCES)")
+    ap.add_argument("--persist-dir", default=None, help="Готовый индекс вместо сборки (бэкенд и чанкер должны совпадать)")
+    ap.add_argument("--top-k", type=int, default=None, help="k для recall@k (по умолчанию RAG_TOP_K)")
+    ap.add_argument("--out", type=Path, default=None, help="Куда записать JSON-отчёт")
+    ap.add_argument("--baseline", type=Path, default=None, help="Прошлый отчёт для сравнения")
+    ap.add_argument("--max-quality-drop", type=float, default=0.02, help="Допустимое падение recall/MRR")
+    ap.add_argument("--max-latency-ratio", type=float, default=1.5, help="Допустимый рост p95 поиска (во сколько раз)")
+    args = ap.parse_args()
+
+    if args.top_k is None:
+        from app.rag.settings import RAG_TOP_K
+
+        args.top_k = RAG_TOP_K
+    if args.mode == "build":
+        build(args.sources.split(",") if args.sources else None)
+        return
+    if args.mode == "child":
+        child(args.queries, args.top_k)
+        return
+
+    data = load_queries(args.queries)
+    extra = dict(item.split("=", 1) for item in args.env)
+    report = {
+        "query_set": {"path": str(args.queries), "version": data["version"], "queries": len(data["queries"])},
+        "commit": git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "top_k": args.top_k,
+        "env": extra,
+        "configs": {},
+    }
+    print(f"Набор v{data['version']}: {len(data['queries'])} запросов, recall@{args.top_k}\n")
+    print(f"{'config':<22} {'chunks':>6} {'recall':>7} {'MRR':>6} {'ctx tok':>8} "
+          f"{'embed p50':>10} {'search p95':>11} {'retrieve p95':>13}")
+    for name in args.configs.split(","):
+        persist_dir = args.persist_dir or tempfile.mkdtemp(prefix=f"rag_quality_{name}_")
+        env = {**CONFIGS[name], **BASE_ENV, **extra, "RAG_PERSIST_DIR": persist_dir}
+        built = None if args.persist_dir else run_child(env, args, "build")
+        r = run_child(env, args, "child")
+        r.update(env=CONFIGS[name], disk_mb=round(dir_mb(persist_dir), 2),
+                 build_s=built["build_s"] if built else None)
+        report["configs"][name] = r
+        m = r["metrics"]
+        print(
+            f"{name:<22} {r['chunks']:>6} {m[f'recall@{args.top_k}']:>7.3f} {m['mrr']:>6.3f} "
+            f"{m['context_tokens_mean']:>8.0f} {m['embed_ms_p50']:>8.2f}ms {m['search_ms_p95']:>9.2f}ms "
+            f"{m['retrieve_ms_p95']:>11.2f}ms"
+        )
+
+    if args.out:
+        args.out.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.baseline:
+        problems = compare(report, json.loads(args.baseline.read_text(encoding="utf-8")), args)
+        for line in problems:
+            print(f"РЕГРЕССИЯ: {line}")
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
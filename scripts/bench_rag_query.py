@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк поиска в Chroma: новый PersistentClient + get_or_create_collection
+на каждый запрос (как было) против общего на процесс клиента из vectorstore.
+
+Использование (из корня проекта):
+  # Синтетический индекс во временной папке, эмбеддинг запроса не считается
+  python scripts/bench_rag_query.py --docs 5000 --queries 200
+
+  # Реальный индекс и полный query_text (с эмбеддингом через FastEmbed)
+  python scripts/bench_rag_query.py --persist-dir rag_store --real --queries 100
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def report(name: str, samples: list[float]) -> None:
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1] if len(samples) > 1 else samples[0]
+    print(f"{name:<22} p50={statistics.median(samples):8.2f} ms  p95={p95:8.2f} ms  mean={statistics.fmean(samples):8.2f} ms")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Латентность поиска RAG: клиент на запрос против singleton")
+    ap.add_argument("--persist-dir", default=None, help="Готовый индекс (по умолчанию — синтетический во временной папке)")
+    ap.add_argument("--docs", type=int, default=5000, help="Размер синтетического индекса")
+    ap.add_argument("--dim", type=int, default=384, help="Размерность синтетических векторов")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--top-k", type=int, default=6)
+    ap.add_argument("--real", action="store_true", help="Мерить query_text целиком, с эмбеддингом запроса")
+    args = ap.parse_args()
+
+    persist_dir = args.persist_dir or tempfile.mkdtemp(prefix="bench_rag_")
+    os.environ["RAG_PERSIST_DIR"] = persist_dir
+
+    import chromadb
+    from chromadb.config import Settings
+
+    from app.rag import vectorstore
+    from app.rag.settings import RAG_COLLECTION
+
+    rnd = random.Random(0)
+
+    def rand_vec() -> list[float]:
+        return [rnd.uniform(-1, 1) for _ in range(args.dim)]
+
+    if args.persist_dir is None:
+        col = vectorstore.get_collection()
+        for start in range(0, args.docs, 1000):
+            n = min(1000, args.docs - start)
+            col.upsert(
+                ids=[f"doc-{start + i}" for i in range(n)],
+                documents=[f"synthetic chunk {start + i}" for i in range(n)],
+                embeddings=[rand_vec() for _ in range(n)],
+            )
+        vectorstore.reload_collection()
+        print(f"Синтетический индекс: {args.docs} векторов, dim={args.dim}, {persist_dir}")
+
+    def per_call_collection():
+        client = chromadb.PersistentClient(path=persist_dir, settings=Settings(anonymized_telemetry=False))
+        return client.get_or_create_collection(name=RAG_COLLECTION, metadata={"hnsw:space": "cosine"})
+
+    def run(get_collection) -> list[float]:
+        # Тексты запросов в проходах одни и те же: без сброса второй проход брал бы
+        # эмбеддинги из кэша и мерил бы не то же самое, что первый
+        vectorstore.clear_embed_cache()
+        samples = []
+        for i in range(args.queries):
+            started = time.perf_counter()
+            if args.real:
+                # Подменяем только получение коллекции, остальное — настоящий query_text
+                vectorstore.get_collection, saved = get_collection, vectorstore.get_collection
+                try:
+                    vectorstore.query_text(f"how to answer behavioral question {i}", args.top_k)
+                finally:
+                    vectorstore.get_collection = saved
+            else:
+                get_collection().query(query_embeddings=[rand_vec()], n_results=args.top_k)
+            samples.append((time.perf_counter() - started) * 1000)
+        return samples
+
+    if args.real:
+        vectorstore.warm_up()
+    else:
+        vectorstore.get_collection().count()
+
+    report("client per query", run(per_call_collection))
+    report("process singleton", run(vectorstore.get_collection))
+
+
+if __name__ == "__main__":
+    main()
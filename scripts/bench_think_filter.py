@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк: потоковый ThinkTagFilter против regex-варианта strip_think_tags
+на ответах с многомегабайтными блоками рассуждений.
+
+Использование (из корня проекта):
+  python scripts/bench_think_filter.py --size-mb 4 --chunk 4
+
+Сравниваются:
+  regex/final   — strip_think_tags один раз по готовой строке (как в /message);
+  regex/stream  — strip_think_tags по накопленному тексту после каждого куска
+                  (единственный способ применить regex к потоку, O(n²));
+  filter/stream — ThinkTagFilter.feed по кускам (O(n)).
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.llm_utils import ThinkTagFilter, strip_think_tags, _THINK_OPEN, _THINK_CLOSE  # noqa: E402
+
+
+def make_trace(size_mb: float, blocks: int, seed: int = 0) -> str:
+    rnd = random.Random(seed)
+    words = ["рассуждаю", "значит", "поэтому", "however", "consider", "O(n)", "<b>", "</", "<thin", "\n"]
+    target = int(size_mb * 1024 * 1024)
+    per_block = max(1, target // blocks)
+    parts = []
+    for i in range(blocks):
+        body = []
+        n = 0
+        while n < per_block:
+            w = rnd.choice(words)
+            body.append(w)
+            n += len(w) + 1
+        parts.append(f"{_THINK_OPEN}{' '.join(body)}{_THINK_CLOSE}\n\nВидимая часть ответа №{i}. ")
+    return "".join(parts)
+
+
+def split_chunks(text: str, size: int) -> list[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def bench_filter(chunks: list[str]) -> tuple[float, str]:
+    t0 = time.perf_counter()
+    f = ThinkTagFilter()
+    out = [f.feed(c) for c in chunks]
+    out.append(f.flush())
+    return time.perf_counter() - t0, "".join(out).strip()
+
+
+def bench_regex_final(text: str) -> tuple[float, str]:
+    t0 = time.perf_counter()
+    out = strip_think_tags(text)
+    return time.perf_counter() - t0, out
+
+
+def bench_regex_stream(chunks: list[str], limit: int) -> tuple[float, int]:
+    acc = ""
+    t0 = time.perf_counter()
+    for c in chunks[:limit]:
+        acc += c
+        strip_think_tags(acc)
+    return time.perf_counter() - t0, min(limit, len(chunks))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="ThinkTagFilter vs regex")
+    ap.add_argument("--size-mb", type=float, default=4.0, help="Размер ответа (МБ)")
+    ap.add_argument("--blocks", type=int, default=3, help="Сколько блоков think в ответе")
+    ap.add_argument("--chunk", type=int, default=4, help="Размер куска потока в символах (≈ токен)")
+    ap.add_argument("--stream-limit", type=int, default=20000,
+                    help="Сколько кусков прогнать через regex/stream (он квадратичный)")
+    args = ap.parse_args()
+
+    text = make_trace(args.size_mb, args.blocks)
+    chunks = split_chunks(text, args.chunk)
+    print(f"trace: {len(text) / 1024 / 1024:.1f} MB, {len(chunks)} chunks по {args.chunk} симв.")
+
+    t_final, expected = bench_regex_final(text)
+    t_filter, got = bench_filter(chunks)
+    t_stream, n = bench_regex_stream(chunks, args.stream_limit)
+
+    print(f"regex/final   : {t_final * 1000:9.1f} ms (один проход по готовому тексту)")
+    print(f"filter/stream : {t_filter * 1000:9.1f} ms ({t_filter / len(chunks) * 1e6:.2f} µs/chunk)")
+    print(f"regex/stream  : {t_stream * 1000:9.1f} ms на первых {n} chunks "
+          f"(на весь поток ≥{t_stream / n * len(chunks):.0f} s — рост квадратичный)")
+    print("результат совпадает:", got == expected)
+
+
+if __name__ == "__main__":
+    main()
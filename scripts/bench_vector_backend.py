@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк векторных бэкендов RAG: Chroma (HNSW + SQLite) против матрицы numpy
+в mmap-файле (RAG_BACKEND=numpy, int8 и float16).
+
+Для каждого бэкенда поднимается отдельный процесс, чтобы честно померить
+холодный старт (импорт vectorstore, открытие индекса и первый запрос), RSS
+процесса после серии запросов и латентность поиска p50/p99. Индекс
+синтетический (случайные нормированные векторы), эмбеддинг запроса не
+считается — сравнивается только хранилище.
+
+Использование (из корня проекта):
+  python scripts/bench_vector_backend.py --docs 5000 --queries 500
+  python scripts/bench_vector_backend.py --docs 20000 --backends chroma,numpy-int8
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+BACKENDS = {
+    "chroma": {"RAG_BACKEND": "chroma"},
+    "numpy-int8": {"RAG_BACKEND": "numpy", "RAG_NUMPY_DTYPE": "int8"},
+    "numpy-float16": {"RAG_BACKEND": "numpy", "RAG_NUMPY_DTYPE": "float16"},
+}
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def dir_mb(path: str) -> float:
+    return sum(p.stat().st_size for p in Path(path).rglob("*") if p.is_file()) / 1e6
+
+
+def random_vectors(n: int, dim: int, seed: int):
+    import numpy as np
+
+    vectors = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build(docs: int, dim: int) -> None:
+    """Заполняет индекс выбранного (через окружение) бэкенда синтетическими векторами."""
+    from app.rag import vectorstore
+
+    col = vectorstore.get_collection()
+    vectors = random_vectors(docs, dim, seed=0)
+    for start in range(0, docs, 1000):
+        end = min(start + 1000, docs)
+        col.upsert(
+            ids=[f"doc-{i}" for i in range(start, end)],
+            documents=[f"synthetic chunk {i}" for i in range(start, end)],
+            metadatas=[{"source": f"doc-{i}"} for i in range(start, end)],
+            embeddings=vectors[start:end],
+        )
+
+
+def child(queries: int, dim: int, top_k: int) -> None:
+    """Замер в свежем процессе; результат — одна строка JSON в stdout."""
+    started = time.perf_counter()
+    from app.rag import vectorstore
+
+    query_vectors = random_vectors(queries, dim, seed=1)
+    vectorstore.query_vector(query_vectors[0], top_k)
+    cold_ms = (time.perf_counter() - started) * 1000
+    samples = []
+    for vec in query_vectors:
+        t = time.perf_counter()
+        vectorstore.query_vector(vec, top_k)
+        samples.append((time.perf_counter() - t) * 1000)
+    samples.sort()
+    print(json.dumps({
+        "cold_ms": cold_ms,
+        "rss_mb": rss_mb(),
+        "p50_ms": samples[len(samples) // 2],
+        "p99_ms": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+    }))
+
+
+def run_child(env: dict, args: argparse.Namespace, mode: str) -> str:
+    cmd = [sys.executable, __file__, mode, "--docs", str(args.docs), "--dim", str(args.dim),
+           "--queries", str(args.queries), "--top-k", str(args.top_k)]
+    out = subprocess.run(cmd, env={**os.environ, **env}, cwd=ROOT, check=True, capture_output=True, text=True)
+    return out.stdout.strip().splitlines()[-1] if out.stdout.strip() else ""
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Холодный старт, RSS и латентность векторных бэкендов RAG")
+    ap.add_argument("mode", nargs="?", default="run", choices=["run", "build", "child"], help=argparse.SUPPRESS)
+    ap.add_argument("--docs", type=int, default=5000, help="Размер синтетического индекса")
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--top-k", type=int, default=6)
+    ap.add_argument("--backends", default=",".join(BACKENDS), help="Через запятую: " + ", ".join(BACKENDS))
+    args = ap.parse_args()
+
+    if args.mode == "build":
+        build(args.docs, args.dim)
+        return
+    if args.mode == "child":
+        child(args.queries, args.dim, args.top_k)
+        return
+
+    print(f"Синтетический индекс: {args.docs} векторов, dim={args.dim}, запросов: {args.queries}\n")
+    for name in args.backends.split(","):
+        persist_dir = tempfile.mkdtemp(prefix=f"bench_{name}_")
+        env = {**BACKENDS[name], "RAG_PERSIST_DIR": persist_dir}
+        run_child(env, args, "build")
+        r = json.loads(run_child(env, args, "child"))
+        print(
+            f"{name:<14} cold={r['cold_ms']:7.0f} ms  rss={r['rss_mb']:6.1f} MB  disk={dir_mb(persist_dir):6.1f} MB  "
+            f"p50={r['p50_ms']:6.2f} ms  p99={r['p99_ms']:6.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Фейковый OpenAI-совместимый LLM-сервер для нагрузочных тестов без GPU.
+
+Отдаёт /v1/models и /v1/chat/completions (обычный и stream=true) с
+настраиваемыми TTFT, скоростью генерации и блоком think в начале ответа.
+
+Использование (из корня проекта):
+  python scripts/fake_llm_server.py --port 8001 --ttft-ms 300 --tokens-per-sec 40
+
+  # Несколько «GPU-нод» для проверки пула эндпоинтов (LLM_BACKEND_URLS):
+  python scripts/fake_llm_server.py --port 8001 &
+  python scripts/fake_llm_server.py --port 8002 --ttft-ms 2000 --error-rate 0.1 &
+
+API подключается как к обычному серверу: VLLM_BASE_URL=http://localhost:8001/v1
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+_THINK_OPEN = "<think>"
+_THINK_CLOSE = "</think>"
+
+_WORDS = (
+    "Хорошо, давайте разберём ваш ответ. Сложность решения O(n log n), но можно "
+    "улучшить до O(n) с помощью хеш-таблицы. Расскажите, как вы бы масштабировали "
+    "этот сервис и какие метрики стали бы отслеживать в первую очередь?"
+).split()
+
+app = FastAPI()
+args: argparse.Namespace
+
+
+def _tokens(n: int, offset: int = 0) -> list[str]:
+    return [_WORDS[(offset + i) % len(_WORDS)] + " " for i in range(n)]
+
+
+def _reply_tokens(max_tokens: int) -> list[str]:
+    out = []
+    if args.think_tokens:
+        out.append(_THINK_OPEN)
+        out += _tokens(args.think_tokens, offset=7)
+        out.append(_THINK_CLOSE + "\n\n")
+    out += _tokens(args.reply_tokens)
+    return out[:max_tokens]
+
+
+def _prompt_tokens(messages: list[dict]) -> int:
+    return sum((len(m.get("content") or "") + 2) // 3 for m in messages)
+
+
+async def _sleep_ms(ms: float) -> None:
+    jitter = random.uniform(-args.jitter, args.jitter) * ms
+    await asyncio.sleep(max(0.0, ms + jitter) / 1000)
+
+
+def _prefill_ms(messages: list[dict]) -> float:
+    # Время до первого токена растёт с длиной промпта, как у настоящего prefill
+    return args.ttft_ms + _prompt_tokens(messages) * args.prefill_ms_per_1k / 1000
+
+
+@app.get("/v1/models")
+async def models():
+    return {"object": "list", "data": [{"id": args.model, "object": "model", "owned_by": "fake"}]}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    if random.random() < args.error_rate:
+        return JSONResponse(status_code=503, content={"error": {"message": "fake overload"}})
+
+    model = body.get("model", args.model)
+    messages = body.get("messages", [])
+    tokens = _reply_tokens(int(body.get("max_tokens") or 10_000))
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+    token_delay_ms = 1000 / args.tokens_per_sec
+
+    if not body.get("stream"):
+        await _sleep_ms(_prefill_ms(messages) + token_delay_ms * len(tokens))
+        prompt_tokens = _prompt_tokens(messages)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(tokens)},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(tokens),
+                "total_tokens": prompt_tokens + len(tokens),
+            },
+        }
+
+    async def events():
+        def chunk(delta: dict, finish_reason: str | None = None) -> str:
+            data = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+        await _sleep_ms(_prefill_ms(messages))
+        yield chunk({"role": "assistant", "content": ""})
+        for i, token in enumerate(tokens):
+            if i:
+                await _sleep_ms(token_delay_ms)
+            yield chunk({"content": token})
+        yield chunk({}, finish_reason="stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def main() -> None:
+    global args
+    ap = argparse.ArgumentParser(description="Фейковый OpenAI-совместимый LLM-сервер")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8001)
+    ap.add_argument("--model", default="models/Qwen3-8B-Q4_K_M.gguf", help="Имя модели в /v1/models")
+    ap.add_argument("--ttft-ms", type=float, default=300, help="Базовое время до первого токена")
+    ap.add_argument("--prefill-ms-per-1k", type=float, default=50,
+                    help="Добавка к TTFT на каждую 1000 токенов промпта")
+    ap.add_argument("--tokens-per-sec", type=float, default=40, help="Скорость генерации")
+    ap.add_argument("--reply-tokens", type=int, default=120, help="Токенов видимого ответа")
+    ap.add_argument("--think-tokens", type=int, default=40, help="Токенов в блоке think (0 — без него)")
+    ap.add_argument("--jitter", type=float, default=0.2, help="Разброс задержек, доля от значения")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="Доля запросов, отвечающих 503")
+    args = ap.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест API: сквозной сценарий пользователя с заданной конкурентностью.
+
+Каждый виртуальный пользователь регистрируется, логинится, для каждого AgentType
+создаёт сессию и ведёт в ней многоходовый диалог (/message или /message/stream),
+делает запросы к /chat/completions и завершает сессии. В конце печатается
+p50/p95/p99 латентности, пропускная способность и доля ошибок по эндпоинтам.
+
+Использование (из корня проекта, API уже запущен):
+  # LLM без GPU: фейковый сервер + API, смотрящий на него
+  python scripts/fake_llm_server.py --port 8001 &
+  VLLM_BASE_URL=http://localhost:8001/v1 uvicorn app.main:app --port 8000 &
+
+  python scripts/load_test.py --base-url http://localhost:8000 --users 40 --concurrency 20 --turns 3 --stream
+  python scripts/load_test.py --users 10 --chat-requests 5 --json-out data/load_test.json
+
+Требует: pip install httpx
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+
+AGENT_TYPES = ("hr", "tech_lead", "mentor", "code_review")
+
+_ANSWERS = (
+    "Я бы начал с уточнения требований и оценки нагрузки.",
+    "В прошлом проекте я переписал сервис на асинхронный стек и снизил p99 вдвое.",
+    "Использовал бы хеш-таблицу, сложность O(n) по времени и памяти.",
+    "Не уверен, можете подсказать, в какую сторону думать?",
+)
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * q / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+class Stats:
+    """Латентности, ошибки и коды ответов по эндпоинтам."""
+
+    def __init__(self):
+        self.latency: dict[str, list[float]] = defaultdict(list)
+        self.ttft: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.statuses: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint: str, ms: float, status: int | str, ok: bool) -> None:
+        self.latency[endpoint].append(ms)
+        self.statuses[endpoint][str(status)] += 1
+        if not ok:
+            self.errors[endpoint] += 1
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for endpoint, values in sorted(self.latency.items()):
+            row = {
+                "requests": len(values),
+                "errors": self.errors[endpoint],
+                "error_rate": round(self.errors[endpoint] / len(values), 4),
+                "rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(percentile(values, 50), 1),
+                "p95_ms": round(percentile(values, 95), 1),
+                "p99_ms": round(percentile(values, 99), 1),
+                "statuses": dict(self.statuses[endpoint]),
+            }
+            if self.ttft.get(endpoint):
+                row["ttft_p50_ms"] = round(percentile(self.ttft[endpoint], 50), 1)
+                row["ttft_p95_ms"] = round(percentile(self.ttft[endpoint], 95), 1)
+                row["ttft_p99_ms"] = round(percentile(self.ttft[endpoint], 99), 1)
+            endpoints[endpoint] = row
+        total = sum(len(v) for v in self.latency.values())
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "requests": total,
+            "rps": round(total / elapsed, 2) if elapsed else 0.0,
+            "errors": sum(self.errors.values()),
+            "endpoints": endpoints,
+        }
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, stats: Stats, args: argparse.Namespace):
+        self.client = client
+        self.stats = stats
+        self.args = args
+        self.headers: dict[str, str] = {}
+
+    async def call(self, endpoint: str, method: str, url: str, **kwargs) -> httpx.Response | None:
+        """Запрос с замером; endpoint — шаблон пути для группировки в отчёте."""
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=self.headers, **kwargs)
+        except httpx.HTTPError as e:
+            self.stats.record(endpoint, (time.perf_counter() - started) * 1000, type(e).__name__, ok=False)
+            return None
+        ok = response.status_code < 400
+        self.stats.record(endpoint, (time.perf_counter() - started) * 1000, response.status_code, ok)
+        return response if ok else None
+
+    async def stream_message(self, session_id: int, content: str) -> None:
+        """Ход через SSE: латентность — до события done, TTFT — до первого delta."""
+        endpoint = "POST /session/{id}/message/stream"
+        started = time.perf_counter()
+        status: int | str
+        ok = False
+        try:
+            async with self.client.stream(
+                "POST", f"/session/{session_id}/message/stream",
+                headers=self.headers, json={"content": content},
+            ) as response:
+                status = response.status_code
+                if response.status_code >= 400:
+                    await response.aread()
+                else:
+                    got_delta = False
+                    async for line in response.aiter_lines():
+                        if not line.startswith("event: "):
+                            continue
+                        event = line[len("event: "):]
+                        if event == "delta" and not got_delta:
+                            got_delta = True
+                            self.stats.ttft[endpoint].append((time.perf_counter() - started) * 1000)
+                        elif event == "done":
+                            ok = True
+                        elif event == "error":
+                            status = "sse-error"
+                            break
+                    if not ok and status == response.status_code:
+                        status = "incomplete"
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        self.stats.record(endpoint, (time.perf_counter() - started) * 1000, status, ok)
+
+    async def run(self, idx: int) -> None:
+        email = f"load-{uuid.uuid4().hex[:10]}@example.com"
+        password = "load-test-password"
+        await self.call("POST /register", "POST", "/register",
+                        json={"name": f"Load {idx}", "email": email, "password": password})
+        login = await self.call("POST /login", "POST", "/login", json={"email": email, "password": password})
+        if login is None:
+            return
+        self.headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        for agent_type in AGENT_TYPES:
+            created = await self.call("POST /session/", "POST", "/session/", json={
+                "agent_type": agent_type,
+                "vacancy_text": "Python backend developer: FastAPI, PostgreSQL, асинхронность.",
+            })
+            if created is None:
+                continue
+            session_id = created.json()["id"]
+            for turn in range(self.args.turns):
+                content = random.choice(_ANSWERS)
+                if self.args.stream:
+                    await self.stream_message(session_id, content)
+                else:
+                    await self.call("POST /session/{id}/message", "POST",
+                                    f"/session/{session_id}/message", json={"content": content})
+            await self.call("GET /session/{id}", "GET", f"/session/{session_id}")
+            await self.call("PATCH /session/{id}/complete", "PATCH", f"/session/{session_id}/complete")
+
+        for i in range(self.args.chat_requests):
+            await self.call("POST /chat/completions", "POST", "/chat/completions", json={
+                "messages": [{"role": "user", "content": f"Вопрос {i % 5}: что такое индекс в БД?"}],
+                "max_tokens": self.args.max_tokens,
+                "temperature": 0,
+            })
+
+
+async def run(args: argparse.Namespace) -> dict:
+    stats = Stats()
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for i in range(args.users):
+        queue.put_nowait(i)
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        async def worker() -> None:
+            while True:
+                try:
+                    idx = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await VirtualUser(client, stats, args).run(idx)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return stats.report(elapsed)
+
+
+def print_report(report: dict) -> None:
+    print(f"\n{report['requests']} запросов за {report['elapsed_s']} с, "
+          f"{report['rps']} req/s, ошибок: {report['errors']}\n")
+    header = f"{'endpoint':<36} {'n':>6} {'err%':>6} {'rps':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'ttft95':>8}"
+    print(header)
+    print("-" * len(header))
+    for endpoint, row in report["endpoints"].items():
+        ttft = f"{row['ttft_p95_ms']:>8.0f}" if "ttft_p95_ms" in row else f"{'':>8}"
+        print(f"{endpoint:<36} {row['requests']:>6} {row['error_rate'] * 100:>5.1f}% {row['rps']:>7.2f} "
+              f"{row['p50_ms']:>8.0f} {row['p95_ms']:>8.0f} {row['p99_ms']:>8.0f} {ttft}")
+        failed = {s: n for s, n in row["statuses"].items() if not s.isdigit() or int(s) >= 400}
+        if failed:
+            print(f"{'':<36} ошибки: {failed}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Нагрузочный тест API ai-interview-coach")
+    ap.add_argument("--base-url", default="http://localhost:8000")
+    ap.add_argument("--users", type=int, default=20, help="Сколько виртуальных пользователей прогнать")
+    ap.add_argument("--concurrency", type=int, default=10, help="Сколько пользователей активны одновременно")
+    ap.add_argument("--turns", type=int, default=3, help="Ходов диалога в каждой сессии")
+    ap.add_argument("--stream", action="store_true", help="Слать ходы через /message/stream (SSE)")
+    ap.add_argument("--chat-requests", type=int, default=2, help="Запросов к /chat/completions на пользователя")
+    ap.add_argument("--max-tokens", type=int, default=256, help="max_tokens для /chat/completions")
+    ap.add_argument("--timeout", type=float, default=300)
+    ap.add_argument("--json-out", type=Path, default=None, help="Сохранить отчёт в JSON")
+    args = ap.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json_out:
+        args.json_out.parent.mkdir(parents=True, exist_ok=True)
+        args.json_out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\nОтчёт: {args.json_out}")
+    if report["requests"] == 0 or report["errors"] == report["requests"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
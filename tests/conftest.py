@@ -0,0 +1,5 @@
+import os
+
+# app.database создаёт engine при импорте; тестам реальная БД не нужна
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("RAG_ENABLED", "true")
@@ -0,0 +1,139 @@
+"""Инкрементальная сборка индекса по манифесту (app/rag/build_index.py) на numpy-коллекции."""
+import json
+import zlib
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.rag import build_index as builder
+from app.rag import chunker, lexical, vectorstore
+from app.rag.numpy_store import NumpyCollection
+
+DIM = 8
+
+
+class FakeEmbedder:
+    """Детерминированные векторы по тексту; запоминает, что эмбеддилось."""
+
+    def __init__(self):
+        self.texts: list[str] = []
+
+    def embed(self, texts, batch_size=None, parallel=None):
+        for text in texts:
+            self.texts.append(text)
+            yield np.random.default_rng(zlib.crc32(text.encode())).standard_normal(DIM).astype(np.float32)
+
+
+def _section(title: str, word: str) -> str:
+    return f"## {title}\n\n" + " ".join(f"{word}{i}" for i in range(60)) + "\n"
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    handbook = tmp_path / "handbook"
+    (handbook / "contents" / "algorithms").mkdir(parents=True)
+    persist = tmp_path / "index"
+    monkeypatch.setattr(builder, "RAG_HANDBOOK_DIR", str(handbook))
+    monkeypatch.setattr(builder, "RAG_SOURCES", ["handbook"])
+    monkeypatch.setattr(builder, "RAG_INDEX_MANIFEST", str(persist / "manifest.json"))
+    monkeypatch.setattr(builder, "RAG_DEDUP_PATH", str(persist / "dedup.npz"))
+    monkeypatch.setattr(builder, "RAG_LEXICAL_DIR", str(persist / "lexical"))
+    monkeypatch.setattr(lexical, "RAG_LEXICAL_DIR", str(persist / "lexical"))
+    monkeypatch.setattr(lexical, "_index", None)
+    monkeypatch.setattr(lexical, "_loaded", False)
+    monkeypatch.setattr(chunker, "get_token_counter", lambda: chunker._count_words)
+    monkeypatch.setattr(vectorstore, "_collection", NumpyCollection(str(persist / "numpy")))
+    embedder = FakeEmbedder()
+    monkeypatch.setattr(vectorstore, "_embedder", embedder)
+
+    def write(name: str, *sections: str) -> None:
+        (handbook / "contents" / "algorithms" / name).write_text(f"# {name}\n\n" + "\n".join(sections))
+
+    return SimpleNamespace(handbook=handbook, embedder=embedder, write=write, manifest=persist / "manifest.json")
+
+
+def _build(env, full: bool = False):
+    env.embedder.texts.clear()
+    return builder.build_index(full=full)
+
+
+def _ids() -> set[str]:
+    return set(vectorstore.list_ids())
+
+
+def test_incremental_add_edit_remove(env):
+    env.write("arrays.md", _section("Basics", "array"), _section("Tricks", "trick"))
+    env.write("graphs.md", _section("BFS", "bfs"), _section("DFS", "dfs"))
+    first = _build(env)
+    assert first.full and first.files == 2 and first.removed == 0
+    assert first.added == len(_ids()) == len(env.embedder.texts) > 2
+    graphs_ids = {i for i in _ids() if i.startswith("contents/algorithms/graphs.md::")}
+
+    # Без изменений ничего не эмбеддится и не удаляется
+    same = _build(env)
+    assert not same.full
+    assert (same.files_changed, same.added, same.changed, same.removed) == (0, 0, 0, 0)
+    assert same.unchanged == first.added and env.embedder.texts == []
+
+    # Правка одного раздела: эмбеддятся только его фрагменты, остальные берутся из манифеста
+    env.write("arrays.md", _section("Basics", "array"), _section("Tricks", "hack"))
+    edited = _build(env)
+    assert edited.files_changed == 1 and edited.added == 0 and edited.removed == 0
+    assert 0 < edited.changed == len(env.embedder.texts) < first.added
+    assert all("hack0" in text for text in env.embedder.texts)
+    assert edited.unchanged == first.added - edited.changed
+
+    # Новый файл добавляется, не трогая остальные
+    env.write("heaps.md", _section("Heap", "heap"))
+    added = _build(env)
+    assert added.files == 3 and added.files_changed == 1 and added.changed == 0
+    assert added.added == len(env.embedder.texts) > 0
+    assert all("heap" in text for text in env.embedder.texts)
+
+    # Удалённый файл уходит из коллекции, лексического индекса и манифеста
+    (env.handbook / "contents" / "algorithms" / "graphs.md").unlink()
+    removed = _build(env)
+    assert removed.removed == len(graphs_ids) and removed.added == removed.changed == 0
+    assert env.embedder.texts == []
+    assert not _ids() & graphs_ids
+    assert lexical.lexical_search("bfs0", 5) == []
+    assert lexical.lexical_search("heap0", 5)[0]["id"].startswith("contents/algorithms/heaps.md::")
+    manifest = json.loads(env.manifest.read_text())
+    assert set(manifest["files"]) == {"contents/algorithms/arrays.md", "contents/algorithms/heaps.md"}
+    assert {cid for f in manifest["files"].values() for cid in f["chunks"]} == _ids()
+
+
+def test_full_rebuild_ignores_manifest(env):
+    env.write("arrays.md", _section("Basics", "array"))
+    first = _build(env)
+    again = _build(env, full=True)
+    # Старые id не учитываются: все фрагменты считаются новыми и эмбеддятся заново
+    assert again.full and again.added == first.added and again.unchanged == 0
+    assert len(env.embedder.texts) == first.added
+
+
+def test_index_changed_outside_manifest_is_rebuilt(env):
+    env.write("arrays.md", _section("Basics", "array"), _section("Tricks", "trick"))
+    first = _build(env)
+    vectorstore.delete_ids(sorted(_ids())[:1])
+    rebuilt = _build(env)
+    # Манифест не сходится с коллекцией — всё перечитывается и эмбеддится заново
+    assert rebuilt.full and len(env.embedder.texts) == first.added
+    assert len(_ids()) == first.added
+
+
+def test_duplicate_follows_its_original(env):
+    # Файлы обходятся по порядку путей: arrays.md — оригинал, mirror.md — его копия
+    env.write("arrays.md", _section("Basics", "array"))
+    env.write("mirror.md", _section("Basics", "array"))
+    first = _build(env)
+    assert first.deduplicated == 1
+    assert not any("mirror.md" in i for i in _ids())
+
+    # Оригинал изменился — копия перечитывается, хотя сама не менялась, и попадает в индекс
+    env.write("arrays.md", _section("Basics", "vector"))
+    rebuilt = _build(env)
+    assert rebuilt.deduplicated == 0
+    assert any("mirror.md" in i for i in _ids())
+    assert any("array0" in text for text in env.embedder.texts)
@@ -0,0 +1,95 @@
+"""Структурный чанкер markdown (app/rag/chunker.py)."""
+from app.rag.chunker import _count_words, iter_markdown_chunks, markdown_title
+
+
+def _chunks(text: str, max_tokens: int = 40, min_tokens: int = 5, meta: dict | None = None):
+    return list(iter_markdown_chunks(
+        text.splitlines(keepends=True), max_tokens=max_tokens, min_tokens=min_tokens,
+        count_tokens=_count_words, meta=meta,
+    ))
+
+
+def _words(n: int, word: str = "word") -> str:
+    return " ".join(f"{word}{i}" for i in range(n))
+
+
+def test_headings_start_chunks_with_section_path():
+    text = (
+        f"# Graphs\n\n{_words(10, 'intro')}\n\n"
+        f"## BFS\n\n{_words(10, 'bfs')}\n\n"
+        f"### Queue\n\n{_words(10, 'queue')}\n\n"
+        f"## DFS\n\n{_words(10, 'dfs')}\n"
+    )
+    chunks = _chunks(text)
+    assert [c.section for c in chunks] == ["Graphs", "Graphs > BFS", "Graphs > BFS > Queue", "Graphs > DFS"]
+    assert chunks[1].text.startswith("## BFS") and "queue0" not in chunks[1].text
+    assert all(c.tokens == _count_words(c.text) for c in chunks)
+
+
+def test_short_section_is_glued_to_the_next():
+    text = f"# A\n\nshort\n\n# B\n\n{_words(10)}\n\n# C\n\n{_words(10)}\n"
+    chunks = _chunks(text, min_tokens=8)
+    # В разделе A меньше min_tokens — он уходит во фрагмент вместе с B, путь — от начала фрагмента
+    assert [c.section for c in chunks] == ["A", "C"]
+    assert "short" in chunks[0].text and "# B" in chunks[0].text
+
+
+def test_text_before_first_heading_has_empty_section():
+    chunks = _chunks(f"{_words(10)}\n\n# Title\n\n{_words(10)}\n")
+    assert [c.section for c in chunks] == ["", "Title"]
+
+
+def test_code_block_is_not_split_when_it_fits():
+    code = "```python\n" + "\n".join(f"x{i} = {i}" for i in range(5)) + "\n```"
+    text = f"# Code\n\n{_words(20)}\n\n{code}\n\n{_words(5, 'after')}\n"
+    chunks = _chunks(text, max_tokens=30)
+    holder = [c for c in chunks if "```python" in c.text]
+    assert len(holder) == 1 and code in holder[0].text
+    assert all(c.text.count("```") % 2 == 0 for c in chunks)
+
+
+def test_blank_lines_inside_code_block_do_not_split_it():
+    code = "```\nfirst = 1\n\n# not a heading\nsecond = 2\n```"
+    chunks = _chunks(f"# Code\n\n{code}\n")
+    assert len(chunks) == 1 and chunks[0].section == "Code"
+    assert code in chunks[0].text
+
+
+def test_long_code_block_is_split_by_lines_with_fences():
+    body = [f"value_{i} = compute({i})" for i in range(30)]
+    chunks = _chunks("```python\n" + "\n".join(body) + "\n```\n", max_tokens=40)
+    assert len(chunks) > 1
+    for c in chunks:
+        lines = c.text.split("\n")
+        assert lines[0] == "```python" and lines[-1] == "```"
+        assert c.tokens <= 40
+    # Строки кода не рвутся и не теряются
+    assert [line for c in chunks for line in c.text.split("\n")[1:-1]] == body
+
+
+def test_token_cap_on_long_paragraphs_and_sentences():
+    sentences = " ".join(f"Sentence number {i} is here." for i in range(40))
+    chunks = _chunks(f"# Long\n\n{sentences}\n\n{_words(100)}\n", max_tokens=30)
+    assert len(chunks) > 3
+    assert all(c.tokens <= 30 for c in chunks)
+    # Длинный абзац режется по предложениям, а не посреди них
+    assert all(c.text.rstrip().endswith(".") for c in chunks if "Sentence" in c.text and "word" not in c.text)
+
+
+def test_front_matter_and_mdx_noise_are_skipped():
+    meta = {}
+    text = (
+        "---\ntitle: 'Arrays cheatsheet'\nkeywords: [a]\n---\n"
+        "import Tabs from '@theme/Tabs';\n\n<Tabs>\n\n"
+        f"# Arrays\n\n{_words(10)}\n\n</Tabs>\n"
+    )
+    chunks = _chunks(text, meta=meta)
+    assert meta == {"title": "Arrays cheatsheet"}
+    joined = "\n".join(c.text for c in chunks)
+    assert "import" not in joined and "<Tabs>" not in joined and "keywords" not in joined
+
+
+def test_markdown_title():
+    assert markdown_title(["---\n", "title: Arrays\n", "---\n", "# Heading\n"]) == "Arrays"
+    assert markdown_title(["intro\n", "```\n", "# comment\n", "```\n", "## Real heading ##\n"]) == "Real heading"
+    assert markdown_title(["no headings here\n"]) is None
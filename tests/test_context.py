@@ -0,0 +1,84 @@
+"""Сборка контекста RAG: порядок MMR и склейка соседних фрагментов (app/rag/context.py)."""
+from app.rag.context import CONTEXT_HEADER, build_context, merge_spans, mmr_order
+
+# Текст, нарезанный старым чанкером: окна по 600 символов с перекрытием 200
+SOURCE = " ".join(f"sentence-{i:03d} about heaps and priority queues." for i in range(60))
+
+
+def _old_chunks(size: int = 600, overlap: int = 200) -> list[str]:
+    return [SOURCE[start:start + size] for start in range(0, len(SOURCE), size - overlap)]
+
+
+def _hit(hit_id: str, text: str = "", embedding=None, **meta) -> dict:
+    return {"id": hit_id, "text": text, "meta": meta, "embedding": embedding}
+
+
+def test_adjacent_chunks_merge_without_duplicated_overlap():
+    chunks = _old_chunks()
+    hits = [_hit(f"heaps.md::chunk::{i}", chunks[i], source="heaps.md") for i in (2, 0, 1)]
+    spans = merge_spans(hits)
+    assert len(spans) == 1
+    span = spans[0]
+    assert (span.first, span.last, span.rank) == (0, 2, 0)
+    assert span.text == SOURCE[:len(span.text)]
+    assert span.text.count("sentence-010 ") == 1
+
+
+def test_adjacent_chunks_without_overlap_are_joined_by_paragraph():
+    hits = [_hit("a.md::chunk::0", "First part.  "), _hit("a.md::chunk::1", "  Second part.")]
+    assert merge_spans(hits)[0].text == "First part.\n\nSecond part."
+
+
+def test_gaps_files_and_repeats_stay_separate():
+    chunks = _old_chunks()
+    hits = [
+        _hit("heaps.md::chunk::3", chunks[3]),
+        _hit("other.md::chunk::1", "other file"),
+        _hit("heaps.md::chunk::0", chunks[0]),
+        _hit("heaps.md::chunk::0", chunks[0]),       # тот же фрагмент из второй части запроса
+        _hit("https://example.com/page", "scraped page without chunk number"),
+    ]
+    spans = merge_spans(hits)
+    # Порядок — по лучшему рангу отрывка
+    assert [(s.file, s.first, s.last) for s in spans] == [
+        ("heaps.md", 3, 3), ("other.md", 1, 1), ("heaps.md", 0, 0), ("https://example.com/page", 0, 0),
+    ]
+    assert spans[2].text == chunks[0]
+
+
+def test_mmr_demotes_near_duplicate():
+    hits = [
+        _hit("a", embedding=[1.0, 0.0, 0.0]),
+        _hit("a-copy", embedding=[0.99, 0.01, 0.0]),
+        _hit("b", embedding=[0.0, 1.0, 0.0]),
+        _hit("c", embedding=[0.0, 0.0, 1.0]),
+    ]
+    assert [h["id"] for h in mmr_order(hits, 4, lambda_=0.5)] == ["a", "b", "c", "a-copy"]
+    assert [h["id"] for h in mmr_order(hits, 2, lambda_=0.5)] == ["a", "b"]
+    # λ = 1 — только релевантность, порядок выдачи
+    assert [h["id"] for h in mmr_order(hits, 4, lambda_=1.0)] == ["a", "a-copy", "b", "c"]
+
+
+def test_mmr_keeps_rank_order_without_embeddings():
+    hits = [_hit("bm25-1"), _hit("dense", embedding=[1.0, 0.0]), _hit("bm25-2"), _hit("dense-2", embedding=[1.0, 0.0])]
+    # Без эмбеддинга штрафа нет; у второго плотного — есть, он уходит в конец
+    assert [h["id"] for h in mmr_order(hits, 4, lambda_=0.5)] == ["bm25-1", "dense", "bm25-2", "dense-2"]
+    assert [h["id"] for h in mmr_order(hits[:2], 4, lambda_=0.5)] == ["bm25-1", "dense"]
+
+
+def test_build_context_merges_and_respects_budget():
+    chunks = _old_chunks()
+    hits = [
+        _hit("heaps.md::chunk::0", chunks[0], [1.0, 0.0], source="heaps.md", title="Heaps"),
+        _hit("heaps.md::chunk::1", chunks[1], [0.0, 1.0], source="heaps.md", title="Heaps"),
+        _hit("long.md::chunk::5", "x" * 5000, [0.5, 0.5], source="long.md"),
+        _hit("short.md::chunk::0", "Short note.", [0.7, -0.7], source="short.md"),
+    ]
+    context = build_context(hits, max_chars=2000, top_k=4)
+    assert context.startswith(CONTEXT_HEADER)
+    # Склеенный отрывок — один блок без повтора перекрытия; длинный не влез и пропущен, короткий за ним — влез
+    assert "[1] Heaps — heaps.md\n" in context and "[2] short.md\nShort note." in context
+    assert "long.md" not in context
+    assert context.count("sentence-010 ") == 1
+    assert build_context([], max_chars=2000) == ""
+    assert build_context(hits[2:3], max_chars=100) == ""
@@ -0,0 +1,47 @@
+"""Удаление почти-дубликатов фрагментов (MinHashDeduper)."""
+from app.rag.dedup import MinHashDeduper
+
+TEXT = (
+    "Practice coding interview questions on a whiteboard, talk through your approach, "
+    "state the time and space complexity and test the solution with edge cases before "
+    "declaring it done. Interviewers value clear communication as much as the final code."
+)
+
+
+def _deduper() -> MinHashDeduper:
+    return MinHashDeduper(threshold=0.8, num_perm=128, bands=32, shingle=5)
+
+
+def test_near_duplicate_in_same_topic_is_dropped():
+    dedup = _deduper()
+    assert dedup.check("a.md::chunk::0", TEXT, "coding") is None
+    assert dedup.check("b.md::chunk::0", TEXT + " Good luck!", "coding") == "a.md::chunk::0"
+    assert len(dedup) == 1
+
+
+def test_cross_topic_duplicate_is_kept():
+    dedup = _deduper()
+    assert dedup.check("coding-interview-prep.md::chunk::9", TEXT, "coding") is None
+    assert dedup.check("software-engineering-interview-guide.md::chunk::12", TEXT, "general") is None
+    assert len(dedup) == 2
+    # Следующая копия в любой из тем сводится к оригиналу своей темы
+    assert dedup.check("c.md::chunk::0", TEXT, "general") == "software-engineering-interview-guide.md::chunk::12"
+
+
+def test_distinct_texts_are_kept():
+    dedup = _deduper()
+    assert dedup.check("a.md::chunk::0", TEXT, "coding") is None
+    assert dedup.check("b.md::chunk::0", "Negotiate the offer: ask for the range first.", "coding") is None
+
+
+def test_save_and_load_keep_topics(tmp_path):
+    path = str(tmp_path / "dedup.npz")
+    dedup = _deduper()
+    dedup.check("a.md::chunk::0", TEXT, "coding")
+    dedup.check("b.md::chunk::0", "Negotiate the offer: ask for the range first.", "career")
+    dedup.save(path, {"a.md::chunk::0"})
+
+    loaded = _deduper()
+    assert loaded.load(path, {"a.md::chunk::0", "b.md::chunk::0"}) == 1
+    assert loaded.check("c.md::chunk::0", TEXT, "coding") == "a.md::chunk::0"
+    assert loaded.check("d.md::chunk::0", TEXT, "general") is None
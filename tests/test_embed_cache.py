@@ -0,0 +1,62 @@
+"""LRU-кэш эмбеддингов запросов."""
+import numpy as np
+import pytest
+
+from app.rag.embed_cache import EmbeddingCache, normalize_text, text_key
+
+
+def _vec(value: float, dim: int = 4) -> np.ndarray:
+    return np.full(dim, value, dtype=np.float32)
+
+
+def test_key_ignores_whitespace_and_unicode_form():
+    assert normalize_text("  Two\n\tpointers  ") == "Two pointers"
+    assert text_key("Café menu") == text_key("Café  menu")
+    assert text_key("two pointers") != text_key("two pointer")
+
+
+def test_hit_miss_and_hit_rate():
+    cache = EmbeddingCache(max_entries=4, max_bytes=1 << 20, name="test.embed_hits")
+    assert cache.get("a") is None
+    cache.put("a", _vec(1))
+    np.testing.assert_array_equal(cache.get("a"), _vec(1))
+    assert (cache.hits, cache.misses, cache.hit_rate()) == (1, 1, 0.5)
+
+
+def test_cached_vectors_are_read_only_float32():
+    cache = EmbeddingCache(max_entries=4, max_bytes=1 << 20, name="test.embed_ro")
+    cache.put("a", [1.0, 2.0])
+    vec = cache.get("a")
+    assert vec.dtype == np.float32
+    with pytest.raises(ValueError):
+        vec[0] = 5
+
+
+def test_evicts_least_recently_used_by_count():
+    cache = EmbeddingCache(max_entries=2, max_bytes=1 << 20, name="test.embed_count")
+    cache.put("a", _vec(1))
+    cache.put("b", _vec(2))
+    cache.get("a")
+    cache.put("c", _vec(3))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_evicts_by_bytes_and_skips_oversized():
+    cache = EmbeddingCache(max_entries=100, max_bytes=40, name="test.embed_bytes")
+    cache.put("a", _vec(1))  # 16 байт
+    cache.put("b", _vec(2))
+    cache.put("c", _vec(3))  # 48 > 40 — вытесняется a
+    assert cache.get("a") is None and len(cache) == 2 and cache.nbytes == 32
+    big = cache.put("big", _vec(4, dim=16))  # 64 байта больше всего кэша — не кладётся
+    np.testing.assert_array_equal(big, _vec(4, dim=16))
+    assert cache.get("big") is None and len(cache) == 2
+
+
+def test_replacing_key_keeps_byte_count_and_clear_resets():
+    cache = EmbeddingCache(max_entries=4, max_bytes=1 << 20, name="test.embed_clear")
+    cache.put("a", _vec(1))
+    cache.put("a", _vec(2))
+    assert len(cache) == 1 and cache.nbytes == 16
+    cache.clear()
+    assert len(cache) == 0 and cache.nbytes == 0 and cache.get("a") is None
@@ -0,0 +1,38 @@
+"""Чанки файлов handbook (app/rag/handbook_loader.py)."""
+import pytest
+
+from app.rag import chunker, handbook_loader
+from app.rag.handbook_loader import iter_file_chunks
+
+
+@pytest.fixture(autouse=True)
+def markdown_chunker(monkeypatch):
+    monkeypatch.setattr(handbook_loader, "RAG_CHUNKER", "markdown")
+    monkeypatch.setattr(chunker, "get_token_counter", lambda: chunker._count_words)
+
+
+def _write(tmp_path, text: str):
+    path = tmp_path / "contents" / "heaps.md"
+    path.parent.mkdir(parents=True)
+    path.write_text(text)
+    return path
+
+
+def test_title_is_the_same_for_chunks_before_the_first_heading(tmp_path):
+    # Вступление длиннее RAG_CHUNK_TOKENS: первые фрагменты готовы раньше, чем встретится заголовок
+    intro = "\n\n".join(" ".join(f"intro{p}x{i}" for i in range(100)) for p in range(10))
+    path = _write(tmp_path, f"{intro}\n\n# Heaps\n\n" + " ".join(f"heap{i}" for i in range(50)) + "\n")
+    chunks = list(iter_file_chunks(path, tmp_path))
+    assert len(chunks) > 2 and chunks[0].section is None
+    assert {c.title for c in chunks} == {"Heaps"}
+
+
+def test_front_matter_title_wins(tmp_path):
+    path = _write(tmp_path, "---\ntitle: Heap cheatsheet\n---\n\n# Heaps\n\nA heap is a tree.\n")
+    assert {c.title for c in iter_file_chunks(path, tmp_path)} == {"Heap cheatsheet"}
+
+
+def test_file_without_heading_falls_back_to_file_name(tmp_path):
+    path = _write(tmp_path, "Just text about heaps.\n")
+    chunks = list(iter_file_chunks(path, tmp_path))
+    assert [(c.id, c.title, c.source) for c in chunks] == [("contents/heaps.md::chunk::0", "heaps", "contents/heaps.md")]
@@ -0,0 +1,129 @@
+"""Окно истории сессии: лимиты ходов и токенов, конспект и нижняя отметка."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("openai")
+
+from app import history  # noqa: E402
+from app.history import estimate_tokens, fold_into_summary, split_history  # noqa: E402
+from app.routers import session as session_router  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    """Окно из 3 ходов, пачка сворачивания — 2 хода, бюджет 300 токенов, отметка 200."""
+    monkeypatch.setattr(history, "HISTORY_MAX_TURNS", 3)
+    monkeypatch.setattr(history, "HISTORY_FOLD_BATCH_TURNS", 2)
+    monkeypatch.setattr(history, "HISTORY_TOKEN_BUDGET", 300)
+    monkeypatch.setattr(history, "HISTORY_TOKEN_LOW_WATER", 200)
+
+
+def _msg(id_: int, tokens: int = 10):
+    role = "assistant" if id_ % 2 else "user"
+    return SimpleNamespace(id=id_, role=role, content="x" * (3 * tokens))
+
+
+def _session(n: int, tokens: int = 10, summarized_until_id=None):
+    msgs = [_msg(i, tokens) for i in range(1, n + 1)]
+    return SimpleNamespace(messages=list(reversed(msgs)), summarized_until_id=summarized_until_id,
+                           history_summary=None)
+
+
+def _ids(msgs) -> list[int]:
+    return [m.id for m in msgs]
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("x" * 30) == 10
+
+
+def test_no_fold_within_turns_and_batch():
+    # 3 хода окна + 2 хода пачки = 10 сообщений, 100 токенов — в лимитах
+    to_fold, window = split_history(_session(10))
+    assert to_fold == []
+    assert _ids(window) == list(range(1, 11))  # отсортировано по id
+
+
+def test_fold_keeps_last_turns_when_batch_is_full():
+    to_fold, window = split_history(_session(11))
+    assert _ids(to_fold) == [1, 2, 3, 4, 5]
+    assert _ids(window) == [6, 7, 8, 9, 10, 11]
+
+
+def test_summarized_messages_are_skipped():
+    to_fold, window = split_history(_session(11, summarized_until_id=5))
+    assert to_fold == []
+    assert _ids(window) == [6, 7, 8, 9, 10, 11]
+
+
+def test_token_budget_trims_to_low_water_mark():
+    # 6 сообщений по 60 токенов = 360 > 300; до отметки 200 остаётся 3 сообщения (180)
+    to_fold, window = split_history(_session(6, tokens=60))
+    assert _ids(to_fold) == [1, 2, 3]
+    assert _ids(window) == [4, 5, 6]
+    assert sum(estimate_tokens(m.content) for m in window) <= 200
+
+
+def test_window_keeps_at_least_one_message():
+    to_fold, window = split_history(_session(3, tokens=500))
+    assert _ids(to_fold) == [1, 2]
+    assert _ids(window) == [3]
+
+
+def test_low_water_mark_leaves_room_for_next_turns():
+    """После сворачивания по токенам следующие ходы не сворачивают окно снова сразу же."""
+    session = _session(0)
+    folds = []
+    for turn in range(1, 21):
+        session.messages += [_msg(2 * turn - 1, 50), _msg(2 * turn, 50)]
+        to_fold, window = split_history(session)
+        if to_fold:
+            folds.append(turn)
+            session.summarized_until_id = to_fold[-1].id
+        assert sum(estimate_tokens(m.content) for m in window) <= 300
+    # Ход = 100 токенов: бюджет 300 превышается на 4-м ходе, отметка 200 оставляет запас на ход
+    assert folds == list(range(4, 21, 2))
+
+
+def test_fold_into_summary_sends_previous_summary_and_new_messages(monkeypatch):
+    calls = []
+
+    async def chat_completion(model, messages, **kwargs):
+        calls.append((model, messages, kwargs))
+        return SimpleNamespace(text="<think>черновик</think>\n- новый конспект")
+
+    monkeypatch.setattr(history, "chat_completion", chat_completion)
+    msgs = [SimpleNamespace(id=1, role="assistant", content="Вопрос"), SimpleNamespace(id=2, role="user", content="Ответ")]
+    summary = asyncio.run(fold_into_summary("m", "- старый конспект", msgs))
+
+    assert summary == "- новый конспект"
+    (model, messages, kwargs), = calls
+    assert model == "m" and kwargs["temperature"] == 0.2
+    user = messages[1]["content"]
+    assert "- старый конспект" in user
+    assert user.endswith("Интервьюер: Вопрос\n\nКандидат: Ответ")
+
+
+@pytest.mark.parametrize("fails", [False, True])
+def test_prepare_history_advances_summarized_until_id(monkeypatch, fails):
+    async def fold(model, summary, messages):
+        if fails:
+            raise RuntimeError("LLM down")
+        return f"конспект до {messages[-1].id}"
+
+    monkeypatch.setattr(session_router, "fold_into_summary", fold)
+    session = _session(11)
+    session.id = 1
+    db = SimpleNamespace(flush=lambda: None)
+    window = asyncio.run(session_router._prepare_history(session, db, "m"))
+
+    assert _ids(window) == [6, 7, 8, 9, 10, 11]
+    if fails:
+        # Конспект не обновился — отметка не сдвигается, выпавшее свернём на следующем ходе
+        assert session.summarized_until_id is None and session.history_summary is None
+    else:
+        assert session.summarized_until_id == 5
+        assert session.history_summary == "конспект до 5"
@@ -0,0 +1,91 @@
+"""Лексический индекс BM25 (app/rag/lexical.py)."""
+import math
+from collections import Counter
+
+import pytest
+
+from app.rag import lexical
+from app.rag.lexical import LexicalIndex, tokenize
+
+DOCS = {
+    "graphs::chunk::0": ("Dijkstra finds shortest paths in a weighted graph with a priority queue.", "algorithms"),
+    "graphs::chunk::1": ("Breadth-first search finds shortest paths in an unweighted graph.", "algorithms"),
+    "graphs::chunk::2": ("A graph is a set of vertices and edges; paths connect vertices.", "algorithms"),
+    "behavioral::chunk::0": ("Use the STAR format: situation, task, action, result.", "behavioral"),
+    "design::chunk::0": ("The CAP theorem: consistency, availability, partition tolerance.", "system-design"),
+    "design::chunk::1": ("Shortest answers are not always best in a system design interview.", "system-design"),
+}
+
+
+@pytest.fixture
+def index() -> LexicalIndex:
+    ids = list(DOCS)
+    return LexicalIndex.build(ids, [t for t, _ in DOCS.values()], [{"topic": topic} for _, topic in DOCS.values()])
+
+
+def _reference_bm25(query: str) -> dict[str, float]:
+    """BM25 «в лоб» по текстам — эталон для векторизованного поиска по постингам."""
+    docs = {i: Counter(tokenize(text)) for i, (text, _) in DOCS.items()}
+    avg_len = sum(sum(c.values()) for c in docs.values()) / len(docs)
+    k1, b = lexical.RAG_BM25_K1, lexical.RAG_BM25_B
+    scores = {}
+    for doc_id, counts in docs.items():
+        length = sum(counts.values())
+        score = 0.0
+        for term in set(tokenize(query)):
+            tf = counts.get(term, 0)
+            if not tf:
+                continue
+            df = sum(1 for c in docs.values() if term in c)
+            idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_len))
+        if score:
+            scores[doc_id] = score
+    return scores
+
+
+def test_exact_term_ranks_first(index):
+    assert index.search("how does Dijkstra work", 3)[0]["id"] == "graphs::chunk::0"
+    assert index.search("STAR method", 3)[0]["id"] == "behavioral::chunk::0"
+    assert index.search("cap theorem", 3)[0]["id"] == "design::chunk::0"
+
+
+def test_scores_match_reference_bm25(index):
+    query = "shortest paths graph"
+    hits = index.search(query, 10)
+    expected = _reference_bm25(query)
+    assert {h["id"] for h in hits} == set(expected)
+    for hit in hits:
+        assert hit["score"] == pytest.approx(expected[hit["id"]], rel=1e-5)
+    assert [h["score"] for h in hits] == sorted((h["score"] for h in hits), reverse=True)
+    # Редкий терм весит больше частого: «weighted» есть в одном документе, «paths» — в трёх
+    assert index.search("weighted paths", 1)[0]["id"] == "graphs::chunk::0"
+
+
+def test_top_k_and_hit_format(index):
+    hits = index.search("shortest paths graph", 2)
+    assert len(hits) == 2
+    assert set(hits[0]) == {"id", "text", "meta", "score"}
+    assert hits[0]["text"] == DOCS[hits[0]["id"]][0]
+    assert hits[0]["meta"] == {"topic": DOCS[hits[0]["id"]][1]}
+
+
+def test_stopwords_and_unknown_terms_give_nothing(index):
+    assert tokenize("What is the A* in a graph?") == ["graph"]
+    assert index.search("what is the", 5) == []
+    assert index.search("kubernetes", 5) == []
+    assert LexicalIndex.build([], [], []).search("graph", 5) == []
+
+
+def test_topic_filter(index):
+    hits = index.search("shortest", 5, topics=["system-design"])
+    assert [h["id"] for h in hits] == ["design::chunk::1"]
+    assert index.search("dijkstra", 5, topics=["behavioral"]) == []
+
+
+def test_save_load_round_trip(index, tmp_path):
+    index.save(str(tmp_path))
+    loaded = LexicalIndex.load(str(tmp_path))
+    assert len(loaded) == len(index)
+    for query in ("shortest paths graph", "STAR", "cap theorem"):
+        assert loaded.search(query, 5) == index.search(query, 5)
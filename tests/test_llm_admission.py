@@ -0,0 +1,130 @@
+"""Admission control: очередь с приоритетами, вытеснение и 429 с Retry-After."""
+import asyncio
+import uuid
+
+import pytest
+
+from app.llm_admission import PRIORITY_BULK, PRIORITY_INTERACTIVE, AdmissionController, LLMOverloadedError
+
+
+def _controller(max_concurrent: int = 1, max_queue: int = 8) -> AdmissionController:
+    return AdmissionController(f"test-{uuid.uuid4().hex[:8]}", max_concurrent, max_queue)
+
+
+async def _settle():
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+def test_admits_up_to_limit_without_queueing():
+    async def scenario():
+        ctl = _controller(max_concurrent=2)
+        await ctl.acquire(PRIORITY_BULK)
+        await ctl.acquire(PRIORITY_BULK)
+        assert ctl.active == 2 and ctl.waiting == 0
+        ctl.release()
+        ctl.release()
+        assert ctl.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_interactive_is_served_before_bulk_and_fifo_within_priority():
+    async def scenario():
+        ctl = _controller()
+        order = []
+
+        async def job(name, priority):
+            async with ctl.slot(priority):
+                order.append(name)
+
+        await ctl.acquire(PRIORITY_BULK)  # слот занят
+        tasks = []
+        for name, priority in [("bulk-1", PRIORITY_BULK), ("chat-1", PRIORITY_INTERACTIVE),
+                               ("bulk-2", PRIORITY_BULK), ("chat-2", PRIORITY_INTERACTIVE)]:
+            tasks.append(asyncio.ensure_future(job(name, priority)))
+            await _settle()
+        assert ctl.waiting == 4
+        ctl.release()
+        await asyncio.gather(*tasks)
+        assert order == ["chat-1", "chat-2", "bulk-1", "bulk-2"]
+        assert ctl.active == 0 and ctl.waiting == 0
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_rejects_with_retry_after():
+    async def scenario():
+        ctl = _controller(max_queue=1)
+        for _ in range(5):
+            ctl.wait.observe(2500)
+        await ctl.acquire(PRIORITY_BULK)
+        queued = asyncio.ensure_future(ctl.acquire(PRIORITY_BULK))
+        await _settle()
+        with pytest.raises(LLMOverloadedError) as exc:
+            await ctl.acquire(PRIORITY_BULK)
+        assert exc.value.retry_after == 3  # p50 ожидания 2.5 с, округление вверх
+        # Равный приоритет не вытесняет
+        with pytest.raises(LLMOverloadedError):
+            await ctl.acquire(PRIORITY_BULK)
+        assert ctl.waiting == 1
+        ctl.release()
+        await queued
+        ctl.release()
+
+    asyncio.run(scenario())
+
+
+def test_higher_priority_evicts_lowest_waiter():
+    async def scenario():
+        ctl = _controller(max_queue=2)
+        await ctl.acquire(PRIORITY_BULK)
+        first = asyncio.ensure_future(ctl.acquire(PRIORITY_BULK))
+        await _settle()
+        last = asyncio.ensure_future(ctl.acquire(PRIORITY_BULK))
+        await _settle()
+        chat = asyncio.ensure_future(ctl.acquire(PRIORITY_INTERACTIVE))
+        await _settle()
+
+        # Вытеснен самый поздний из низшего приоритета, он получает 429
+        with pytest.raises(LLMOverloadedError):
+            await last
+        assert not first.done() and ctl.waiting == 2
+        ctl.release()
+        await chat
+        ctl.release()
+        await first
+        ctl.release()
+        assert ctl.active == 0 and ctl.waiting == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_frees_its_place():
+    async def scenario():
+        ctl = _controller(max_queue=1)
+        await ctl.acquire(PRIORITY_BULK)
+        waiter = asyncio.ensure_future(ctl.acquire(PRIORITY_BULK))
+        await _settle()
+        waiter.cancel()
+        await _settle()
+        assert ctl.waiting == 0
+        # Место в очереди снова свободно, а слот после release не теряется
+        queued = asyncio.ensure_future(ctl.acquire(PRIORITY_BULK))
+        await _settle()
+        ctl.release()
+        await queued
+        assert ctl.active == 1
+        ctl.release()
+        assert ctl.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_overloaded_error_becomes_429_with_retry_after():
+    pytest.importorskip("sqlalchemy")
+    from app.main import llm_overloaded_handler
+
+    response = asyncio.run(llm_overloaded_handler(None, LLMOverloadedError("m", retry_after=7)))
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "7"
@@ -0,0 +1,266 @@
+"""Пул эндпоинтов LLM на живых фейковых серверах (scripts/fake_llm_server.py)."""
+import asyncio
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+openai = pytest.importorskip("openai")
+pytest.importorskip("uvicorn")
+
+from app import llm_backends, metrics  # noqa: E402
+from app.llm_backends import Backend, BackendPool, NoBackendAvailable, StreamAttempt  # noqa: E402
+
+FAKE_SERVER = Path(__file__).resolve().parent.parent / "scripts" / "fake_llm_server.py"
+MESSAGES = [{"role": "user", "content": "Расскажи про хеш-таблицы"}]
+# Быстрый короткий ответ без блока think и без разброса задержек
+FAST_ARGS = ["--ttft-ms", "20", "--tokens-per-sec", "1000", "--reply-tokens", "5",
+             "--think-tokens", "0", "--jitter", "0"]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server(*extra: str) -> tuple[subprocess.Popen, str]:
+    port = _free_port()
+    proc = subprocess.Popen([sys.executable, str(FAKE_SERVER), "--port", str(port), *FAST_ARGS, *extra])
+    url = f"http://127.0.0.1:{port}/v1"
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{url}/models", timeout=0.5)
+            return proc, url
+        except httpx.TransportError:
+            time.sleep(0.1)
+    proc.kill()
+    pytest.fail(f"fake LLM server on port {port} did not start")
+
+
+@pytest.fixture(scope="module")
+def servers():
+    """Три «ноды»: быстрая, медленная (TTFT 3 с) и всегда отвечающая 503."""
+    started = {
+        "fast": _start_server(),
+        "slow": _start_server("--ttft-ms", "3000"),
+        "failing": _start_server("--error-rate", "1"),
+    }
+    yield {name: url for name, (_, url) in started.items()}
+    for proc, _ in started.values():
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+@pytest.fixture
+def circuit(monkeypatch):
+    """Circuit breaker открывается после 2 ошибок на 0.3 с."""
+    monkeypatch.setattr(llm_backends, "LLM_CIRCUIT_FAILURES", 2)
+    monkeypatch.setattr(llm_backends, "LLM_CIRCUIT_COOLDOWN", 0.3)
+
+
+def _run(servers: dict, names: list[str], scenario):
+    """Запускает scenario(pool, backends_by_name) в свежем event loop со своим HTTP-клиентом."""
+    async def main():
+        async with httpx.AsyncClient() as client:
+            backends = {name: Backend(servers[name], client) for name in names}
+            # Уникальное имя модели: у каждого теста своя статистика TTFT пула
+            pool = BackendPool(f"test-{uuid.uuid4().hex[:8]}", list(backends.values()))
+            return await scenario(pool, backends)
+
+    return asyncio.run(main())
+
+
+async def _read_text(attempt) -> str:
+    parts = [c.choices[0].delta.content or "" for c in attempt.head if c.choices]
+    async for chunk in attempt.chunks:
+        if chunk.choices:
+            parts.append(chunk.choices[0].delta.content or "")
+    await attempt.close()
+    return "".join(parts)
+
+
+def test_pick_prefers_least_outstanding(servers):
+    async def scenario(pool, b):
+        b["fast"].outstanding = 3
+        assert pool.pick() is b["slow"]
+        b["slow"].outstanding = 5
+        assert pool.pick() is b["fast"]
+        assert pool.pick(exclude={b["fast"]}) is b["slow"]
+        assert pool.pick(exclude={b["fast"], b["slow"]}) is None
+
+        # Незавершённый запрос на живом сервере учитывается, пока он идёт
+        b["fast"].outstanding, b["slow"].outstanding = 1, 0
+        slow_call = asyncio.create_task(pool.complete(messages=MESSAGES, max_tokens=5))
+        await asyncio.sleep(0.2)
+        assert b["slow"].outstanding == 1
+        b["fast"].outstanding = 0
+        assert pool.pick() is b["fast"]
+        response = await pool.complete(messages=MESSAGES, max_tokens=5)
+        assert response.choices[0].message.content
+        slow_call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await slow_call
+        assert b["slow"].outstanding == 0
+
+    _run(servers, ["fast", "slow"], scenario)
+
+
+def test_complete_fails_over_to_healthy_backend(servers):
+    async def scenario(pool, b):
+        b["fast"].outstanding = 1  # первым выбирается падающий эндпоинт
+        response = await pool.complete(messages=MESSAGES, max_tokens=5)
+        assert response.choices[0].message.content
+        assert b["failing"].failures == 1
+        assert b["failing"].outstanding == 0 and b["fast"].outstanding == 1
+
+    _run(servers, ["failing", "fast"], scenario)
+
+
+def test_complete_raises_when_every_backend_fails(servers):
+    async def scenario(pool, b):
+        with pytest.raises(openai.InternalServerError):
+            await pool.complete(messages=MESSAGES, max_tokens=5)
+
+    _run(servers, ["failing"], scenario)
+
+
+@pytest.mark.usefixtures("circuit")
+def test_circuit_opens_and_half_opens(servers):
+    async def scenario(pool, b):
+        failing, fast = b["failing"], b["fast"]
+        fast.outstanding = 1
+        for _ in range(2):
+            await pool.complete(messages=MESSAGES, max_tokens=5)
+        assert failing.failures == 2
+        assert not failing.available(time.monotonic())
+
+        # Открытый эндпоинт не выбирается, даже если он свободнее
+        assert pool.pick() is fast
+        response = await pool.complete(messages=MESSAGES, max_tokens=5)
+        assert response.choices[0].message.content
+        assert failing.failures == 2
+
+        # После cooldown — half-open: снова получает запрос, а новая ошибка сразу открывает цепь
+        await asyncio.sleep(0.35)
+        assert failing.available(time.monotonic())
+        assert pool.pick() is failing
+        await pool.complete(messages=MESSAGES, max_tokens=5)
+        assert failing.failures == 3
+        assert not failing.available(time.monotonic())
+
+    _run(servers, ["failing", "fast"], scenario)
+
+
+@pytest.mark.usefixtures("circuit")
+def test_all_backends_open_still_tried(servers):
+    async def scenario(pool, b):
+        for _ in range(2):
+            with pytest.raises(openai.InternalServerError):
+                await pool.complete(messages=MESSAGES, max_tokens=5)
+        assert not b["failing"].available(time.monotonic())
+        assert pool.pick() is b["failing"]
+
+    _run(servers, ["failing"], scenario)
+
+
+def test_stream_hedges_to_faster_backend(servers, monkeypatch):
+    monkeypatch.setattr(llm_backends, "LLM_HEDGE_MIN_SAMPLES", 1)
+    monkeypatch.setattr(llm_backends, "LLM_HEDGE_MIN_DELAY_MS", 100)
+
+    async def scenario(pool, b):
+        pool.ttft.observe(50)
+        assert pool.hedge_delay() == pytest.approx(0.1)
+        b["fast"].outstanding = 1  # первым выбирается медленный эндпоинт
+        hedged = f"llm_pool.{pool.model}.hedged"
+
+        started = time.perf_counter()
+        attempt = await pool.open_stream(messages=MESSAGES, max_tokens=5)
+        elapsed = time.perf_counter() - started
+
+        assert attempt.backend is b["fast"]
+        assert elapsed < 2.0
+        assert metrics.snapshot()["counters"].get(hedged) == 1
+        assert await _read_text(attempt)
+        # Проигравшая копия отменена и не держит счётчик нагрузки
+        await asyncio.sleep(0.1)
+        assert b["slow"].outstanding == 0
+        assert b["fast"].outstanding == 1
+
+    _run(servers, ["slow", "fast"], scenario)
+
+
+def test_stream_without_ttft_history_is_not_hedged(servers):
+    async def scenario(pool, b):
+        assert pool.hedge_delay() is None
+        attempt = await pool.open_stream(messages=MESSAGES, max_tokens=5)
+        assert await _read_text(attempt)
+
+    _run(servers, ["fast"], scenario)
+
+
+def test_stream_fails_over_to_healthy_backend(servers):
+    async def scenario(pool, b):
+        b["fast"].outstanding = 1
+        attempt = await pool.open_stream(messages=MESSAGES, max_tokens=5)
+        assert attempt.backend is b["fast"]
+        assert b["failing"].failures == 1
+        assert await _read_text(attempt)
+        assert b["failing"].outstanding == 0
+
+    _run(servers, ["failing", "fast"], scenario)
+
+
+def test_empty_pool_raises_no_backend_available():
+    async def scenario():
+        pool = BackendPool("test-empty", [])
+        with pytest.raises(NoBackendAvailable):
+            await pool.complete(messages=MESSAGES, max_tokens=5)
+        with pytest.raises(NoBackendAvailable):
+            await pool.open_stream(messages=MESSAGES, max_tokens=5)
+
+    # Наследник APIConnectionError: вызывающий код обрабатывает его как обычный сбой соединения
+    assert issubclass(NoBackendAvailable, openai.APIConnectionError)
+
+    asyncio.run(scenario())
+
+
+def test_fatal_error_closes_attempts_finished_with_it(monkeypatch):
+    """Не-ретраибл ошибка одной копии не должна оставлять открытым поток другой, завершившейся вместе с ней."""
+    async def scenario():
+        async with httpx.AsyncClient() as client:
+            first, second = Backend("http://first/v1", client), Backend("http://second/v1", client)
+            pool = BackendPool(f"test-{uuid.uuid4().hex[:8]}", [first, second])
+            monkeypatch.setattr(pool, "hedge_delay", lambda: 0.01)
+            second.outstanding = 1  # первым выбирается first
+            release = asyncio.Event()
+            closed = []
+
+            async def close():
+                closed.append(first)
+
+            async def attempt(backend, kwargs):
+                if backend is first:
+                    backend.outstanding += 1
+                    await release.wait()
+                    return StreamAttempt(backend, SimpleNamespace(close=close), None, [])
+                # Копия на втором эндпоинте падает в тот же момент, когда первая открыла поток
+                release.set()
+                raise ValueError("bad request")
+
+            monkeypatch.setattr(pool, "_attempt", attempt)
+            with pytest.raises(ValueError):
+                await pool.open_stream(messages=MESSAGES, max_tokens=5)
+            assert closed == [first]
+            assert first.outstanding == 0
+
+    # Порядок обхода завершённых задач зависит от их хешей — повторяем, чтобы встретить оба
+    for _ in range(20):
+        asyncio.run(scenario())
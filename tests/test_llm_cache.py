@@ -0,0 +1,80 @@
+"""Кэш ответов LLM: LRU с TTL и обёртка ResponseCache."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app import llm_cache, metrics
+from app.llm_cache import MemoryCacheBackend, ResponseCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(llm_cache, "time", SimpleNamespace(monotonic=lambda: now.value))
+    return now
+
+
+def test_hit_and_miss(clock):
+    async def scenario():
+        cache = MemoryCacheBackend(max_entries=4, ttl=60)
+        assert await cache.get("a") is None
+        await cache.set("a", "ответ")
+        assert await cache.get("a") == "ответ"
+
+    asyncio.run(scenario())
+
+
+def test_entries_expire_after_ttl(clock):
+    async def scenario():
+        cache = MemoryCacheBackend(max_entries=4, ttl=60)
+        await cache.set("a", "ответ")
+        clock.value += 59
+        assert await cache.get("a") == "ответ"
+        clock.value += 2
+        assert await cache.get("a") is None
+        assert len(cache) == 0
+
+    asyncio.run(scenario())
+
+
+def test_least_recently_used_is_evicted(clock):
+    async def scenario():
+        cache = MemoryCacheBackend(max_entries=2, ttl=60)
+        await cache.set("a", "1")
+        await cache.set("b", "2")
+        assert await cache.get("a") == "1"  # a теперь свежее b
+        await cache.set("c", "3")
+        assert await cache.get("b") is None
+        assert await cache.get("a") == "1" and await cache.get("c") == "3"
+        assert len(cache) == 2
+
+    asyncio.run(scenario())
+
+
+def test_response_cache_counts_and_survives_backend_errors():
+    class Broken:
+        async def get(self, key):
+            raise ConnectionError("redis down")
+
+        async def set(self, key, value):
+            raise ConnectionError("redis down")
+
+    async def scenario():
+        counters = metrics.snapshot()["counters"]
+        hits, misses, errors = (counters.get(f"llm_cache.{n}", 0) for n in ("hit", "miss", "error"))
+        cache = ResponseCache(MemoryCacheBackend(max_entries=4, ttl=60))
+        assert await cache.get("k") is None
+        await cache.set("k", "v")
+        assert await cache.get("k") == "v"
+
+        broken = ResponseCache(Broken())
+        assert await broken.get("k") is None  # сбой хранилища — как промах, без исключения
+        await broken.set("k", "v")
+
+        counters = metrics.snapshot()["counters"]
+        assert counters["llm_cache.hit"] == hits + 1
+        assert counters["llm_cache.miss"] == misses + 1
+        assert counters["llm_cache.error"] == errors + 2
+
+    asyncio.run(scenario())
@@ -0,0 +1,111 @@
+"""Схлопывание одинаковых одновременных запросов к LLM (chat_completion)."""
+import asyncio
+import gc
+
+import pytest
+
+pytest.importorskip("openai")
+
+from app import llm_client, metrics  # noqa: E402
+from app.llm_client import Completion, chat_completion  # noqa: E402
+
+MESSAGES = [{"role": "user", "content": "Что такое B-дерево?"}]
+
+
+class FakeUpstream:
+    """Вместо пула эндпоинтов: считает генерации и завершает их по команде."""
+
+    def __init__(self, error: Exception | None = None):
+        self.calls = 0
+        self.error = error
+        self.release: asyncio.Event | None = None
+
+    async def __call__(self, model, messages, max_tokens, temperature, priority):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return Completion(text=f"ответ {self.calls}")
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    fake = FakeUpstream()
+    monkeypatch.setattr(llm_client, "LLM_COALESCE", True)
+    monkeypatch.setattr(llm_client, "_create_completion", fake)
+    return fake
+
+
+def _call(max_tokens: int = 100):
+    return chat_completion("m", MESSAGES, max_tokens=max_tokens, temperature=0)
+
+
+def test_identical_calls_share_one_generation(upstream):
+    async def scenario():
+        upstream.release = asyncio.Event()
+        before = metrics.snapshot()["counters"].get("llm.coalesced", 0)
+        first, second = asyncio.ensure_future(_call()), asyncio.ensure_future(_call())
+        other = asyncio.ensure_future(_call(max_tokens=200))  # другой запрос — своя генерация
+        await asyncio.sleep(0)
+        upstream.release.set()
+        results = await asyncio.gather(first, second, other)
+        assert upstream.calls == 2
+        assert results[0] == results[1] and results[0] != results[2]
+        assert metrics.snapshot()["counters"]["llm.coalesced"] == before + 1
+        assert llm_client._inflight_calls == {}
+
+    asyncio.run(scenario())
+
+
+def test_cancelling_one_waiter_keeps_generation_for_others(upstream):
+    async def scenario():
+        upstream.release = asyncio.Event()
+        first, second = asyncio.ensure_future(_call()), asyncio.ensure_future(_call())
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        upstream.release.set()
+        assert (await second).text == "ответ 1"
+        assert first.cancelled()
+        assert upstream.calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_error_is_retrieved_when_every_waiter_cancelled(upstream):
+    upstream.error = RuntimeError("LLM down")
+    unhandled = []
+
+    async def scenario():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, ctx: unhandled.append(ctx))
+        upstream.release = asyncio.Event()
+        waiters = [asyncio.ensure_future(_call()) for _ in range(2)]
+        await asyncio.sleep(0)
+        for w in waiters:
+            w.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        upstream.release.set()
+        for _ in range(3):
+            await asyncio.sleep(0)
+        assert llm_client._inflight_calls == {}
+        del waiters
+        gc.collect()
+
+    asyncio.run(scenario())
+    gc.collect()
+    assert not [ctx for ctx in unhandled if "never retrieved" in ctx.get("message", "")]
+
+
+def test_error_reaches_every_waiter(upstream):
+    upstream.error = RuntimeError("LLM down")
+
+    async def scenario():
+        upstream.release = asyncio.Event()
+        waiters = [asyncio.ensure_future(_call()) for _ in range(2)]
+        await asyncio.sleep(0)
+        upstream.release.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert upstream.calls == 1
+
+    asyncio.run(scenario())
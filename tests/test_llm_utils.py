@@ -0,0 +1,78 @@
+"""Потоковый фильтр блоков think (ThinkTagFilter) против strip_think_tags."""
+import pytest
+
+from app.llm_utils import ThinkTagFilter, strip_think_tags
+
+OPEN, CLOSE = "<" + "think>", "</" + "think>"
+
+CASES = [
+    f"{OPEN}Кандидат назвал O(n^2).{CLOSE}\n\nХорошо, а можно быстрее?",
+    f"{OPEN}план{CLOSE}Первый вопрос. {OPEN}ещё мысли{CLOSE}Второй вопрос.",
+    f"  \n{OPEN}{CLOSE}  \n\n  Ответ после пустого блока",
+    "Без блоков: a < b, x <th и </t — не теги",
+    f"Текст{OPEN}скрыто{CLOSE} и {OPEN}снова{CLOSE}конец <",
+]
+
+
+def _stream(chunks: list[str]) -> str:
+    f = ThinkTagFilter()
+    return "".join(f.feed(c) for c in chunks) + f.flush()
+
+
+def _expected(text: str) -> str:
+    # Фильтр отдаёт поток сразу и не может срезать пробелы в конце ответа
+    return strip_think_tags(text)
+
+
+@pytest.mark.parametrize("text", CASES)
+def test_whole_text_matches_strip_think_tags(text):
+    assert _stream([text]).rstrip() == _expected(text)
+
+
+@pytest.mark.parametrize("text", CASES)
+def test_every_split_point(text):
+    for i in range(len(text) + 1):
+        assert _stream([text[:i], text[i:]]).rstrip() == _expected(text), i
+
+
+@pytest.mark.parametrize("text", CASES[:2])
+def test_every_pair_of_split_points(text):
+    for i in range(len(text) + 1):
+        for j in range(i, len(text) + 1):
+            assert _stream([text[:i], text[i:j], text[j:]]).rstrip() == _expected(text), (i, j)
+
+
+@pytest.mark.parametrize("text", CASES)
+def test_char_by_char(text):
+    assert _stream(list(text)).rstrip() == _expected(text)
+
+
+def test_tags_split_inside_every_position():
+    for i in range(1, len(OPEN)):
+        for j in range(1, len(CLOSE)):
+            chunks = ["A ", OPEN[:i], OPEN[i:] + "скрыто" + CLOSE[:j], CLOSE[j:] + "B"]
+            assert _stream(chunks) == "A B"
+
+
+def test_unclosed_block_is_hidden_to_end_of_stream():
+    text = f"Ответ.{OPEN}размышления без конца"
+    assert _stream([text]) == "Ответ."
+    for i in range(len(text) + 1):
+        assert _stream([text[:i], text[i:]]) == "Ответ."
+
+
+def test_leading_whitespace_after_block_is_dropped():
+    f = ThinkTagFilter()
+    assert f.feed(f"{OPEN}мысли{CLOSE}") == ""
+    assert f.feed("\n\n ") == ""
+    assert f.feed(" Привет") == "Привет"
+    # После первого видимого слова пробелы сохраняются
+    assert f.feed("\n\nкак дела?") == "\n\nкак дела?"
+    assert f.flush() == ""
+
+
+def test_partial_tag_is_held_until_resolved():
+    f = ThinkTagFilter()
+    assert f.feed("Итог <th") == "Итог "
+    assert f.feed("е") == "<thе"  # кириллическая «е» — уже не тег
+    assert f.flush() == ""
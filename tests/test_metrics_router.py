@@ -0,0 +1,37 @@
+"""GET /metrics доступен только с токеном."""
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("jose")
+testclient = pytest.importorskip("fastapi.testclient")
+
+from fastapi import FastAPI  # noqa: E402
+
+from app import metrics  # noqa: E402
+from app.routers.metrics import router  # noqa: E402
+from app.security import get_current_user  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    api = FastAPI()
+    api.include_router(router)
+    return testclient.TestClient(api), api
+
+
+def test_metrics_require_token(client):
+    http, _ = client
+    response = http.get("/metrics")
+    assert response.status_code == 401
+    assert http.get("/metrics", headers={"Authorization": "Bearer not-a-jwt"}).status_code == 401
+
+
+def test_metrics_for_authorized_user(client):
+    http, api = client
+    api.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id=1)
+    metrics.incr("test.metrics_router")
+    response = http.get("/metrics")
+    assert response.status_code == 200
+    assert response.json()["counters"]["test.metrics_router"] >= 1
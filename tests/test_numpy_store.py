@@ -0,0 +1,74 @@
+"""Пакетная запись numpy-индекса (NumpyCollection.bulk)."""
+import os
+
+import numpy as np
+import pytest
+
+from app.rag.numpy_store import NumpyCollection
+
+DIM = 16
+
+
+def _batches():
+    rng = np.random.default_rng(0)
+    ids = [f"doc-{i}" for i in range(10)] + ["doc-3", "doc-11"]  # doc-3 переписывается второй пачкой
+    vectors = rng.standard_normal((len(ids), DIM)).astype(np.float32)
+    for start, end in ((0, 6), (6, 12)):
+        yield (ids[start:end], [f"text {i}" for i in range(start, end)],
+               [{"topic": "t", "n": i} for i in range(start, end)], vectors[start:end])
+
+
+def _state(col: NumpyCollection):
+    res = col.get(include=["documents", "metadatas", "embeddings"])
+    return res["ids"], res["documents"], res["metadatas"], res["embeddings"]
+
+
+def _write(col: NumpyCollection, batches) -> None:
+    for ids, docs, metas, vectors in batches:
+        col.upsert(ids=ids, documents=docs, metadatas=metas, embeddings=vectors)
+
+
+@pytest.mark.parametrize("dtype,rescore", [("int8", 0), ("float16", 4), ("binary", 0)])
+def test_bulk_matches_batch_by_batch_writes(tmp_path, dtype, rescore):
+    one_by_one = NumpyCollection(str(tmp_path / "a"), dtype=dtype, rescore=rescore)
+    _write(one_by_one, _batches())
+    bulk = NumpyCollection(str(tmp_path / "b"), dtype=dtype, rescore=rescore)
+    with bulk.bulk():
+        _write(bulk, _batches())
+        assert bulk.count() == 0  # до выхода из блока на диск ничего не пишется
+        assert not os.path.exists(tmp_path / "b" / "docs.json")
+
+    expected, actual = _state(one_by_one), _state(bulk)
+    assert actual[:3] == expected[:3]
+    assert actual[0].count("doc-3") == 1 and actual[1][3] == "text 10"
+    np.testing.assert_array_equal(actual[3], expected[3])
+    # Файлы на диске согласованы и открываются заново
+    reopened = NumpyCollection(str(tmp_path / "b"), dtype=dtype, rescore=rescore)
+    assert _state(reopened)[:3] == expected[:3]
+
+
+def test_bulk_discards_pending_on_error(tmp_path):
+    col = NumpyCollection(str(tmp_path), dtype="int8")
+    first, second = _batches()
+    _write(col, [first])
+    with pytest.raises(RuntimeError):
+        with col.bulk():
+            _write(col, [second])
+            raise RuntimeError("embedding failed")
+    assert col.count() == len(first[0])
+    assert NumpyCollection(str(tmp_path), dtype="int8").count() == len(first[0])
+
+
+def test_float32_copy_only_with_rescore(tmp_path):
+    first, second = _batches()
+    col = NumpyCollection(str(tmp_path), dtype="int8", rescore=4)
+    _write(col, [first])
+    assert os.path.exists(tmp_path / "full.npy")
+
+    # Пересчёт выключили: следующая запись убирает ставшую ненужной копию
+    col = NumpyCollection(str(tmp_path), dtype="int8", rescore=0)
+    _write(col, [second])
+    assert not os.path.exists(tmp_path / "full.npy")
+    reopened = NumpyCollection(str(tmp_path), dtype="int8", rescore=0)
+    assert reopened.count() == 11
+    assert reopened.query(query_embeddings=[second[3][0]], n_results=1)["ids"][0] == [second[0][0]]
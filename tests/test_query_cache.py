@@ -0,0 +1,92 @@
+"""Семантический кэш выдачи RAG: порог близости, параметры, TTL, вытеснение и сброс."""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.rag import query_cache
+from app.rag.query_cache import SemanticQueryCache
+
+PARAMS = (6, "weighted", True, ("algorithms",))
+HITS = [{"id": "contents/algorithms/graph.md::chunk::0"}]
+
+
+@pytest.fixture
+def clock(monkeypatch, tmp_path):
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(query_cache, "time", SimpleNamespace(monotonic=lambda: now.value))
+    monkeypatch.setattr(query_cache, "RAG_INDEX_MANIFEST", str(tmp_path / "index_manifest.json"))
+    return now
+
+
+def _cache(max_entries: int = 4, threshold: float = 0.95) -> SemanticQueryCache:
+    return SemanticQueryCache(max_entries, ttl_s=60, threshold=threshold, name="test.query_cache")
+
+
+def _unit(angle_deg: float) -> np.ndarray:
+    a = np.deg2rad(angle_deg)
+    return np.array([np.cos(a), np.sin(a), 0, 0], dtype=np.float32)
+
+
+def test_hit_above_threshold_and_miss_below(clock):
+    cache = _cache(threshold=0.95)
+    assert cache.get(_unit(0), PARAMS) is None
+    cache.put(_unit(0) * 3, PARAMS, HITS)  # длина вектора не важна
+    assert cache.get(_unit(10), PARAMS) == HITS   # cos 10° ≈ 0.985
+    assert cache.get(_unit(30), PARAMS) is None   # cos 30° ≈ 0.866
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_params_must_match(clock):
+    cache = _cache()
+    cache.put(_unit(0), PARAMS, HITS)
+    assert cache.get(_unit(0), (6, "weighted", True, ("behavioral",))) is None
+    assert cache.get(_unit(0), (3, "weighted", True, ("algorithms",))) is None
+
+
+def test_returned_list_is_a_copy(clock):
+    cache = _cache()
+    cache.put(_unit(0), PARAMS, HITS)
+    cache.get(_unit(0), PARAMS).append({"id": "other"})
+    assert cache.get(_unit(0), PARAMS) == HITS
+
+
+def test_entries_expire(clock):
+    cache = _cache()
+    cache.put(_unit(0), PARAMS, HITS)
+    clock.value += 61
+    assert cache.get(_unit(0), PARAMS) is None
+
+
+def test_least_recently_used_entry_is_replaced(clock):
+    cache = _cache(max_entries=2)
+    cache.put(_unit(0), PARAMS, [{"id": "a"}])
+    clock.value += 1
+    cache.put(_unit(90), PARAMS, [{"id": "b"}])
+    clock.value += 1
+    assert cache.get(_unit(0), PARAMS) == [{"id": "a"}]  # a использована позже b
+    clock.value += 1
+    cache.put(_unit(45), PARAMS, [{"id": "c"}])
+    assert len(cache) == 2
+    assert cache.get(_unit(90), PARAMS) is None  # вытеснена b
+    assert cache.get(_unit(0), PARAMS) == [{"id": "a"}]
+
+
+def test_invalidate_and_index_rebuild_clear_cache(clock, tmp_path):
+    cache = _cache()
+    cache.put(_unit(0), PARAMS, HITS)
+    cache.invalidate()
+    assert cache.get(_unit(0), PARAMS) is None
+
+    cache.put(_unit(0), PARAMS, HITS)
+    # Другой процесс пересобрал индекс — сменилось время изменения манифеста
+    (tmp_path / "index_manifest.json").write_text("{}")
+    assert cache.get(_unit(0), PARAMS) is None
+    assert len(cache) == 0
+
+
+def test_zero_vector_is_ignored(clock):
+    cache = _cache()
+    cache.put(np.zeros(4, dtype=np.float32), PARAMS, HITS)
+    assert len(cache) == 0
+    assert cache.get(np.zeros(4, dtype=np.float32), PARAMS) is None
@@ -0,0 +1,41 @@
+"""Фильтр тем агента в retrieve: когда он снимается, а когда нет."""
+import json
+
+import numpy as np
+import pytest
+
+from app.rag import retriever
+from app.rag.retriever import QueryPart
+
+HIT = {"id": "contents/algorithms/graph.md::chunk::0", "text": "Dijkstra", "meta": {"topic": "algorithms"}}
+
+
+@pytest.fixture
+def index(monkeypatch, tmp_path):
+    """В индексе только фрагмент темы algorithms; возвращает путь к манифесту."""
+    def dense_search(vectors, weights, top_k, fusion, topics):
+        return [HIT] if topics is None or "algorithms" in topics else []
+
+    manifest = tmp_path / "index_manifest.json"
+    monkeypatch.setattr(retriever, "RAG_INDEX_MANIFEST", str(manifest))
+    monkeypatch.setattr(retriever, "embed_query", lambda text: np.ones(4, dtype=np.float32))
+    monkeypatch.setattr(retriever, "_dense_search", dense_search)
+    monkeypatch.setattr(retriever, "get_query_cache", lambda: None)
+    return manifest
+
+
+def _retrieve(topics):
+    return retriever.retrieve([QueryPart("Расскажи про STAR", 1.0)], top_k=3, hybrid=False, topics=topics)
+
+
+def test_empty_filtered_result_keeps_filter(index):
+    index.write_text(json.dumps({"topics": "abc", "files": {}}))
+    assert _retrieve(["behavioral"]) == []
+    assert _retrieve(["algorithms"]) == [HIT]
+
+
+@pytest.mark.parametrize("manifest", [{"files": {}}, None])
+def test_index_without_topics_falls_back_to_whole_index(index, manifest):
+    if manifest is not None:
+        index.write_text(json.dumps(manifest))
+    assert _retrieve(["behavioral"]) == [HIT]
@@ -0,0 +1,81 @@
+"""Стабильность префикса промпта агента между ходами (LLM_PROMPT_LAYOUT=prefix_cache)."""
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("openai")
+
+from app.models import AgentType  # noqa: E402
+from app.rag.context import CONTEXT_HEADER  # noqa: E402
+from app.routers import session as session_router  # noqa: E402
+
+
+@pytest.fixture
+def fake_rag(monkeypatch):
+    """retrieve отдаёт фрагмент, зависящий от реплики: блок RAG меняется каждый ход."""
+    def retrieve(parts, top_k, topics=None):
+        return [{
+            "id": "contents/algorithms/graph.md::chunk::0",
+            "text": f"Handbook notes for: {parts[0].text}",
+            "meta": {"source": "contents/algorithms/graph.md", "title": "Graph"},
+            "distance": 0.1,
+            "embedding": None,
+        }]
+
+    monkeypatch.setattr(session_router, "RAG_ENABLED", True)
+    monkeypatch.setattr(session_router, "LLM_PROMPT_LAYOUT", "prefix_cache")
+    monkeypatch.setattr(session_router, "retrieve", retrieve)
+
+
+def _session():
+    return SimpleNamespace(
+        agent_type=AgentType.TECH_LEAD,
+        resume=SimpleNamespace(raw_text="Python backend engineer, 5 years, PostgreSQL, Kafka."),
+        vacancy_text="Senior Python developer, distributed systems.",
+        history_summary="Кандидат уверенно рассказал про хеш-таблицы.",
+    )
+
+
+def _window(turns: int) -> list:
+    """Приветствие агента, turns-1 полных ходов и реплика кандидата текущего хода."""
+    msgs = [SimpleNamespace(role="assistant", content="Привет! Начнём техническое интервью.")]
+    for i in range(1, turns):
+        msgs.append(SimpleNamespace(role="user", content=f"Ответ кандидата {i}"))
+        msgs.append(SimpleNamespace(role="assistant", content=f"Вопрос интервьюера {i}"))
+    msgs.append(SimpleNamespace(role="user", content=f"Ответ кандидата {turns}"))
+    return msgs
+
+
+def _encoded(messages: list[dict]) -> list[bytes]:
+    return [f"{m['role']}\0{m['content']}".encode("utf-8") for m in messages]
+
+
+@pytest.mark.usefixtures("fake_rag")
+def test_prefix_is_byte_stable_across_turns():
+    session = _session()
+    turn_n = session_router._build_agent_messages(session, _window(3))
+    turn_next = session_router._build_agent_messages(session, _window(4))
+
+    # Системный промпт и вся история до последней реплики хода N совпадают побайтно
+    prefix = len(turn_n) - 1
+    assert _encoded(turn_next[:prefix]) == _encoded(turn_n[:prefix])
+    assert CONTEXT_HEADER not in turn_n[0]["content"]
+
+    # Отличается только хвост: реплика хода N уже без блока RAG, новая реплика — с ним
+    assert turn_n[-1]["content"].startswith(CONTEXT_HEADER)
+    assert turn_n[-1]["content"].endswith("[СООБЩЕНИЕ КАНДИДАТА]: Ответ кандидата 3")
+    assert turn_next[prefix]["content"] == "[СООБЩЕНИЕ КАНДИДАТА]: Ответ кандидата 3"
+    assert turn_next[-1]["content"].startswith(CONTEXT_HEADER)
+    assert "Handbook notes for: Ответ кандидата 4" in turn_next[-1]["content"]
+    assert turn_next[-1]["content"].endswith("[СООБЩЕНИЕ КАНДИДАТА]: Ответ кандидата 4")
+    assert len(turn_next) == len(turn_n) + 2
+
+
+@pytest.mark.usefixtures("fake_rag")
+def test_legacy_layout_puts_rag_into_system_prompt(monkeypatch):
+    monkeypatch.setattr(session_router, "LLM_PROMPT_LAYOUT", "legacy")
+    messages = session_router._build_agent_messages(_session(), _window(2))
+
+    assert CONTEXT_HEADER in messages[0]["content"]
+    assert messages[-1]["content"] == "[СООБЩЕНИЕ КАНДИДАТА]: Ответ кандидата 2"